@@ -5,6 +5,7 @@ from flask_cors import CORS
 from datetime import timedelta
 import os
 from dotenv import load_dotenv
+from Main.logger import init_logging, get_logger
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,10 +13,12 @@ load_dotenv()
 # Initialize extensions
 db = SQLAlchemy()
 jwt = JWTManager()
+log = get_logger(__name__)
 
 def create_app(config_name='development'):
     """Application factory pattern"""
     app = Flask(__name__)
+    init_logging(app)
     
     # Get DATABASE_URL from environment
     database_url = os.getenv('DATABASE_URL', 'sqlite:///great_east_trade.db')
@@ -34,12 +37,11 @@ def create_app(config_name='development'):
         # Mask password in the connection string for logging
         import re
         masked_url = re.sub(r':([^:@]+)@', r':****@', database_url)
-        print(f"✅ Database URL found (masked): {masked_url}")
-        print(f"   Database URL configured: {'✅' if database_url else '❌'}")
+        log.info('database configured', extra={'database_url': masked_url})
     elif database_url:
-        print(f"✅ Database URL: {database_url}")
+        log.info('database configured', extra={'database_url': database_url})
     else:
-        print(f"⚠️  DATABASE_URL not found, using default SQLite database")
+        log.warning('DATABASE_URL not found, using default SQLite database')
     
     # Load configuration
     if config_name == 'development':
@@ -83,8 +85,13 @@ def create_app(config_name='development'):
         app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
         app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     
+    # Connection pool sizing, pre-ping, recycle and timeouts (see Main/database.py)
+    from Main.database import engine_options, init_pool_metrics
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url)
+    
     # Initialize extensions with app
     db.init_app(app)
+    init_pool_metrics(app)
     jwt.init_app(app)
     # CORS configuration - allow credentials (cookies) from frontend
     CORS(app, 
@@ -105,7 +112,7 @@ def create_app(config_name='development'):
     from Models.users import User
     from Models.admin import Admin
     from Models.customers import Customer
-    from Models.products import Category, Product, ProductImage, Order, OrderItem, Delivery, DeliveryUpdate
+    from Models.products import Category, Product, ProductImage, UploadedImage, UploadJob, SimilarProduct, Order, OrderItem, Delivery, DeliveryUpdate
     
     # Register blueprints
     from Routes.auth import auth_bp
@@ -120,34 +127,87 @@ def create_app(config_name='development'):
     app.register_blueprint(customers_bp, url_prefix='/api/customers')
     app.register_blueprint(products_bp, url_prefix='/api/products')
     
-    # Create tables
-    with app.app_context():
-        db.create_all()
+    # The schema is managed by migrations run at deploy time (python migrate.py);
+    # startup only checks the recorded version
+    from Main.migrations import check_schema
+    check_schema(app)
+    
+    # Response cache for catalog endpoints
+    from Main.cache import init_cache
+    init_cache(app)
+    
+    # Use the product full-text search index if the database has one
+    from Main.search import init_search_index
+    init_search_index(app)
     
-    # Add JWT error handlers for better debugging
+    # Fetch Google's Firebase token signing certificates in the background
+    from Main.firebase_tokens import warm_up
+    warm_up(app)
+    
+    # Add JWT error handlers for better debugging (never log token values)
     @jwt.unauthorized_loader
     def custom_unauthorized_response(err_str):
-        print(f"JWT Unauthorized: {err_str}")
-        print(f"Request cookies: {list(request.cookies.keys())}")
-        print(f"Request Authorization header: {request.headers.get('Authorization', 'None')}")
+        log.debug('jwt unauthorized', extra={
+            'reason': err_str,
+            'cookies': sorted(request.cookies.keys()),
+            'has_authorization_header': 'Authorization' in request.headers,
+        })
         return jsonify({"error": "Missing or invalid token", "message": err_str}), 401
 
     @jwt.invalid_token_loader
     def custom_invalid_token_loader(err_str):
-        print(f"JWT Invalid Token: {err_str}")
-        print(f"Request cookies: {list(request.cookies.keys())}")
-        print(f"Request Authorization header: {request.headers.get('Authorization', 'None')}")
+        log.debug('jwt invalid token', extra={
+            'reason': err_str,
+            'cookies': sorted(request.cookies.keys()),
+            'has_authorization_header': 'Authorization' in request.headers,
+        })
         return jsonify({"error": "Invalid token", "message": err_str}), 422
 
     @jwt.expired_token_loader
     def custom_expired_token_callback(jwt_header, jwt_payload):
-        print(f"JWT Expired Token")
+        log.debug('jwt expired token')
         return jsonify({"error": "Token has expired"}), 401
 
     @jwt.revoked_token_loader
     def custom_revoked_token_callback(jwt_header, jwt_payload):
-        print(f"JWT Revoked Token")
+        log.debug('jwt revoked token')
         return jsonify({"error": "Token has been revoked"}), 401
+
+    # Password hashing pool saturated (see Main/passwords.py)
+    from Main.passwords import PasswordHasherBusy
+
+    @app.errorhandler(PasswordHasherBusy)
+    def password_hasher_busy(e):
+        log.warning('password hashing busy', extra={'reason': str(e)})
+        response = jsonify({"error": "Server is busy, please retry shortly"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    # Request bodies over MAX_CONTENT_LENGTH: werkzeug rejects them before the view runs
+    from werkzeug.exceptions import RequestEntityTooLarge
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def request_entity_too_large(e):
+        max_size = app.config.get('MAX_CONTENT_LENGTH') or 0
+        return jsonify({"error": f"File too large. Maximum size is {max_size // (1024 * 1024)} MB"}), 413
+
+    # Connection pool exhausted for DB_POOL_TIMEOUT seconds (see Main/database.py)
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+    @app.errorhandler(PoolTimeoutError)
+    def database_pool_timeout(e):
+        db.session.rollback()
+        log.error('database connection pool exhausted', extra={'error': str(e)})
+        response = jsonify({"error": "Server is busy, please retry shortly"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    # Tokens carry the user's token_version; bumping it revokes them (see Main/auth.py)
+    from Main.auth import is_token_revoked
+
+    @jwt.token_in_blocklist_loader
+    def check_token_version(jwt_header, jwt_payload):
+        return is_token_revoked(jwt_payload)
     
     return app
 
@@ -0,0 +1,187 @@
+"""
+Authentication context for protected routes.
+
+The caller's identity (user id, role and customer/admin profile ids) is
+resolved at most once per request and kept on ``g``.
+
+Tokens issued by ``create_tokens`` carry the role and profile ids as claims,
+so authorization needs no database lookup. They also carry the user's
+``token_version``: bumping it (``revoke_tokens``) makes every token issued
+before invalid, which is how role changes and deactivations take effect
+before tokens expire. The stored version is checked on every request
+against a short-TTL in-process cache of users, so most requests need no
+database query at all. Tokens issued before claims existed are still
+accepted and resolved from the same cache.
+
+Configuration (environment):
+- AUTH_CACHE_TTL: seconds an identity stays cached (default 30, 0 disables)
+- AUTH_CACHE_MAX_ENTRIES: number of cached identities (default 10000)
+
+Routes that change a user's role or profiles call ``revoke_tokens`` and/or
+``invalidate_identity``. The cache is per process, so other workers may
+accept revoked tokens until the TTL expires.
+
+Usage:
+    @products_bp.route('/...')
+    @admin_required
+    def view(): ...
+
+    identity = get_identity()   # None for anonymous callers
+    if identity and identity.is_admin: ...
+"""
+
+import os
+from collections import namedtuple
+from functools import wraps
+from flask import current_app, jsonify, g, has_app_context
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity, create_access_token, create_refresh_token
+from Main.app import db
+from Main.cache import MemoryCache
+
+
+class Identity(namedtuple('Identity', 'user_id role customer_id admin_id token_version')):
+    """Who is making the request"""
+
+    __slots__ = ()
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    @property
+    def is_customer(self):
+        return self.role == 'customer'
+
+
+_identities = MemoryCache(
+    max_entries=int(os.getenv('AUTH_CACHE_MAX_ENTRIES', 10000)),
+    default_ttl=int(os.getenv('AUTH_CACHE_TTL', 30))
+)
+
+
+def _load_identity(user_id):
+    """Read a user's role, profile ids and token version in one query"""
+    from Models.users import User
+    from Models.customers import Customer
+    from Models.admin import Admin
+
+    row = db.session.query(User.id, User.role, Customer.id, Admin.id, User.token_version).outerjoin(
+        Customer, Customer.user_id == User.id
+    ).outerjoin(
+        Admin, Admin.user_id == User.id
+    ).filter(User.id == user_id).first()
+    return Identity(*row) if row else None
+
+
+def _stored_identity(user_id):
+    """Identity as stored in the database, through the TTL cache"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    identity = _identities.get(user_id) if _identities.default_ttl > 0 else None
+    if identity is None:
+        identity = _load_identity(user_id)
+        if identity is not None and _identities.default_ttl > 0:
+            _identities.set(user_id, identity)
+    return identity
+
+
+def token_claims(user):
+    """Authorization claims embedded in a user's tokens"""
+    return {
+        'role': user.role,
+        'customer_id': user.customer_profile.id if user.customer_profile else None,
+        'admin_id': user.admin_profile.id if user.admin_profile else None,
+        'ver': user.token_version or 0,
+    }
+
+
+def create_tokens(user):
+    """Issue (access_token, refresh_token) for a user, with authorization claims"""
+    claims = token_claims(user)
+    # identity MUST be a string (Flask-JWT-Extended requirement)
+    return (
+        create_access_token(identity=str(user.id), additional_claims=claims),
+        create_refresh_token(identity=str(user.id), additional_claims=claims),
+    )
+
+
+def is_token_revoked(jwt_payload):
+    """True if the token's version is older than the user's (or the user is gone)"""
+    if 'ver' not in jwt_payload:
+        return False
+    stored = _stored_identity(jwt_payload.get(current_app.config['JWT_IDENTITY_CLAIM']))
+    return stored is None or stored.token_version != jwt_payload['ver']
+
+
+def revoke_tokens(user):
+    """Invalidate every token issued to a user so far (caller commits, then calls invalidate_identity)"""
+    user.token_version = (user.token_version or 0) + 1
+
+
+def get_identity():
+    """
+    Return the Identity of the current request's user, or None if the request
+    is anonymous or the user no longer exists. Must run after jwt_required.
+    """
+    if 'auth_identity' in g:
+        return g.auth_identity
+
+    identity = None
+    current_user_id = get_jwt_identity()
+    if current_user_id:
+        claims = get_jwt()
+        if 'role' in claims and 'ver' in claims:
+            # Version already checked by the token_in_blocklist_loader
+            identity = Identity(
+                int(current_user_id), claims['role'],
+                claims.get('customer_id'), claims.get('admin_id'), claims['ver']
+            )
+        else:
+            identity = _stored_identity(current_user_id)
+
+    g.auth_identity = identity
+    return identity
+
+
+def current_role():
+    """Role of the caller: 'admin', 'customer' or 'anonymous'"""
+    identity = get_identity()
+    return identity.role if identity else 'anonymous'
+
+
+def invalidate_identity(user_id):
+    """Forget the cached identity of a user (call after changing its role or profiles)"""
+    _identities.delete(int(user_id))
+    if has_app_context():
+        identity = g.get('auth_identity')
+        if identity and identity.user_id == int(user_id):
+            g.pop('auth_identity')
+
+
+def admin_required(f):
+    """Decorator to require admin role"""
+    @wraps(f)
+    @jwt_required()
+    def decorated_function(*args, **kwargs):
+        identity = get_identity()
+        if not identity or not identity.is_admin:
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def customer_required(f):
+    """Decorator to require a customer with a customer profile"""
+    @wraps(f)
+    @jwt_required()
+    def decorated_function(*args, **kwargs):
+        identity = get_identity()
+        if not identity or not identity.is_customer:
+            return jsonify({'error': 'Customer access required'}), 403
+        if identity.customer_id is None:
+            return jsonify({'error': 'Customer profile not found'}), 404
+        return f(*args, **kwargs)
+    return decorated_function
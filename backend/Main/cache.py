@@ -0,0 +1,265 @@
+"""
+Response caching for read-mostly catalog endpoints: a server-side response
+cache and HTTP conditional GET (ETag / Last-Modified).
+
+Backends:
+- MemoryCache: per-process LRU with TTL (default).
+- RedisCache: any Redis-compatible server (redis-py client), shared by all
+  workers. Requires the optional ``redis`` package.
+
+Configuration (environment):
+- CACHE_BACKEND: 'memory' (default), 'redis' or 'none'
+- CACHE_URL: Redis URL when CACHE_BACKEND=redis (default redis://localhost:6379/0)
+- CACHE_DEFAULT_TTL: seconds an entry stays valid (default 60)
+- CACHE_MAX_ENTRIES: LRU size of the memory backend (default 1024)
+
+Entries are grouped in namespaces (e.g. 'catalog'). Invalidating a namespace
+bumps its version number, which is part of every key, so stale entries are
+never read again and simply age out. With the memory backend invalidation is
+only seen by the current process; other workers serve their copy until the
+TTL expires, so use the Redis backend when running several workers.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, request, g
+from sqlalchemy import func
+from Main.app import db
+from Main.logger import get_logger
+
+log = get_logger(__name__)
+
+
+class MemoryCache:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries=1024, default_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_version(self, namespace):
+        with self._lock:
+            return self._versions.get(namespace, 0)
+
+    def invalidate(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+class RedisCache:
+    """Cache stored in a Redis-compatible server, shared between workers"""
+
+    def __init__(self, client, default_ttl=60, prefix='guzone:cache:'):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.setex(self.prefix + key, int(ttl), json.dumps(value))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def get_version(self, namespace):
+        version = self.client.get(f'{self.prefix}version:{namespace}')
+        return int(version) if version is not None else 0
+
+    def invalidate(self, namespace):
+        self.client.incr(f'{self.prefix}version:{namespace}')
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+def init_cache(app):
+    """Create the cache backend configured by the environment"""
+    backend = os.getenv('CACHE_BACKEND', 'memory').strip().lower()
+    default_ttl = int(os.getenv('CACHE_DEFAULT_TTL', 60))
+    cache = None
+
+    if backend == 'redis':
+        try:
+            cache = RedisCache.from_url(os.getenv('CACHE_URL', 'redis://localhost:6379/0'), default_ttl=default_ttl)
+        except ImportError:
+            log.warning('CACHE_BACKEND=redis but the redis package is not installed, using memory cache')
+            backend = 'memory'
+
+    if backend == 'memory':
+        cache = MemoryCache(max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 1024)), default_ttl=default_ttl)
+
+    app.extensions['response_cache'] = cache
+    return cache
+
+
+def get_cache():
+    """Return the app's cache backend, or None if caching is disabled"""
+    return current_app.extensions.get('response_cache')
+
+
+def invalidate(namespace):
+    """Drop every cached response of a namespace (call after committing a change)"""
+    cache = get_cache()
+    if cache is None:
+        return
+    try:
+        cache.invalidate(namespace)
+    except Exception as e:
+        log.warning('cache invalidation failed', extra={'namespace': namespace, 'error': str(e)})
+
+
+def _request_role():
+    """Role of the caller: 'admin', 'customer' or 'anonymous'"""
+    from Main.auth import current_role
+    return current_role()
+
+
+def cached_response(namespace, ttl=None):
+    """
+    Cache successful JSON responses of a GET view, keyed by endpoint, view
+    arguments, query string, caller role and, below @conditional_response,
+    the ETag of the current data. Must be applied below
+    @jwt_required(optional=True) so the caller identity is available.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            cache = get_cache()
+            if cache is None or request.method != 'GET':
+                return f(*args, **kwargs)
+
+            try:
+                version = cache.get_version(namespace)
+                query_string = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+                view_args = ','.join(f'{k}={v}' for k, v in sorted(kwargs.items()))
+                key = f'{namespace}:v{version}:{request.endpoint}:{view_args}:{query_string}:{_request_role()}'
+                # Entries made for another version of the data can't be served under the current ETag
+                validator = g.get('response_etag')
+                if validator:
+                    key = f'{key}:{validator}'
+                entry = cache.get(key)
+            except Exception as e:
+                log.warning('cache read failed', extra={'error': str(e)})
+                return f(*args, **kwargs)
+
+            if entry is not None:
+                body, status = entry
+                return current_app.response_class(body, status=status, mimetype='application/json')
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == 'application/json':
+                try:
+                    cache.set(key, [response.get_data(as_text=True), response.status_code], ttl)
+                except Exception as e:
+                    log.warning('cache write failed', extra={'error': str(e)})
+            return response
+        return decorated_function
+    return decorator
+
+
+# ==================== CONDITIONAL GET ====================
+
+def table_signature(model):
+    """(row count, max updated_at) of a table - changes whenever a row is added, removed or updated"""
+    return tuple(db.session.query(func.count(model.id), func.max(model.updated_at)).one())
+
+
+def conditional_response(signature_fn):
+    """
+    Add ETag / Last-Modified to a GET view and answer 304 Not Modified when the
+    client already has the current version. The validators are derived from
+    signature_fn(**view_args) (a tuple of counts and max(updated_at) values),
+    the request URL and the caller role, so the body is never built just to
+    compare it. Apply below @jwt_required(optional=True) and above
+    @cached_response, which then only serves bodies cached under this ETag.
+
+    Last-Modified is only sent (and If-Modified-Since only honoured) when the
+    signature is made of timestamps alone: deleting a row lowers a count but
+    moves no timestamp, so collections are validated by their ETag only.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            signature = signature_fn(**kwargs)
+            role = _request_role()
+            etag = hashlib.sha1(
+                f'{request.full_path}|{role}|{signature!r}'.encode()
+            ).hexdigest()
+            g.response_etag = etag
+            last_modified = None
+            if all(value is None or isinstance(value, datetime) for value in signature):
+                timestamps = [value for value in signature if value is not None]
+                if timestamps:
+                    last_modified = max(timestamps).replace(tzinfo=timezone.utc, microsecond=0)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = bool(
+                    last_modified and request.if_modified_since
+                    and last_modified <= request.if_modified_since
+                )
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.update(['Authorization', 'Cookie'])
+            return response
+        return decorated_function
+    return decorator
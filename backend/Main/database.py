@@ -0,0 +1,183 @@
+"""
+Database engine configuration and connection pool metrics.
+
+``engine_options(database_url)`` builds SQLALCHEMY_ENGINE_OPTIONS from the
+environment. Connections come from ``MeteredQueuePool``, SQLAlchemy's
+QueuePool timing how long each checkout waited for a connection, and
+``init_pool_metrics`` counts connects, invalidations (e.g. stale connections
+caught by pre-ping) and pool timeouts. ``pool_status()`` reports them with
+the live pool state at GET /api/admin/db-pool.
+
+Configuration (environment):
+- DB_POOL_SIZE: connections kept open per process (default 5)
+- DB_MAX_OVERFLOW: extra connections opened at peaks (default 10)
+- DB_POOL_TIMEOUT: seconds to wait for a connection before failing with 503 (default 30)
+- DB_POOL_RECYCLE: seconds after which a connection is replaced, so the
+  server or a proxy never sees it idle too long (default 1800, -1 disables)
+- DB_POOL_PRE_PING: test connections before use and reconnect stale ones (default true)
+- DB_STATEMENT_TIMEOUT: milliseconds a PostgreSQL statement may run (default 30000, 0 disables)
+- DB_CONNECT_TIMEOUT: seconds to wait when opening a PostgreSQL connection (default 10)
+
+Every process (e.g. each gunicorn worker) has its own pool, so the database
+sees up to workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections, and the
+metrics are those of the process answering the request. Measure with
+``python benchmark_db_pool.py``.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from Main.logger import get_logger
+
+# Checkout waits kept for percentiles
+WAIT_SAMPLES = 1000
+
+log = get_logger(__name__)
+
+
+class PoolMetrics:
+    """Counters and checkout wait times of one connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.waits.append(seconds)
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def to_dict(self):
+        with self._lock:
+            waits = sorted(self.waits)
+            attempts = self.checkouts + self.timeouts
+
+            def percentile(p):
+                return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 3) if waits else 0.0
+
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'wait_ms': {
+                    'avg': round(self.wait_total / attempts * 1000, 3) if attempts else 0.0,
+                    'p50': percentile(0.5),
+                    'p95': percentile(0.95),
+                    'p99': percentile(0.99),
+                    'max': round(self.wait_max * 1000, 3),
+                    'samples': len(waits),
+                }
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool recording how long each checkout waited for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS for database_url from the environment"""
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # Flask-SQLAlchemy keeps in-memory SQLite on a single static connection
+        return {}
+
+    options = {
+        'poolclass': MeteredQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+    }
+
+    if url.get_backend_name() == 'postgresql':
+        connect_args = {'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 10))}
+        statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT', 30000))
+        if statement_timeout > 0:
+            connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+        options['connect_args'] = connect_args
+    return options
+
+
+def init_pool_metrics(app):
+    """Count connects and invalidations of the app's engine pool"""
+    from Main.app import db
+
+    with app.app_context():
+        engine = db.engine
+
+    if not isinstance(engine.pool, MeteredQueuePool):
+        return
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        engine.pool.metrics.count('connects')
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        engine.pool.metrics.count('invalidations')
+        log.warning('database connection invalidated', extra={'error': str(exception) if exception else None})
+
+
+def pool_status(engine):
+    """Live state and metrics of an engine's connection pool"""
+    pool = engine.pool
+    status = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(0, pool.overflow()),
+        })
+    if isinstance(pool, MeteredQueuePool):
+        status.update(pool.metrics.to_dict())
+    return status
@@ -0,0 +1,297 @@
+"""
+Firebase ID token verification.
+
+Tokens from the client's Firebase Google sign-in are verified locally with
+PyJWT against Google's public signing certificates, so no Firebase Admin SDK
+(and no service account private key) is needed. The certificates are fetched
+once and cached for the lifetime Google announces in its Cache-Control
+max-age header (usually several hours). Shortly before they expire they are
+refreshed in a background thread, so requests never wait for Google except
+on a cold start before warm-up finished. If Google cannot be reached the
+last certificates stay in use and fetching is retried at most once a
+minute. The app starts warm-up from ``create_app`` (``warm_up``).
+
+A token is accepted when it is RS256-signed by a current certificate (kid),
+its audience is the Firebase project id, its issuer is
+https://securetoken.google.com/<project id>, it is not expired and it has a
+subject (the Firebase uid).
+
+Configuration (environment):
+- FIREBASE_PROJECT_ID: Firebase project id. If unset, the project_id of the
+  service account in FIREBASE_CREDENTIALS_JSON, FIREBASE_CREDENTIALS_PATH or
+  backend/ServiceAccountKey.json is used.
+- FIREBASE_CERTS_FILE: JSON file of {kid: PEM certificate} used instead of
+  fetching Google's certificates (offline development and tests; create one
+  with ``python create_fake_firebase_keys.py``)
+- FIREBASE_TOKEN_LEEWAY: seconds of clock skew tolerated (default 10)
+
+Usage:
+    from Main.firebase_tokens import verify_id_token, FirebaseTokenError
+    claims = verify_id_token(token)   # claims['uid'], claims['email'], ...
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+import jwt
+from cryptography import x509
+from Main.logger import get_logger
+
+CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+ISSUER_PREFIX = 'https://securetoken.google.com/'
+
+FIREBASE_TOKEN_LEEWAY = int(os.getenv('FIREBASE_TOKEN_LEEWAY', 10))
+
+# Used when Google sends no max-age
+DEFAULT_MAX_AGE = 3600
+# Refresh in the background this long before the certificates expire
+REFRESH_AHEAD = 300
+# Minimum seconds between fetches triggered by failures or unknown key ids
+MIN_FETCH_INTERVAL = 60
+FETCH_TIMEOUT = 10
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+log = get_logger(__name__)
+
+
+class FirebaseTokenError(Exception):
+    """Raised when a Firebase ID token is invalid"""
+
+
+class FirebaseNotConfigured(Exception):
+    """Raised when no Firebase project id is configured"""
+
+
+class FirebaseKeysUnavailable(Exception):
+    """Raised when Google's signing certificates cannot be loaded"""
+
+
+def _service_account_project_id():
+    """project_id of the configured service account, if any"""
+    creds_json = os.getenv('FIREBASE_CREDENTIALS_JSON')
+    if creds_json:
+        try:
+            return json.loads(creds_json).get('project_id')
+        except (ValueError, AttributeError) as e:
+            log.error('could not parse FIREBASE_CREDENTIALS_JSON', extra={'error': str(e)})
+
+    cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH')
+    if not cred_path:
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        cred_path = os.path.join(backend_dir, 'ServiceAccountKey.json')
+    if os.path.exists(cred_path):
+        try:
+            with open(cred_path) as f:
+                return json.load(f).get('project_id')
+        except (OSError, ValueError, AttributeError) as e:
+            log.error('could not read firebase service account file', extra={'path': cred_path, 'error': str(e)})
+    return None
+
+
+def _load_certificates(certs):
+    """Map {kid: PEM certificate} to {kid: public key}"""
+    return {kid: x509.load_pem_x509_certificate(pem.encode()).public_key() for kid, pem in certs.items()}
+
+
+class KeyCache:
+    """Google's token signing keys, cached for their announced lifetime"""
+
+    def __init__(self, url=CERTS_URL, certs_file=None):
+        self.url = url
+        self.certs_file = certs_file
+        self.keys = {}
+        self.expires_at = 0.0
+        self.last_fetch = None
+        # Held for the whole fetch, so concurrent refreshes wait for one result;
+        # a verify with valid keys never takes it
+        self._fetch_lock = threading.Lock()
+        self._refreshing_lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self, kid):
+        """Public key for kid, or None if no current certificate has this id"""
+        now = time.monotonic()
+        if now >= self.expires_at:
+            # Cold start, or background refreshes failed: wait for a fetch
+            self.refresh()
+            if not self.keys:
+                raise FirebaseKeysUnavailable('Firebase signing certificates could not be loaded')
+        elif now >= self.expires_at - REFRESH_AHEAD:
+            self.refresh_in_background()
+
+        key = self.keys.get(kid)
+        if key is None and self._may_fetch():
+            # Signed with a key newer than our copy of the certificates
+            self.refresh()
+            key = self.keys.get(kid)
+        return key
+
+    def refresh(self):
+        """Fetch the certificates now (at most once per MIN_FETCH_INTERVAL); keep the current ones on failure"""
+        with self._fetch_lock:
+            if not self._may_fetch():
+                return
+            self.last_fetch = time.monotonic()
+            try:
+                keys, max_age = self._fetch()
+            except Exception as e:
+                log.warning('could not load firebase signing certificates', extra={'error': str(e)})
+                return
+            self.keys = keys
+            self.expires_at = time.monotonic() + max_age
+            log.info('firebase signing certificates loaded', extra={'count': len(keys), 'max_age': max_age})
+
+    def refresh_in_background(self):
+        with self._refreshing_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name='firebase-keys', daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    def _may_fetch(self):
+        return self.last_fetch is None or time.monotonic() - self.last_fetch >= MIN_FETCH_INTERVAL
+
+    def _fetch(self):
+        """Return ({kid: public key}, max-age seconds)"""
+        if self.certs_file:
+            with open(self.certs_file) as f:
+                # A local key set never changes, keep it for a day
+                return _load_certificates(json.load(f)), 86400
+
+        with urllib.request.urlopen(self.url, timeout=FETCH_TIMEOUT) as response:
+            certs = json.loads(response.read().decode())
+            match = MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else DEFAULT_MAX_AGE
+        return _load_certificates(certs), max_age
+
+
+_project_id = None
+_key_cache = None
+_init_lock = threading.Lock()
+
+
+def get_project_id():
+    global _project_id
+    if _project_id is None:
+        _project_id = os.getenv('FIREBASE_PROJECT_ID', '').strip() or _service_account_project_id() or ''
+    return _project_id
+
+
+def get_key_cache():
+    global _key_cache
+    if _key_cache is None:
+        with _init_lock:
+            if _key_cache is None:
+                _key_cache = KeyCache(certs_file=os.getenv('FIREBASE_CERTS_FILE', '').strip() or None)
+    return _key_cache
+
+
+def warm_up(app=None):
+    """Load the project id and start fetching the signing certificates in the background"""
+    if not get_project_id():
+        log.info('firebase project id not configured, google sign-in disabled')
+        return
+    get_key_cache().refresh_in_background()
+
+
+def verify_id_token(token):
+    """Verify a Firebase ID token and return its claims, with the user's id as 'uid'"""
+    project_id = get_project_id()
+    if not project_id:
+        raise FirebaseNotConfigured('Firebase project id is not configured')
+
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.InvalidTokenError as e:
+        raise FirebaseTokenError(f'Malformed token: {e}')
+    if header.get('alg') != 'RS256':
+        raise FirebaseTokenError('Token is not signed with RS256')
+
+    key = get_key_cache().get(header.get('kid'))
+    if key is None:
+        raise FirebaseTokenError('Token is signed with an unknown key')
+
+    try:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=['RS256'],
+            audience=project_id,
+            issuer=ISSUER_PREFIX + project_id,
+            leeway=FIREBASE_TOKEN_LEEWAY,
+            options={'require': ['exp', 'iat', 'aud', 'iss', 'sub']}
+        )
+    except jwt.InvalidTokenError as e:
+        raise FirebaseTokenError(str(e))
+
+    subject = claims['sub']
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise FirebaseTokenError('Token has an invalid subject')
+    if claims.get('auth_time', 0) > time.time() + FIREBASE_TOKEN_LEEWAY:
+        raise FirebaseTokenError('Token has an authentication time in the future')
+
+    claims['uid'] = subject
+    return claims
+
+
+def generate_fake_key_set(certs_path, kid='fake-key'):
+    """
+    Write a self-signed {kid: certificate} file usable as FIREBASE_CERTS_FILE
+    and return the PEM private key that signs matching tokens.
+    """
+    import datetime
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'fake-securetoken')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .sign(private_key, hashes.SHA256())
+    )
+    with open(certs_path, 'w') as f:
+        json.dump({kid: certificate.public_bytes(serialization.Encoding.PEM).decode()}, f)
+
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+
+
+def sign_fake_token(private_key, project_id, uid, email=None, name=None, kid='fake-key', lifetime=3600):
+    """An ID token signed with a fake key set, shaped like Firebase's"""
+    now = int(time.time())
+    claims = {
+        'iss': ISSUER_PREFIX + project_id,
+        'aud': project_id,
+        'auth_time': now,
+        'user_id': uid,
+        'sub': uid,
+        'iat': now,
+        'exp': now + lifetime,
+        'firebase': {'sign_in_provider': 'google.com'},
+    }
+    if email:
+        claims.update(email=email, email_verified=True)
+    if name:
+        claims['name'] = name
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
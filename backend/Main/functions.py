@@ -0,0 +1,170 @@
+from flask import request
+from Main.app import db
+from sqlalchemy import and_, or_, literal
+from datetime import datetime
+import base64
+import json
+
+# Response shapes supported by list endpoints (?view=summary|detail)
+RESPONSE_VIEWS = ('detail', 'summary')
+
+
+def get_response_view():
+    """
+    Read the response shape from the query string.
+    - view: 'detail' (default, full to_dict) or 'summary' (to_summary_dict)
+    - fields: optional comma-separated list of keys to keep
+    Returns (view, fields); view is None if the requested view is unknown.
+    """
+    view = request.args.get('view', 'detail', type=str).strip().lower() or 'detail'
+    if view not in RESPONSE_VIEWS:
+        return None, None
+
+    fields = request.args.get('fields', '', type=str)
+    fields = {field.strip() for field in fields.split(',') if field.strip()} or None
+    return view, fields
+
+
+def serialize(obj, view='detail', fields=None):
+    """Serialize a model in the requested view, keeping only the requested fields"""
+    data = obj.to_summary_dict() if view == 'summary' else obj.to_dict()
+    if fields:
+        data = {key: value for key, value in data.items() if key in fields}
+    return data
+
+
+# ==================== KEYSET PAGINATION ====================
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+
+def _cursor_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    payload = json.dumps([_cursor_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor produced by encode_cursor; raises ValueError if it is invalid"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Invalid cursor')
+    
+    return [_decode_cursor_value(column, value) for column, value in zip(columns, values)]
+
+
+def _decode_cursor_value(column, value):
+    """Convert one decoded JSON value to the column's python type; raises ValueError if it does not fit"""
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = None
+    
+    if python_type is datetime:
+        try:
+            return datetime.fromisoformat(value)
+        except (ValueError, TypeError) as e:
+            raise ValueError('Invalid cursor') from e
+    # bool is an int subclass, so it is only accepted where a bool is expected
+    if python_type is bool:
+        valid = isinstance(value, bool)
+    elif python_type is int:
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    elif python_type is float:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif python_type is str:
+        valid = isinstance(value, str)
+    else:
+        valid = isinstance(value, (bool, int, float, str))
+    if not valid:
+        raise ValueError('Invalid cursor')
+    return value
+
+
+def wants_keyset_page():
+    """True if the client asked for cursor pagination (?cursor= or ?limit=)"""
+    return 'cursor' in request.args or 'limit' in request.args
+
+
+def get_keyset_args(default_limit=DEFAULT_PAGE_LIMIT, max_limit=MAX_PAGE_LIMIT):
+    """Read (cursor, limit) from the query string"""
+    cursor = request.args.get('cursor', '', type=str).strip() or None
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+    return cursor, limit
+
+
+def keyset_paginate(query, columns, cursor=None, limit=DEFAULT_PAGE_LIMIT):
+    """
+    Fetch one page of a query ordered by the given columns, all descending
+    (the last column must be unique, e.g. the primary key). Rows after the
+    cursor are selected with a seek predicate instead of OFFSET, so every
+    page costs the same regardless of how deep the client has scrolled.
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for an invalid cursor.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        # (c1, c2, ...) < (v1, v2, ...) in descending order
+        conditions = []
+        for i, (column, value) in enumerate(zip(columns, values)):
+            equal_prefix = [columns[j] == values[j] for j in range(i)]
+            # literal() so booleans compare as bound values rather than SQL constants
+            conditions.append(and_(*equal_prefix, column < literal(value, column.type)))
+        query = query.filter(or_(*conditions))
+    
+    query = query.order_by(*[column.desc() for column in columns])
+    rows = query.limit(limit + 1).all()
+    
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return items, next_cursor
+
+
+# Ways to report the total row count alongside a keyset page (?total=)
+TOTAL_MODES = ('none', 'exact', 'approximate')
+
+
+def get_total_mode():
+    """Read the ?total= mode for keyset pages; returns None if it is unknown"""
+    mode = request.args.get('total', 'none', type=str).strip().lower() or 'none'
+    return mode if mode in TOTAL_MODES else None
+
+
+def count_rows(query, mode):
+    """
+    Count the rows of a query for a keyset page.
+    - 'none': skip counting (returns None)
+    - 'exact': SELECT COUNT(*)
+    - 'approximate': the planner's row estimate on PostgreSQL (no table scan),
+      falling back to an exact count on other databases
+    """
+    if mode == 'none':
+        return None
+    
+    query = query.enable_eagerloads(False).order_by(None)
+    if mode == 'approximate' and db.engine.dialect.name == 'postgresql':
+        compiled = query.statement.compile(dialect=db.engine.dialect)
+        plan = db.session.connection().exec_driver_sql(
+            'EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    
+    return query.count()
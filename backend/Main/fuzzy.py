@@ -0,0 +1,363 @@
+"""
+In-memory trigram index for typo-tolerant product search.
+
+Every word of a product's name, description, category name and supplier name
+is split into trigrams (pg_trgm style, padded with spaces). Matching is done
+in two steps:
+
+1. Filter: indexed words sharing enough trigrams with a query word are found
+   through the trigram posting lists, so the cost of a query depends on how
+   many indexed words look similar, not on the size of the catalog.
+2. Verify: each candidate word is scored once with a banded edit distance
+   that gives up as soon as the similarity threshold can no longer be met.
+
+The index is built lazily on first use, updated incrementally by the product
+routes, and re-synchronised from the database every
+``FUZZY_INDEX_REFRESH_SECONDS`` to pick up changes made by other workers.
+
+The same word lists also give each product a TF-IDF vector, used by
+``related()`` to find products that share uncommon words (see Main/similarity.py).
+"""
+
+import math
+import os
+import threading
+import time
+from collections import Counter
+from sqlalchemy import func
+from Main.app import db
+from Main.search import tokenize, product_document
+
+# Field weights, same ordering as the full-text index (name > description > category/supplier)
+FIELD_WEIGHTS = {
+    'name': 1.0,
+    'description': 0.7,
+    'category': 0.6,
+    'supplier': 0.6,
+}
+
+# Minimum trigram similarity for an indexed word to be considered a candidate
+TRIGRAM_THRESHOLD = 0.2
+
+# Minimum edit similarity (1 - distance / longer length) for a word to match
+WORD_THRESHOLD = 0.7
+
+# Minimum product score (mean of the best weighted match per query word)
+MIN_SCORE = 0.3
+
+# Words found in more than this share of products (and more than
+# RELATED_MIN_POSTINGS products) are too common to look up related products by
+RELATED_MAX_SHARE = 0.1
+RELATED_MIN_POSTINGS = 50
+
+
+def trigrams(word):
+    """Return the set of padded trigrams of a word"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_levenshtein(s1, s2, max_distance):
+    """
+    Levenshtein distance between two strings, computed only inside the
+    diagonal band |i - j| <= max_distance (Ukkonen). Returns max_distance + 1
+    as soon as the distance is known to exceed max_distance.
+    """
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    len1, len2 = len(s1), len(s2)
+    too_far = max_distance + 1
+    if len2 - len1 > max_distance:
+        return too_far
+
+    previous_row = [j if j <= max_distance else too_far for j in range(len2 + 1)]
+    for i in range(1, len1 + 1):
+        low = max(1, i - max_distance)
+        high = min(len2, i + max_distance)
+        current_row = [too_far] * (len2 + 1)
+        if low == 1:
+            current_row[0] = i if i <= max_distance else too_far
+        row_min = current_row[low - 1]
+        c1 = s1[i - 1]
+        for j in range(low, high + 1):
+            distance = min(
+                previous_row[j] + 1,
+                current_row[j - 1] + 1,
+                previous_row[j - 1] + (c1 != s2[j - 1])
+            )
+            if distance > too_far:
+                distance = too_far
+            current_row[j] = distance
+            if distance < row_min:
+                row_min = distance
+        if row_min > max_distance:
+            return too_far
+        previous_row = current_row
+
+    return min(previous_row[len2], too_far)
+
+
+def word_similarity(query_word, word, threshold=WORD_THRESHOLD):
+    """Similarity of two words (0-1), or 0.0 when below the threshold"""
+    if query_word == word:
+        return 1.0
+    if query_word in word or word in query_word:
+        return 0.9
+
+    longer = max(len(query_word), len(word))
+    max_distance = int(longer * (1 - threshold))
+    distance = bounded_levenshtein(query_word, word, max_distance)
+    if distance > max_distance:
+        return 0.0
+    return (longer - distance) / longer
+
+
+class TrigramIndex:
+    """Trigram posting lists over the words of every product"""
+
+    def __init__(self, refresh_seconds=30):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._token_ids = {}        # word -> token id
+        self._token_words = []      # token id -> word
+        self._token_sizes = []      # token id -> number of trigrams
+        self._postings = {}         # trigram -> set of token ids
+        self._token_products = {}   # token id -> {product_id: best field weight}
+        self._product_tokens = {}   # product_id -> set of token ids
+        self._norms = {}            # product_id -> TF-IDF vector length, valid until the next change
+        self._signature = None
+        self._checked_at = None
+
+    # ---------- maintenance ----------
+
+    def _token_id(self, word):
+        tid = self._token_ids.get(word)
+        if tid is None:
+            tid = len(self._token_sizes)
+            self._token_ids[word] = tid
+            self._token_words.append(word)
+            grams = trigrams(word)
+            self._token_sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(tid)
+        return tid
+
+    def _add(self, product_id, fields):
+        self._remove(product_id)
+        self._norms.clear()
+        tokens = set()
+        for field, value in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for word in set(tokenize(value)):
+                tid = self._token_id(word)
+                products = self._token_products.setdefault(tid, {})
+                if weight > products.get(product_id, 0.0):
+                    products[product_id] = weight
+                tokens.add(tid)
+        self._product_tokens[product_id] = tokens
+
+    def _remove(self, product_id):
+        self._norms.clear()
+        for tid in self._product_tokens.pop(product_id, ()):
+            products = self._token_products.get(tid)
+            if products is not None:
+                products.pop(product_id, None)
+                if not products:
+                    del self._token_products[tid]
+
+    @staticmethod
+    def _fields(product):
+        fields = product_document(product)
+        del fields['id']
+        return fields
+
+    def add_product(self, product):
+        """Index or re-index a single product"""
+        with self._lock:
+            if self._signature is not None:
+                self._add(product.id, self._fields(product))
+
+    def remove_product(self, product_id):
+        """Drop a product from the index"""
+        with self._lock:
+            if self._signature is not None:
+                self._remove(product_id)
+
+    def invalidate(self):
+        """Force a full rebuild on next use (e.g. after a category rename)"""
+        with self._lock:
+            self._signature = None
+
+    def _db_signature(self):
+        from Models.products import Product, Category
+
+        count, product_updated = db.session.query(func.count(Product.id), func.max(Product.updated_at)).one()
+        category_updated = db.session.query(func.max(Category.updated_at)).scalar()
+        return count, product_updated, category_updated
+
+    def _rebuild(self, signature):
+        from Models.products import Product, Category
+
+        self._reset()
+        category_names = dict(db.session.query(Category.id, Category.name).all())
+        rows = db.session.query(
+            Product.id, Product.name, Product.description, Product.category_id, Product.supplier_name
+        ).yield_per(1000)
+        for product_id, name, description, category_id, supplier_name in rows:
+            self._add(product_id, {
+                'name': name,
+                'description': description,
+                'category': category_names.get(category_id),
+                'supplier': supplier_name,
+            })
+        self._signature = signature
+
+    def _sync(self, signature):
+        """Apply product rows changed since the last signature, or rebuild"""
+        from Models.products import Product
+
+        old_count, old_product_updated, old_category_updated = self._signature
+        count, product_updated, category_updated = signature
+        if category_updated != old_category_updated or count < old_count or old_product_updated is None:
+            self._rebuild(signature)
+            return
+
+        changed = Product.query.filter(Product.updated_at >= old_product_updated).all()
+        for product in changed:
+            self._add(product.id, self._fields(product))
+        self._signature = signature
+        if len(self._product_tokens) != count:
+            self._rebuild(signature)
+
+    def ensure_fresh(self):
+        """Build the index on first use and periodically sync it with the database"""
+        with self._lock:
+            now = time.monotonic()
+            if self._signature is not None and self._checked_at is not None \
+                    and now - self._checked_at < self.refresh_seconds:
+                return
+            signature = self._db_signature()
+            if self._signature is None:
+                self._rebuild(signature)
+            elif signature != self._signature:
+                self._sync(signature)
+            self._checked_at = now
+
+    # ---------- querying ----------
+
+    def _word_matches(self, word, similarities):
+        """Return {product_id: weighted similarity} for one query word"""
+        grams = trigrams(word)
+        overlaps = Counter()
+        for gram in grams:
+            for tid in self._postings.get(gram, ()):
+                overlaps[tid] += 1
+
+        size = len(grams)
+        matches = {}
+        for tid, shared in overlaps.items():
+            if shared / (size + self._token_sizes[tid] - shared) < TRIGRAM_THRESHOLD:
+                continue
+            products = self._token_products.get(tid)
+            if not products:
+                continue
+            # Verify each candidate word once, however many products contain it
+            key = (word, tid)
+            similarity = similarities.get(key)
+            if similarity is None:
+                similarity = similarities[key] = word_similarity(word, self._token_words[tid])
+            if not similarity:
+                continue
+            for product_id, weight in products.items():
+                score = similarity * weight
+                if score > matches.get(product_id, 0.0):
+                    matches[product_id] = score
+        return matches
+
+    def search(self, search_query, limit=500):
+        """Return [(product_id, score)] sorted by descending relevance"""
+        words = tokenize(search_query)
+        if not words:
+            return []
+
+        self.ensure_fresh()
+        with self._lock:
+            totals = Counter()
+            similarities = {}
+            for word in words:
+                for product_id, score in self._word_matches(word, similarities).items():
+                    totals[product_id] += score
+
+        ranked = [(pid, total / len(words)) for pid, total in totals.items() if total / len(words) >= MIN_SCORE]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+    # ---------- related products ----------
+
+    def _idf(self, tid):
+        return math.log(len(self._product_tokens) / len(self._token_products[tid]))
+
+    def _norm(self, product_id):
+        norm = self._norms.get(product_id)
+        if norm is None:
+            norm = math.sqrt(sum(
+                (self._token_products[tid][product_id] * self._idf(tid)) ** 2
+                for tid in self._product_tokens[product_id]
+            ))
+            self._norms[product_id] = norm
+        return norm
+
+    def related(self, product_id, limit=50):
+        """
+        Return [(product_id, cosine)] of the products whose TF-IDF word vectors
+        (field weight x inverse document frequency) are closest to a product's.
+        Candidates are found through the product's less common words only, so
+        the cost does not grow with the size of the catalog.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            tokens = self._product_tokens.get(product_id)
+            if not tokens:
+                return []
+            norm = self._norm(product_id)
+            if not norm:
+                return []
+
+            max_postings = max(RELATED_MIN_POSTINGS, int(len(self._product_tokens) * RELATED_MAX_SHARE))
+            dots = Counter()
+            common = []
+            for tid in tokens:
+                products = self._token_products[tid]
+                if len(products) > max_postings:
+                    common.append(tid)
+                    continue
+                idf = self._idf(tid)
+                weight = products[product_id] * idf * idf
+                for other_id, other_weight in products.items():
+                    if other_id != product_id:
+                        dots[other_id] += weight * other_weight
+
+            # Common words still add to the score of the candidates found
+            for tid in common:
+                products = self._token_products[tid]
+                idf = self._idf(tid)
+                weight = products[product_id] * idf * idf
+                for other_id in dots:
+                    other_weight = products.get(other_id)
+                    if other_weight:
+                        dots[other_id] += weight * other_weight
+
+            ranked = [
+                (other_id, dot / (norm * self._norm(other_id)))
+                for other_id, dot in dots.items() if dot
+            ]
+
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+product_index = TrigramIndex(refresh_seconds=int(os.getenv('FUZZY_INDEX_REFRESH_SECONDS', 30)))
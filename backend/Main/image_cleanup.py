@@ -0,0 +1,145 @@
+"""
+Background deletion of product images from the image storage.
+
+Routes call ``release_images(urls)`` in the transaction that removes some
+image references (it keeps only images no other product uses, adds the URLs
+of their processed variants and removes their ``UploadedImage`` records),
+then ``delete_images(urls)`` once that transaction has been committed. The URLs are mapped to public ids and
+queued, and a background thread deletes them in batches (one Cloudinary
+``delete_resources`` call per 100 images) so request latency does not depend
+on the number of images or on the CDN. Failed deletions are retried with exponential backoff; ids that
+still fail are logged at ERROR level with their public ids for manual
+cleanup. The queue is in memory, so deletions still pending when the
+process exits are lost and leave orphaned (but unreferenced) CDN assets.
+
+Configuration (environment):
+- IMAGE_DELETE_RETRIES: attempts per image before giving up (default 5)
+- IMAGE_DELETE_RETRY_DELAY: seconds before the first retry, doubled on each
+  further attempt (default 5)
+"""
+
+import heapq
+import json
+import os
+import queue
+import threading
+import time
+from Main.app import db
+from Main.storage import get_storage, StorageError, DELETE_BATCH_SIZE
+from Main.logger import get_logger
+
+IMAGE_DELETE_RETRIES = int(os.getenv('IMAGE_DELETE_RETRIES', 5))
+IMAGE_DELETE_RETRY_DELAY = float(os.getenv('IMAGE_DELETE_RETRY_DELAY', 5))
+
+log = get_logger(__name__)
+
+_queue = queue.Queue()
+_thread = None
+_lock = threading.Lock()
+
+
+def _ensure_worker():
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        with _lock:
+            if _thread is None or not _thread.is_alive():
+                _thread = threading.Thread(target=_worker, name='image-cleanup', daemon=True)
+                _thread.start()
+
+
+def release_images(urls):
+    """
+    Of urls, return those no product references any more, plus the URLs of
+    their variants, and delete their UploadedImage records. Call after
+    deleting the referencing rows in the session; the caller commits.
+    """
+    from Models.products import Product, ProductImage, UploadedImage
+
+    urls = list(dict.fromkeys(url for url in urls if url))
+    if not urls:
+        return urls
+
+    # Uploads are deduplicated, so other products may share these images
+    db.session.flush()
+    referenced = {url for (url,) in db.session.query(Product.main_image_url).filter(Product.main_image_url.in_(urls))}
+    referenced.update(url for (url,) in db.session.query(ProductImage.image_url).filter(ProductImage.image_url.in_(urls)))
+    released = [url for url in urls if url not in referenced]
+    if not released:
+        return released
+
+    for uploaded in UploadedImage.query.filter(UploadedImage.image_url.in_(released)).all():
+        for url in json.loads(uploaded.variants or '{}').values():
+            if url not in released:
+                released.append(url)
+        db.session.delete(uploaded)
+    return released
+
+
+def delete_images(urls):
+    """Queue the stored images behind these URLs for deletion; return how many were queued"""
+    storage = get_storage()
+    public_ids = []
+    for url in urls:
+        public_id = storage.public_id_from_url(url)
+        if public_id and public_id not in public_ids:
+            public_ids.append(public_id)
+
+    if public_ids:
+        _ensure_worker()
+        for public_id in public_ids:
+            _queue.put((public_id, 1))
+    return len(public_ids)
+
+
+def _delete_batch(batch, retries):
+    """Delete one batch of (public_id, attempt); schedule failures on the retries heap"""
+    public_ids = [public_id for public_id, _ in batch]
+    try:
+        failed = set(get_storage().delete(public_ids))
+        error = 'deletion rejected'
+    except StorageError as e:
+        failed = set(public_ids)
+        error = str(e)
+    except Exception as e:
+        log.exception('image deletion failed')
+        failed = set(public_ids)
+        error = str(e)
+
+    if len(failed) < len(public_ids):
+        log.info('images deleted', extra={'count': len(public_ids) - len(failed)})
+
+    gave_up = []
+    for public_id, attempt in batch:
+        if public_id not in failed:
+            continue
+        if attempt >= IMAGE_DELETE_RETRIES:
+            gave_up.append(public_id)
+        else:
+            due = time.monotonic() + IMAGE_DELETE_RETRY_DELAY * 2 ** (attempt - 1)
+            heapq.heappush(retries, (due, public_id, attempt + 1))
+
+    if gave_up:
+        log.error('image deletion abandoned', extra={'public_ids': gave_up, 'error': error})
+    elif failed:
+        log.warning('image deletion will be retried', extra={'count': len(failed), 'error': error})
+
+
+def _worker():
+    retries = []  # heap of (due, public_id, attempt)
+    while True:
+        timeout = max(0.0, retries[0][0] - time.monotonic()) if retries else None
+        batch = []
+        try:
+            batch.append(_queue.get(timeout=timeout))
+            while len(batch) < DELETE_BATCH_SIZE:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        while retries and retries[0][0] <= now and len(batch) < DELETE_BATCH_SIZE:
+            _, public_id, attempt = heapq.heappop(retries)
+            batch.append((public_id, attempt))
+
+        if batch:
+            _delete_batch(batch, retries)
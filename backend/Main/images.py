@@ -0,0 +1,109 @@
+"""
+Image processing before upload.
+
+Uploaded photos are rotated upright (EXIF orientation), stripped of all
+metadata, downscaled and re-encoded as WebP (or AVIF) in one size per
+variant, so catalog pages can load a small card image instead of a
+multi-megabyte original:
+
+    thumbnail  200 px   (cart, order lines)
+    card       480 px   (product lists)
+    detail    1200 px   (product page; also used as the image's main URL)
+
+Sizes are the longest edge; images are never upscaled. Files Pillow cannot
+decode and animated images are uploaded unchanged and have no variants.
+
+``difference_hash`` gives decoded images a perceptual fingerprint, used by
+Main/uploads.py to recognise re-uploads of the same photo.
+
+Configuration (environment):
+- IMAGE_PROCESSING: 'on' (default) or 'off'
+- IMAGE_FORMAT: 'webp' (default) or 'avif' (falls back to WebP when the
+  installed Pillow cannot write AVIF)
+- IMAGE_QUALITY: encoder quality 1-100 (default 80)
+"""
+
+import io
+import os
+from PIL import Image, ImageOps, features
+from Main.logger import get_logger
+
+# (name, longest edge in pixels), smallest first
+VARIANTS = (
+    ('thumbnail', 200),
+    ('card', 480),
+    ('detail', 1200),
+)
+MAIN_VARIANT = 'detail'
+
+IMAGE_PROCESSING = os.getenv('IMAGE_PROCESSING', 'on').strip().lower() not in ('off', '0', 'false', 'no')
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'webp').strip().lower()
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 80))
+
+log = get_logger(__name__)
+
+
+def processing_enabled():
+    """True if uploads are converted to variants"""
+    return IMAGE_PROCESSING
+
+
+def _output_format():
+    if IMAGE_FORMAT == 'avif' and features.check('avif'):
+        return 'AVIF'
+    return 'WEBP'
+
+
+def load_image(file):
+    """
+    Decode an image file object into an upright RGB/RGBA image without
+    metadata, or return None (undecodable or animated).
+    """
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            if getattr(image, 'is_animated', False):
+                return None
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+            image.info = {}  # drop EXIF/XMP/ICC metadata
+            return image
+    except Exception as e:
+        log.warning('image could not be decoded', extra={'error': str(e)})
+        return None
+
+
+def render_variants(image):
+    """Encode a loaded image in every variant size; return {variant name: encoded bytes}"""
+    output_format = _output_format()
+    options = {'quality': IMAGE_QUALITY}
+    if output_format == 'WEBP':
+        options['method'] = 4  # encoder effort (0-6)
+    variants = {}
+    for name, size in VARIANTS:
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, format=output_format, **options)
+        variants[name] = buffer.getvalue()
+    return variants
+
+
+def difference_hash(image):
+    """
+    64-bit perceptual hash (dHash) of a loaded image as 16 hex digits: one bit
+    per horizontally adjacent pixel pair of a 9x8 grayscale thumbnail. Resized
+    or recompressed copies of a photo get the same or a very close hash.
+    """
+    pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f'{bits:016x}'
+
+
+def hash_distance(first, second):
+    """Number of differing bits between two difference hashes"""
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
@@ -0,0 +1,50 @@
+"""
+Stock reservation for orders.
+
+Stock is never read, checked in Python and written back, which would let two
+concurrent orders both see the last unit and oversell it. Each product is
+decremented with a single conditional UPDATE:
+
+    UPDATE products SET stock_quantity = stock_quantity - :q
+    WHERE id = :id AND stock_quantity >= :q
+
+The database evaluates the condition and the decrement atomically under the
+row lock, so a product can never go below zero. Products are always updated in
+ascending id order, so two orders touching the same products take their row
+locks in the same order and cannot deadlock. Locks are held until the caller
+commits or rolls back, so reserve stock as the last step before committing.
+"""
+
+from datetime import datetime
+from sqlalchemy import update
+from Main.app import db
+
+
+class InsufficientStock(Exception):
+    """Raised when a product does not have enough stock left for a reservation"""
+
+    def __init__(self, product_id, quantity):
+        super().__init__(f'Insufficient stock for product {product_id}')
+        self.product_id = product_id
+        self.quantity = quantity
+
+
+def reserve_stock(quantities):
+    """
+    Decrement stock for {product_id: quantity} inside the current transaction.
+    Raises InsufficientStock for the first product that cannot be reserved;
+    the caller must then roll back to release the products already reserved.
+    """
+    from Models.products import Product
+
+    now = datetime.utcnow()
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        result = db.session.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock_quantity >= quantity)
+            .values(stock_quantity=Product.stock_quantity - quantity, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            raise InsufficientStock(product_id, quantity)
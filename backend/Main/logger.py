@@ -0,0 +1,239 @@
+"""
+Structured logging.
+
+Every record is written as one JSON object per line:
+
+    {"ts": "2025-01-01T12:00:00.000Z", "level": "INFO", "logger": "guzone.Routes.products",
+     "msg": "order created", "request_id": "3f2c...", "order_id": 42}
+
+Extra fields are passed with ``extra=``. Records are encoded in the calling
+thread and written by a background thread, so a slow stdout never blocks a
+request. The queue between them is bounded: when it is full, records are
+dropped and counted, and the count is logged once there is room again.
+
+Configuration (environment):
+- LOG_LEVEL: minimum level, e.g. DEBUG, INFO (default), WARNING
+- LOG_SAMPLE_RATE: share of requests (0-1) whose DEBUG/INFO records are kept
+  (default 1). The decision is made once per request so a kept request is
+  logged completely. WARNING and above are always kept.
+- LOG_DEBUG_TOKEN: when set, a request sending ``X-Debug-Log: <token>`` is
+  logged at DEBUG level regardless of LOG_LEVEL and sampling.
+- LOG_QUEUE_SIZE: records waiting to be written before new ones are dropped
+  (default 10000)
+
+Each request gets a correlation id, taken from a client-supplied
+``X-Request-ID`` header or generated, attached to every record logged while
+handling it and echoed back in the ``X-Request-ID`` response header.
+
+Usage:
+    from Main.logger import get_logger
+    log = get_logger(__name__)
+    log.debug('cart loaded', extra={'lines': len(items)})
+
+Checking whether a level is enabled is a couple of attribute lookups, so
+debug calls cost next to nothing when debug logging is off. Prefer passing
+values in ``extra`` over formatting them into the message.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import request, g, has_request_context
+
+ROOT_LOGGER = 'guzone'
+REQUEST_ID_HEADER = 'X-Request-ID'
+DEBUG_HEADER = 'X-Debug-Log'
+
+# Accept client correlation ids only if they look like ids
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_settings = {
+    'level': logging.INFO,
+    'sample_rate': 1.0,
+    'debug_token': None,
+}
+_listener = None
+_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as a single JSON line"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _RequestContextFilter(logging.Filter):
+    """Attach the correlation id of the current request to a record"""
+
+    def filter(self, record):
+        if has_request_context() and 'request_id' in g:
+            record.request_id = g.request_id
+        return True
+
+
+class _EncodedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that ships the already JSON-encoded line. The queue is
+    bounded; a record that does not fit is dropped and counted, and the
+    number dropped is reported by the next record that fits.
+    """
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+        self._unreported = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        line = self.format(record)
+        return logging.makeLogRecord({'msg': line, 'levelno': record.levelno, 'levelname': record.levelname})
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._unreported += 1
+            return
+
+        if self._unreported:
+            with self._lock:
+                unreported, self._unreported = self._unreported, 0
+            notice = logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': 'log records dropped', 'dropped': unreported,
+            })
+            try:
+                self.queue.put_nowait(self.prepare(notice))
+            except queue.Full:
+                with self._lock:
+                    self._unreported += unreported
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    """Queue listener whose stop() waits for room in a full queue"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    Logger whose level check honours LOG_LEVEL, request sampling and
+    per-request debug. The underlying stdlib logger always lets records
+    through; this adapter is where they are filtered.
+    """
+
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def isEnabledFor(self, level):
+        if has_request_context():
+            if g.get('log_debug'):
+                return True
+            if level < logging.WARNING and not g.get('log_sampled', True):
+                return False
+        return level >= _settings['level']
+
+    def log(self, level, msg, *args, **kwargs):
+        if self.isEnabledFor(level):
+            self.logger.log(level, msg, *args, **kwargs)
+
+    def debug_enabled(self):
+        """True if DEBUG records would be written (guard for expensive debug-only work)"""
+        return self.isEnabledFor(logging.DEBUG)
+
+
+def get_logger(name):
+    """Return a structured logger, e.g. get_logger(__name__) for 'guzone.Routes.auth'"""
+    return StructuredLogger(logging.getLogger(f'{ROOT_LOGGER}.{name}'))
+
+
+def dropped_records():
+    """Records dropped so far because the output queue was full"""
+    return _handler.dropped if _handler is not None else 0
+
+
+def _level(value, default):
+    level = logging.getLevelName(str(value).strip().upper()) if value else default
+    return level if isinstance(level, int) else default
+
+
+def configure_logging():
+    """Install the JSON handler on the application logger (safe to call more than once)"""
+    global _listener, _handler
+
+    _settings['level'] = _level(os.getenv('LOG_LEVEL'), logging.INFO)
+    _settings['sample_rate'] = min(1.0, max(0.0, float(os.getenv('LOG_SAMPLE_RATE', 1))))
+    _settings['debug_token'] = os.getenv('LOG_DEBUG_TOKEN') or None
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(logging.DEBUG)
+    root.propagate = False
+    if _listener is not None:
+        return
+
+    records = queue.Queue(maxsize=max(1, int(os.getenv('LOG_QUEUE_SIZE', 10000))))
+    _handler = _EncodedQueueHandler(records)
+    _handler.setFormatter(JsonFormatter())
+    _handler.addFilter(_RequestContextFilter())
+    root.addHandler(_handler)
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter('%(message)s'))
+    _listener = _QueueListener(records, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def init_logging(app):
+    """Configure logging and give every request a correlation id"""
+    configure_logging()
+    access_log = get_logger('access')
+
+    @app.before_request
+    def _start_request_log():
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = request_id if REQUEST_ID_RE.match(request_id) else uuid.uuid4().hex
+        g.log_debug = bool(_settings['debug_token']) and request.headers.get(DEBUG_HEADER) == _settings['debug_token']
+        g.log_sampled = _settings['sample_rate'] >= 1.0 or random.random() < _settings['sample_rate']
+        g.log_started = time.perf_counter()
+
+    @app.after_request
+    def _finish_request_log(response):
+        if 'request_id' not in g:
+            return response
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        access_log.info('request', extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - g.log_started) * 1000, 1),
+        })
+        return response
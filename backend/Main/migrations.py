@@ -0,0 +1,440 @@
+"""
+Versioned database migrations.
+
+Schema changes are numbered migrations, applied in order by
+``python migrate.py`` at deploy time (e.g. as Railway's pre-deploy command)
+and recorded in the ``schema_migrations`` table, so each one runs exactly
+once per database. Application startup runs no DDL: ``check_schema`` only
+reads the recorded version and warns when migrations are pending.
+
+Migrations never read the models: each one spells out the tables, columns
+and indexes it creates, so it does the same thing whenever it runs. Version
+1 creates the tables of the first release. Versions 2-4 take over the former
+migrate_products.py, migrate_offers_discounts.py and migrate_token_version.py
+scripts, version 5 creates the tables added since the first release (and
+takes over migrate_image_registry.py) and version 6 adds the indexes of
+keyset pagination and conditional GET. They skip tables, columns and indexes
+that already exist, which lets them adopt databases set up before migrations
+were versioned (by ``db.create_all`` at startup and whichever of those
+scripts had been run). For the same reason new migrations should use
+``add_missing_columns`` and ``create_missing_indexes``.
+
+Adding a migration:
+    @migration(8, 'order_tracking_url')
+    def order_tracking_url(connection):
+        add_missing_columns(connection, 'orders', [('tracking_url', 'VARCHAR(500)')])
+"""
+
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, Text, Boolean, DateTime, Numeric, Float,
+    ForeignKey, Index, UniqueConstraint, inspect, text
+)
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from Main.logger import get_logger
+
+Migration = namedtuple('Migration', 'version name upgrade')
+
+MIGRATIONS = []
+
+log = get_logger(__name__)
+
+
+def migration(version, name):
+    """Register a function(connection) as the migration with this version"""
+    def register(upgrade):
+        MIGRATIONS.append(Migration(version, name, upgrade))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return upgrade
+    return register
+
+
+def latest_version():
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def add_missing_columns(connection, table_name, columns):
+    """Add (name, definition) columns the table does not have yet; return the names added"""
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    added = []
+    for name, definition in columns:
+        if name not in existing:
+            connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {name} {definition}'))
+            added.append(name)
+    return added
+
+
+def create_missing_indexes(connection, indexes):
+    """Create (name, table, columns) indexes that do not exist yet; return the names created"""
+    inspector = inspect(connection)
+    existing = {}
+    created = []
+    for name, table_name, columns in indexes:
+        if table_name not in existing:
+            existing[table_name] = {index['name'] for index in inspector.get_indexes(table_name)}
+        if name not in existing[table_name]:
+            connection.execute(text(f'CREATE INDEX {name} ON {table_name} ({", ".join(columns)})'))
+            created.append(name)
+    return created
+
+
+# Migrations ---------------------------------------------------------------
+
+@migration(1, 'create_tables')
+def create_tables(connection):
+    # The schema of the first release. Tables that already exist (databases
+    # set up by db.create_all at startup) are left as they are.
+    metadata = MetaData()
+    Table(
+        'users', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('username', String(80), unique=True, nullable=False, index=True),
+        Column('email', String(120), unique=True, nullable=False, index=True),
+        Column('password_hash', String(255), nullable=False),
+        Column('role', String(20), nullable=False),
+        Column('is_active', Boolean, nullable=False),
+        Column('created_at', DateTime, nullable=False),
+        Column('updated_at', DateTime),
+    )
+    Table(
+        'customers', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id'), unique=True, nullable=False, index=True),
+        Column('first_name', String(100), nullable=False),
+        Column('last_name', String(100), nullable=False),
+        Column('phone', String(20)),
+        Column('address', Text),
+        Column('city', String(100)),
+        Column('state', String(100)),
+        Column('zip_code', String(20)),
+        Column('country', String(100)),
+        Column('created_at', DateTime, nullable=False),
+        Column('updated_at', DateTime),
+    )
+    Table(
+        'admins', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id'), unique=True, nullable=False, index=True),
+        Column('first_name', String(100), nullable=False),
+        Column('last_name', String(100), nullable=False),
+        Column('phone', String(20)),
+        Column('department', String(100)),
+        Column('created_at', DateTime, nullable=False),
+        Column('updated_at', DateTime),
+    )
+    Table(
+        'categories', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String(100), unique=True, nullable=False, index=True),
+        Column('description', Text),
+        Column('is_active', Boolean, nullable=False),
+        Column('created_at', DateTime, nullable=False),
+        Column('updated_at', DateTime),
+    )
+    Table(
+        'offers', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String(200), nullable=False),
+        Column('description', Text),
+        Column('start_date', DateTime, nullable=False),
+        Column('end_date', DateTime, nullable=False),
+        Column('is_active', Boolean, nullable=False),
+        Column('created_at', DateTime, nullable=False),
+        Column('updated_at', DateTime),
+    )
+    Table(
+        'products', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String(200), nullable=False),
+        Column('description', Text),
+        Column('price', Numeric(10, 2), nullable=False),
+        Column('stock_quantity', Integer, nullable=False),
+        Column('category_id', Integer, ForeignKey('categories.id'), index=True),
+        Column('main_image_url', String(500)),
+        Column('sku', String(100), unique=True, index=True),
+        Column('is_active', Boolean, nullable=False),
+        Column('minimum_order', Integer),
+        Column('unit_term', String(50)),
+        Column('item_location', String(200)),
+        Column('supplier_name', String(200)),
+        Column('is_featured', Boolean, nullable=False),
+        Column('discount_percentage', Numeric(5, 2)),
+        Column('discount_start_date', DateTime),
+        Column('discount_end_date', DateTime),
+        Column('offer_id', Integer, ForeignKey('offers.id'), index=True),
+        Column('created_at', DateTime, nullable=False),
+        Column('updated_at', DateTime),
+    )
+    Table(
+        'product_images', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('product_id', Integer, ForeignKey('products.id'), nullable=False, index=True),
+        Column('image_url', String(500), nullable=False),
+        Column('alt_text', String(200)),
+        Column('display_order', Integer),
+        Column('created_at', DateTime, nullable=False),
+    )
+    Table(
+        'orders', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('customer_id', Integer, ForeignKey('customers.id'), nullable=False, index=True),
+        Column('order_number', String(50), unique=True, nullable=False, index=True),
+        Column('total_amount', Numeric(10, 2), nullable=False),
+        Column('status', String(50), nullable=False),
+        Column('shipping_address', Text, nullable=False),
+        Column('payment_status', String(50)),
+        Column('payment_method', String(50)),
+        Column('payment_confirmation_message', Text),
+        Column('notes', Text),
+        Column('created_at', DateTime, nullable=False),
+        Column('updated_at', DateTime),
+    )
+    Table(
+        'order_items', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('order_id', Integer, ForeignKey('orders.id'), nullable=False, index=True),
+        Column('product_id', Integer, ForeignKey('products.id'), nullable=False, index=True),
+        Column('quantity', Integer, nullable=False),
+        Column('unit_price', Numeric(10, 2), nullable=False),
+        Column('subtotal', Numeric(10, 2), nullable=False),
+        Column('created_at', DateTime, nullable=False),
+    )
+    Table(
+        'deliveries', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('order_id', Integer, ForeignKey('orders.id'), nullable=False, index=True),
+        Column('tracking_number', String(100), unique=True, nullable=False, index=True),
+        Column('carrier', String(100)),
+        Column('status', String(50), nullable=False),
+        Column('estimated_delivery_date', DateTime),
+        Column('actual_delivery_date', DateTime),
+        Column('current_location', String(200)),
+        Column('notes', Text),
+        Column('created_at', DateTime, nullable=False),
+        Column('updated_at', DateTime),
+    )
+    Table(
+        'delivery_updates', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('delivery_id', Integer, ForeignKey('deliveries.id'), nullable=False, index=True),
+        Column('status', String(50), nullable=False),
+        Column('location', String(200)),
+        Column('description', Text),
+        Column('created_at', DateTime, nullable=False),
+    )
+    metadata.create_all(bind=connection)
+
+
+@migration(2, 'product_details')
+def product_details(connection):
+    add_missing_columns(connection, 'products', [
+        ('minimum_order', 'INTEGER DEFAULT 1'),
+        ('unit_term', "VARCHAR(50) DEFAULT 'units'"),
+        ('item_location', 'VARCHAR(200)'),
+        ('supplier_name', 'VARCHAR(200)'),
+    ])
+
+
+@migration(3, 'offers_and_discounts')
+def offers_and_discounts(connection):
+    # The offers table itself is created by version 1. Foreign keys cannot be
+    # added to an existing SQLite table, so offer_id is a plain column there.
+    add_missing_columns(connection, 'products', [
+        ('is_featured', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+        ('discount_percentage', 'NUMERIC(5, 2)'),
+        ('discount_start_date', 'TIMESTAMP'),
+        ('discount_end_date', 'TIMESTAMP'),
+        ('offer_id', 'INTEGER REFERENCES offers(id)' if connection.dialect.name == 'postgresql' else 'INTEGER'),
+    ])
+
+
+@migration(4, 'user_token_version')
+def user_token_version(connection):
+    add_missing_columns(connection, 'users', [
+        ('token_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ])
+
+
+@migration(5, 'catalog_tables')
+def catalog_tables(connection):
+    # Tables added after the first release: the image registry and upload
+    # jobs (Main/uploads.py) and the precomputed similar products
+    # (Main/similarity.py). Databases that got uploaded_images from
+    # db.create_all before it had content hashes (the former
+    # migrate_image_registry.py) are given the hash columns.
+    metadata = MetaData()
+    Table('products', metadata, Column('id', Integer, primary_key=True))
+    Table(
+        'uploaded_images', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('image_url', String(500), unique=True, nullable=False, index=True),
+        Column('variants', Text),
+        Column('sha256', String(64), index=True),
+        Column('dhash', String(16), index=True),
+        Column('width', Integer),
+        Column('height', Integer),
+        Column('created_at', DateTime, nullable=False),
+    )
+    Table(
+        'upload_jobs', metadata,
+        Column('id', String(32), primary_key=True),
+        Column('status', String(20), nullable=False),
+        Column('filename', String(255)),
+        Column('image_url', String(500)),
+        Column('error', Text),
+        Column('created_at', DateTime, nullable=False),
+        Column('updated_at', DateTime),
+    )
+    Table(
+        'similar_products', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('product_id', Integer, ForeignKey('products.id'), nullable=False),
+        Column('similar_product_id', Integer, ForeignKey('products.id'), nullable=False, index=True),
+        Column('score', Float, nullable=False),
+        Column('updated_at', DateTime),
+        UniqueConstraint('product_id', 'similar_product_id', name='uq_similar_products_pair'),
+        Index('ix_similar_products_product_id_score', 'product_id', 'score'),
+    )
+    existing = set(inspect(connection).get_table_names())
+    metadata.create_all(bind=connection, tables=[
+        table for name, table in metadata.tables.items() if name != 'products' and name not in existing
+    ])
+
+    if 'uploaded_images' in existing:
+        add_missing_columns(connection, 'uploaded_images', [
+            ('sha256', 'VARCHAR(64)'),
+            ('dhash', 'VARCHAR(16)'),
+            ('width', 'INTEGER'),
+            ('height', 'INTEGER'),
+        ])
+        create_missing_indexes(connection, [
+            ('ix_uploaded_images_sha256', 'uploaded_images', ('sha256',)),
+            ('ix_uploaded_images_dhash', 'uploaded_images', ('dhash',)),
+        ])
+
+
+@migration(6, 'listing_indexes')
+def listing_indexes(connection):
+    # Keyset pagination (Main/functions.py) seeks on (created_at, id) of every
+    # paginated list; conditional GET validators of the catalog read
+    # max(updated_at) and the last discount boundaries of products
+    create_missing_indexes(connection, [
+        ('ix_products_featured_created_at_id', 'products', ('is_featured', 'created_at', 'id')),
+        ('ix_products_updated_at', 'products', ('updated_at',)),
+        ('ix_products_discount_start_date', 'products', ('discount_start_date',)),
+        ('ix_products_discount_end_date', 'products', ('discount_end_date',)),
+        ('ix_orders_customer_id_created_at_id', 'orders', ('customer_id', 'created_at', 'id')),
+        ('ix_orders_created_at_id', 'orders', ('created_at', 'id')),
+        ('ix_deliveries_created_at_id', 'deliveries', ('created_at', 'id')),
+        ('ix_users_created_at_id', 'users', ('created_at', 'id')),
+        ('ix_customers_created_at_id', 'customers', ('created_at', 'id')),
+        ('ix_admins_created_at_id', 'admins', ('created_at', 'id')),
+    ])
+
+
+@migration(7, 'product_search_index')
+def product_search_index(connection):
+    # Full-text index of Main/search.py, filled with the existing products
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS product_search ("
+            " product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,"
+            " document TSVECTOR NOT NULL)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_product_search_document "
+            "ON product_search USING GIN (document)"
+        ))
+        connection.execute(text(
+            "INSERT INTO product_search (product_id, document) SELECT p.id,"
+            " setweight(to_tsvector('simple', COALESCE(p.name, '')), 'A') ||"
+            " setweight(to_tsvector('simple', COALESCE(p.description, '')), 'B') ||"
+            " setweight(to_tsvector('simple', COALESCE(c.name, '')), 'C') ||"
+            " setweight(to_tsvector('simple', COALESCE(p.supplier_name, '')), 'C') "
+            "FROM products p LEFT JOIN categories c ON c.id = p.category_id "
+            "ON CONFLICT (product_id) DO NOTHING"
+        ))
+    elif dialect == 'sqlite':
+        try:
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+                "name, description, category, supplier, "
+                "tokenize='unicode61 remove_diacritics 2')"
+            ))
+        except OperationalError as e:
+            log.warning('sqlite has no fts5, product search falls back to fuzzy search', extra={'error': str(e)})
+            return
+        connection.execute(text(
+            "INSERT INTO product_search (rowid, name, description, category, supplier) "
+            "SELECT p.id, COALESCE(p.name, ''), COALESCE(p.description, ''), COALESCE(c.name, ''),"
+            " COALESCE(p.supplier_name, '') "
+            "FROM products p LEFT JOIN categories c ON c.id = p.category_id "
+            "WHERE p.id NOT IN (SELECT rowid FROM product_search)"
+        ))
+
+
+# Runner -------------------------------------------------------------------
+
+def _ensure_version_table(engine):
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version INTEGER PRIMARY KEY,"
+            " name VARCHAR(100) NOT NULL,"
+            " applied_at TIMESTAMP NOT NULL)"
+        ))
+
+
+def applied_versions(engine):
+    """Versions recorded in schema_migrations, or None if the table does not exist"""
+    try:
+        with engine.connect() as connection:
+            return {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+    except SQLAlchemyError:
+        return None
+
+
+def pending_migrations(engine):
+    applied = applied_versions(engine) or set()
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def upgrade(engine, on_apply=None):
+    """
+    Apply pending migrations in order, each in its own transaction, and
+    return them. on_apply(migration) is called before each one.
+    """
+    _ensure_version_table(engine)
+    pending = pending_migrations(engine)
+    for m in pending:
+        if on_apply:
+            on_apply(m)
+        with engine.begin() as connection:
+            m.upgrade(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {'version': m.version, 'name': m.name, 'applied_at': datetime.utcnow()}
+            )
+        log.info('migration applied', extra={'version': m.version, 'migration': m.name})
+    return pending
+
+
+def check_schema(app):
+    """Warn at startup if the database is behind the migrations (one query, no DDL)"""
+    from Main.app import db
+
+    with app.app_context():
+        try:
+            version = db.session.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar() or 0
+        except SQLAlchemyError:
+            db.session.rollback()
+            version = None
+
+    if version is None:
+        log.warning('database has no schema_migrations table, run `python migrate.py`')
+    elif version < latest_version():
+        log.warning('database migrations pending, run `python migrate.py`',
+                    extra={'version': version, 'latest': latest_version()})
+    return version
@@ -0,0 +1,156 @@
+"""
+Password hashing.
+
+Schemes:
+- argon2: Argon2id through the ``argon2-cffi`` package (in requirements.txt).
+  The default.
+- werkzeug: werkzeug.security (scrypt by default, or e.g. pbkdf2), used when
+  argon2-cffi is missing or PASSWORD_SCHEME=werkzeug.
+
+Hashes of either scheme are always verified, so existing users keep logging
+in. ``needs_rehash`` reports hashes made with another scheme or other
+parameters; login then re-hashes the password with the current settings.
+
+Hashing is deliberately expensive, so it runs on a bounded thread pool
+(both hashers release the GIL): at most PASSWORD_HASH_WORKERS hashes run at
+once per process and at most PASSWORD_HASH_QUEUE more wait. Beyond that
+``PasswordHasherBusy`` is raised and the route answers 503, instead of
+login peaks pinning every CPU core and starving the other endpoints.
+
+Configuration (environment):
+- PASSWORD_SCHEME: 'argon2' or 'werkzeug' (default: argon2 if installed)
+- ARGON2_TIME_COST: iterations (default 2)
+- ARGON2_MEMORY_COST: memory in KiB (default 19456, i.e. 19 MiB)
+- ARGON2_PARALLELISM: lanes (default 1)
+- PASSWORD_HASH_METHOD: werkzeug method (default werkzeug's, 'scrypt')
+- PASSWORD_HASH_WORKERS: concurrent hashes per process (default: CPU count)
+- PASSWORD_HASH_QUEUE: hashes allowed to wait for a worker (default 32)
+- PASSWORD_HASH_TIMEOUT: seconds to wait for a worker (default 10)
+
+Run ``python benchmark_password_hashing.py`` to measure logins/sec per core
+with the current settings.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+from Main.logger import get_logger
+
+try:
+    import argon2
+except ImportError:  # optional dependency
+    argon2 = None
+
+ARGON2_PREFIX = '$argon2'
+
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 0)) or os.cpu_count() or 1
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+
+log = get_logger(__name__)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already running or waiting"""
+
+
+def _scheme():
+    scheme = os.getenv('PASSWORD_SCHEME', '').strip().lower() or ('argon2' if argon2 else 'werkzeug')
+    if scheme == 'argon2' and argon2 is None:
+        log.warning('PASSWORD_SCHEME=argon2 but argon2-cffi is not installed, using werkzeug')
+        return 'werkzeug'
+    return scheme if scheme in ('argon2', 'werkzeug') else 'werkzeug'
+
+
+SCHEME = _scheme()
+WERKZEUG_METHOD = os.getenv('PASSWORD_HASH_METHOD', '').strip() or None
+
+_argon2_hasher = argon2.PasswordHasher(
+    time_cost=int(os.getenv('ARGON2_TIME_COST', 2)),
+    memory_cost=int(os.getenv('ARGON2_MEMORY_COST', 19456)),
+    parallelism=int(os.getenv('ARGON2_PARALLELISM', 1)),
+    type=argon2.Type.ID
+) if argon2 else None
+
+_current_werkzeug_prefix = None
+_executor = None
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password')
+    return _executor
+
+
+def _run(fn, *args):
+    """Run fn on the hashing pool and wait for its result"""
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusy('Too many password operations in progress')
+    try:
+        future = _get_executor().submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    # The slot is held until the hash has finished (or was cancelled), not
+    # just while the caller waits, so timed-out hashes still count
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()  # Nobody waits for it any more; drops it if still queued
+        raise PasswordHasherBusy('Timed out waiting for a password worker')
+
+
+def _hash(password):
+    if SCHEME == 'argon2':
+        return _argon2_hasher.hash(password)
+    if WERKZEUG_METHOD:
+        return generate_password_hash(password, method=WERKZEUG_METHOD)
+    return generate_password_hash(password)
+
+
+def _verify(password_hash, password):
+    if password_hash.startswith(ARGON2_PREFIX):
+        if argon2 is None:
+            log.error('argon2 password hash found but argon2-cffi is not installed')
+            return False
+        try:
+            return _argon2_hasher.verify(password_hash, password)
+        except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHashError):
+            return False
+    return check_password_hash(password_hash, password)
+
+
+def hash_password(password):
+    """Hash a password with the current scheme and parameters"""
+    return _run(_hash, password)
+
+
+def verify_password(password_hash, password):
+    """True if password matches a hash of any supported scheme"""
+    if not password_hash or password is None:
+        return False
+    return _run(_verify, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True if a hash was not made with the current scheme and parameters"""
+    if SCHEME == 'argon2':
+        return not password_hash.startswith(ARGON2_PREFIX) or _argon2_hasher.check_needs_rehash(password_hash)
+    if password_hash.startswith(ARGON2_PREFIX):
+        return True
+    return password_hash.split('$', 1)[0] != _werkzeug_prefix()
+
+
+def _werkzeug_prefix():
+    """Method prefix of current werkzeug hashes, e.g. 'scrypt:32768:8:1' (computed once)"""
+    global _current_werkzeug_prefix
+    if _current_werkzeug_prefix is None:
+        _current_werkzeug_prefix = _hash('').split('$', 1)[0]
+    return _current_werkzeug_prefix
@@ -0,0 +1,147 @@
+"""
+Full-text search index for the product catalog.
+
+Products are indexed on name, description, category name and supplier name.
+The index lives in the database next to the catalog:
+
+- PostgreSQL: a ``product_search`` table holding a weighted ``tsvector`` per
+  product, with a GIN index on it.
+- SQLite: an FTS5 virtual table ``product_search`` whose rowid is the product id.
+
+The index is created and filled by a migration (``python migrate.py``).
+Routes keep it in sync by calling ``index_product`` / ``remove_product``
+inside the same transaction as the catalog change. If the database supports
+neither engine or the index does not exist, ``search_backend()`` returns None
+and callers fall back to the trigram fuzzy search of Main/fuzzy.py.
+"""
+
+import re
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from Main.app import db
+from Main.logger import get_logger
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Relative weight of each indexed field (name > description > category/supplier)
+FTS5_COLUMN_WEIGHTS = (10.0, 4.0, 2.0, 2.0)
+
+log = get_logger(__name__)
+
+
+def tokenize(value):
+    """Split free text into lowercase word tokens"""
+    if not value:
+        return []
+    return TOKEN_RE.findall(value.lower())
+
+
+def search_backend():
+    """Return the active search backend ('postgresql', 'fts5') or None"""
+    return current_app.config.get('SEARCH_BACKEND')
+
+
+def init_search_index(app):
+    """Detect the search backend; the index itself is created by a migration (Main/migrations.py)"""
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        backend = {'postgresql': 'postgresql', 'sqlite': 'fts5'}.get(dialect)
+        if backend:
+            try:
+                db.session.execute(text("SELECT 1 FROM product_search LIMIT 1"))
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                log.warning('full-text search unavailable, falling back to fuzzy search', extra={'error': str(e)})
+                backend = None
+
+        app.config['SEARCH_BACKEND'] = backend
+
+
+def product_document(product):
+    """Collect the indexed fields of a product"""
+    from Models.products import Category
+
+    # product.category may be stale when category_id was just reassigned
+    category = product.category
+    if category is None or category.id != product.category_id:
+        category = Category.query.get(product.category_id) if product.category_id else None
+
+    return {
+        'id': product.id,
+        'name': product.name or '',
+        'description': product.description or '',
+        'category': category.name if category else '',
+        'supplier': product.supplier_name or '',
+    }
+
+
+def index_product(product):
+    """Insert or refresh a product in the search index (caller commits)"""
+    backend = search_backend()
+    if not backend:
+        return
+
+    db.session.flush()  # Get product.id
+    params = product_document(product)
+    if backend == 'postgresql':
+        db.session.execute(text(
+            "INSERT INTO product_search (product_id, document) VALUES (:id, "
+            " setweight(to_tsvector('simple', :name), 'A') || "
+            " setweight(to_tsvector('simple', :description), 'B') || "
+            " setweight(to_tsvector('simple', :category), 'C') || "
+            " setweight(to_tsvector('simple', :supplier), 'C')) "
+            "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document"
+        ), params)
+    else:
+        db.session.execute(text("DELETE FROM product_search WHERE rowid = :id"), {'id': product.id})
+        db.session.execute(text(
+            "INSERT INTO product_search (rowid, name, description, category, supplier) "
+            "VALUES (:id, :name, :description, :category, :supplier)"
+        ), params)
+
+
+def remove_product(product_id):
+    """Drop a product from the search index (caller commits)"""
+    backend = search_backend()
+    if backend == 'postgresql':
+        db.session.execute(text("DELETE FROM product_search WHERE product_id = :id"), {'id': product_id})
+    elif backend == 'fts5':
+        db.session.execute(text("DELETE FROM product_search WHERE rowid = :id"), {'id': product_id})
+
+
+def index_category_products(category):
+    """Re-index every product of a category, e.g. after it was renamed (caller commits)"""
+    for product in category.products:
+        index_product(product)
+
+
+def match_subquery(search_query):
+    """
+    Build a subquery of (product_id, rank) rows matching the search query.
+
+    Every query token must match, either as a whole word or as a word prefix.
+    Higher rank means more relevant. Returns None if the query has no tokens.
+    """
+    tokens = tokenize(search_query)
+    if not tokens:
+        return None
+
+    backend = search_backend()
+    if backend == 'postgresql':
+        ts_query = ' & '.join(f'{token}:*' for token in tokens)
+        stmt = text(
+            "SELECT product_id, ts_rank(document, to_tsquery('simple', :q)) AS rank "
+            "FROM product_search WHERE document @@ to_tsquery('simple', :q)"
+        )
+    else:
+        ts_query = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(w) for w in FTS5_COLUMN_WEIGHTS)
+        stmt = text(
+            f"SELECT rowid AS product_id, -bm25(product_search, {weights}) AS rank "
+            "FROM product_search WHERE product_search MATCH :q"
+        )
+
+    return stmt.bindparams(q=ts_query).columns(
+        product_id=db.Integer, rank=db.Float
+    ).subquery('search_hits')
@@ -0,0 +1,143 @@
+"""
+Precomputed "similar products" lists.
+
+The SIMILAR_PRODUCTS_TOP_N products most similar to each product are stored in
+the ``similar_products`` table, so a product page reads them with one indexed
+lookup instead of running keyword searches on every view.
+
+Similarity is the cosine of the products' TF-IDF word vectors (name,
+description, category and supplier words, see TrigramIndex.related) plus
+CATEGORY_BONUS when both products are in the same category. When too few
+products share words, the list is filled with the newest products of the
+same category.
+
+Lists are kept current in two ways:
+- Incrementally: ``refresh_product`` is called when a product is created or
+  updated. It recomputes the product's own list and adds the product to the
+  lists of its neighbours.
+- Offline: ``refresh_similar_products.py`` rebuilds every list. Word
+  frequencies drift as the catalog grows, so run it periodically (e.g. nightly).
+"""
+
+import os
+from Main.app import db
+from Main.fuzzy import product_index
+
+TOP_N = int(os.getenv('SIMILAR_PRODUCTS_TOP_N', 12))
+
+# Added to the word similarity of two products in the same category
+CATEGORY_BONUS = 0.3
+
+# Word-similar candidates considered per product before the category bonus is applied
+CANDIDATES = TOP_N * 5
+
+
+def compute_similar(product_id, category_id, related, category_ids, same_category):
+    """
+    Rank the products most similar to a product.
+    - related: [(product_id, cosine)] from TrigramIndex.related
+    - category_ids: {product_id: category_id} covering the word-similar candidates
+    - same_category: ids of products in the product's category, newest first
+    Returns [(product_id, score)] sorted by descending score.
+    """
+    scores = {}
+    for other_id, cosine in related:
+        bonus = CATEGORY_BONUS if category_id and category_ids.get(other_id) == category_id else 0.0
+        scores[other_id] = cosine + bonus
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:TOP_N]
+    if category_id:
+        for other_id in same_category:
+            if len(ranked) >= TOP_N:
+                break
+            if other_id != product_id and other_id not in scores:
+                scores[other_id] = CATEGORY_BONUS
+                ranked.append((other_id, CATEGORY_BONUS))
+    return ranked
+
+
+def _store(product_id, ranked):
+    from Models.products import SimilarProduct
+
+    SimilarProduct.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+    db.session.add_all([
+        SimilarProduct(product_id=product_id, similar_product_id=other_id, score=score)
+        for other_id, score in ranked
+    ])
+
+
+def refresh_product(product):
+    """
+    Recompute the similar products of a committed product and add it to its
+    neighbours' lists (caller commits). Neighbours it no longer resembles keep
+    it until the next full rebuild.
+    """
+    from Models.products import Product, SimilarProduct
+
+    related = product_index.related(product.id, limit=CANDIDATES)
+    candidates = [other_id for other_id, _ in related]
+    category_ids = dict(
+        db.session.query(Product.id, Product.category_id).filter(Product.id.in_(candidates)).all()
+    ) if candidates else {}
+    same_category = []
+    if product.category_id:
+        same_category = [row[0] for row in db.session.query(Product.id).filter(
+            Product.category_id == product.category_id, Product.id != product.id
+        ).order_by(Product.id.desc()).limit(TOP_N).all()]
+
+    ranked = compute_similar(product.id, product.category_id, related, category_ids, same_category)
+    _store(product.id, ranked)
+
+    # Similarity is symmetric: the product may now belong in its neighbours' lists
+    neighbour_scores = dict(ranked)
+    lists = {}
+    for row in SimilarProduct.query.filter(SimilarProduct.product_id.in_(list(neighbour_scores))).all():
+        lists.setdefault(row.product_id, []).append(row)
+    for other_id, score in neighbour_scores.items():
+        rows = lists.get(other_id, [])
+        existing = next((row for row in rows if row.similar_product_id == product.id), None)
+        if existing is not None:
+            existing.score = score
+            continue
+        if len(rows) >= TOP_N:
+            worst = min(rows, key=lambda row: row.score)
+            if worst.score >= score:
+                continue
+            db.session.delete(worst)
+        db.session.add(SimilarProduct(product_id=other_id, similar_product_id=product.id, score=score))
+
+
+def remove_product(product_id):
+    """Drop a product's list and remove it from every other list (caller commits)"""
+    from Models.products import SimilarProduct
+
+    SimilarProduct.query.filter(
+        (SimilarProduct.product_id == product_id) | (SimilarProduct.similar_product_id == product_id)
+    ).delete(synchronize_session=False)
+
+
+def rebuild_all(batch_size=500):
+    """Recompute the similar products of every product (caller commits)"""
+    from Models.products import Product, SimilarProduct
+
+    product_index.invalidate()
+    product_index.ensure_fresh()
+
+    category_ids = dict(db.session.query(Product.id, Product.category_id).all())
+    category_members = {}
+    for product_id in sorted(category_ids, reverse=True):
+        category_members.setdefault(category_ids[product_id], []).append(product_id)
+
+    SimilarProduct.query.delete(synchronize_session=False)
+    rows = []
+    for product_id, category_id in category_ids.items():
+        same_category = category_members.get(category_id, [])[:TOP_N + 1] if category_id else []
+        related = product_index.related(product_id, limit=CANDIDATES)
+        for other_id, score in compute_similar(product_id, category_id, related, category_ids, same_category):
+            rows.append({'product_id': product_id, 'similar_product_id': other_id, 'score': score})
+        if len(rows) >= batch_size:
+            db.session.execute(SimilarProduct.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(SimilarProduct.__table__.insert(), rows)
+    return len(category_ids)
@@ -0,0 +1,207 @@
+"""
+Image storage for product images.
+
+Backends:
+- CloudinaryStorage: uploads to Cloudinary (default). The SDK is configured
+  once, when the backend is created, from CLOUDINARY_CLOUD_NAME,
+  CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET.
+- LocalStorage: writes files to a local directory and returns ``file://``
+  URLs. Needs no network or credentials, for development and offline tests.
+
+Configuration (environment):
+- IMAGE_STORAGE: 'cloudinary' (default) or 'local'
+- IMAGE_STORAGE_DIR: directory of the local backend (default <tmp>/guzone_images)
+- IMAGE_STORAGE_DELAY: seconds the local backend sleeps per upload, to
+  simulate CDN latency (default 0)
+
+Usage:
+    from Main.storage import get_storage, StorageError
+    image_url = get_storage().upload(file, public_id)
+
+Images are deleted in the background through Main/image_cleanup.py, which
+maps URLs to public ids with ``public_id_from_url`` and removes them in
+batches with ``delete``.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from Main.logger import get_logger
+
+FOLDER = 'guzone_products'
+
+# Cloudinary's delete_resources accepts at most 100 public ids per call
+DELETE_BATCH_SIZE = 100
+
+# https://res.cloudinary.com/{cloud}/image/upload/[{transformations}/][v{version}/]{public_id}.{format}
+CLOUDINARY_URL_RE = re.compile(r'/upload/(.+?)(?:\.[^./]+)?$')
+# Path components before the public id: a version (v1699999999) or transformations (c_fill,w_300)
+CLOUDINARY_PREFIX_RE = re.compile(r'^(?:v\d+|[a-z]{1,3}_.*)$')
+
+log = get_logger(__name__)
+
+
+class StorageError(Exception):
+    """Raised when an image cannot be stored (or storage is not configured)"""
+
+
+class CloudinaryStorage:
+    """Cloudinary image storage"""
+
+    name = 'cloudinary'
+
+    def __init__(self, cloud_name, api_key, api_secret):
+        import cloudinary
+        self.configured = all([cloud_name, api_key, api_secret])
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret)
+
+    def check(self):
+        """Raise StorageError if uploads cannot work"""
+        if not self.configured:
+            raise StorageError(
+                'Cloudinary not configured. Please set CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, and CLOUDINARY_API_SECRET environment variables.'
+            )
+
+    def upload(self, file, public_id):
+        """Upload a file object and return its URL"""
+        import cloudinary.exceptions
+        import cloudinary.uploader
+
+        self.check()
+        try:
+            result = cloudinary.uploader.upload(
+                file,
+                folder=FOLDER,
+                public_id=public_id,
+                resource_type='image',
+                overwrite=False,
+                invalidate=True  # Invalidate CDN cache
+            )
+        except cloudinary.exceptions.Error as e:
+            raise StorageError(f'Cloudinary upload failed: {e}') from e
+
+        image_url = result.get('secure_url') or result.get('url')
+        if not image_url:
+            raise StorageError('Failed to get image URL from Cloudinary')
+        return image_url
+
+    def public_id_from_url(self, url):
+        """Public id of a Cloudinary image URL (None for other URLs)"""
+        return cloudinary_public_id(url)
+
+    def delete(self, public_ids):
+        """Delete up to DELETE_BATCH_SIZE images; return the public ids that could not be deleted"""
+        import cloudinary.api
+        import cloudinary.exceptions
+
+        self.check()
+        try:
+            result = cloudinary.api.delete_resources(list(public_ids), resource_type='image')
+        except cloudinary.exceptions.Error as e:
+            raise StorageError(f'Cloudinary deletion failed: {e}') from e
+
+        # Each id maps to 'deleted' or 'not_found' (already gone); anything else failed
+        deleted = result.get('deleted', {})
+        return [public_id for public_id in public_ids if deleted.get(public_id) not in ('deleted', 'not_found')]
+
+
+class LocalStorage:
+    """Stores images in a local directory (development and offline tests)"""
+
+    name = 'local'
+
+    def __init__(self, directory, delay=0.0):
+        self.directory = directory
+        self.delay = delay
+
+    def check(self):
+        """Raise StorageError if uploads cannot work"""
+
+    def upload(self, file, public_id):
+        """Copy a file object into the storage directory and return its file:// URL"""
+        if self.delay:
+            time.sleep(self.delay)
+        path = os.path.join(self.directory, FOLDER, public_id)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as out:
+                shutil.copyfileobj(file, out)
+        except OSError as e:
+            raise StorageError(f'Local storage failed: {e}') from e
+        return 'file://' + os.path.abspath(path)
+
+    def public_id_from_url(self, url):
+        """Public id of an image stored by this backend (None for other URLs)"""
+        prefix = 'file://' + os.path.abspath(self.directory) + os.sep
+        if not url or not url.startswith(prefix):
+            return None
+        return url[len(prefix):]
+
+    def delete(self, public_ids):
+        """Delete stored images; return the public ids that could not be deleted"""
+        failed = []
+        for public_id in public_ids:
+            try:
+                os.remove(os.path.join(self.directory, public_id))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                failed.append(public_id)
+        return failed
+
+
+def cloudinary_public_id(url):
+    """
+    Public id (including the folder) of a Cloudinary image URL, or None if the
+    URL is not a Cloudinary upload URL. Transformations and the version
+    component are skipped; ids without the product folder get it prepended,
+    as all product images are uploaded there.
+    """
+    if not url or 'cloudinary.com' not in url:
+        return None
+    match = CLOUDINARY_URL_RE.search(url)
+    if not match:
+        return None
+
+    parts = match.group(1).split('/')
+    while len(parts) > 1 and CLOUDINARY_PREFIX_RE.match(parts[0]):
+        parts.pop(0)
+    public_id = '/'.join(parts)
+    if not public_id.startswith(FOLDER + '/'):
+        public_id = f'{FOLDER}/{parts[-1]}'
+    return public_id
+
+
+_storage = None
+_lock = threading.Lock()
+
+
+def create_storage():
+    """Create the storage backend selected by IMAGE_STORAGE"""
+    backend = os.getenv('IMAGE_STORAGE', 'cloudinary').strip().lower()
+    if backend == 'local':
+        return LocalStorage(
+            os.getenv('IMAGE_STORAGE_DIR') or os.path.join(tempfile.gettempdir(), 'guzone_images'),
+            delay=float(os.getenv('IMAGE_STORAGE_DELAY', 0))
+        )
+    if backend != 'cloudinary':
+        log.warning('unknown IMAGE_STORAGE, using cloudinary', extra={'backend': backend})
+    return CloudinaryStorage(
+        os.getenv('CLOUDINARY_CLOUD_NAME'),
+        os.getenv('CLOUDINARY_API_KEY'),
+        os.getenv('CLOUDINARY_API_SECRET')
+    )
+
+
+def get_storage():
+    """Return the process-wide storage backend, creating it on first use"""
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                _storage = create_storage()
+                log.info('image storage configured', extra={'backend': _storage.name})
+    return _storage
@@ -0,0 +1,340 @@
+"""
+Image uploads.
+
+Incoming files are first streamed to a spool file on local disk by
+``spool_stream``, in fixed-size chunks, so memory per upload stays constant
+whatever the file size. The first chunk is checked against the image magic
+bytes (the extension alone is not trusted) and the content is hashed
+(SHA-256) on the way through.
+
+Files are then converted to resized variants (Main/images.py) unless they
+cannot be decoded; each variant is uploaded and the set is recorded as an
+``UploadedImage`` keyed by the main variant's URL, which is the URL returned
+to the client. If a variant upload or the commit fails, the files already
+stored are queued for deletion (Main/image_cleanup.py) and nothing is
+recorded.
+
+Uploads are deduplicated against the ``UploadedImage`` registry before
+anything is sent to the CDN: a file with the same SHA-256 as a registered
+image reuses that image's URL and variants. With IMAGE_DEDUP_MAX_DISTANCE set,
+so does an image whose perceptual hash (dHash) is that close to a registered
+image that is at least as large. The hash ignores colour, so perceptual
+matching can merge colour variants of the same product shot; it is off by
+default.
+
+Uploading to the CDN can take seconds, so ``submit_upload`` only records an
+``UploadJob`` row for a spooled file and returns. A thread pool in the same
+process then uploads the file through the storage backend
+(Main/storage.py) and records the final URL or the error on the job. Clients
+poll the job (GET /api/products/upload-image/jobs/<job_id>); since jobs live
+in the database, any worker can answer.
+
+Configuration (environment):
+- UPLOAD_WORKERS: upload threads per process (default 4)
+- UPLOAD_SPOOL_DIR: where files wait for their upload (default: system temp dir)
+- UPLOAD_JOB_TIMEOUT: seconds after which an unfinished job is reported as
+  failed, e.g. because its process was restarted (default 600)
+- IMAGE_DEDUP_MAX_DISTANCE: perceptual hash distance in bits (0-64) up to
+  which images count as the same (default: unset, exact content only)
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from Main.app import db
+from Main.storage import get_storage, StorageError
+from Main.image_cleanup import delete_images
+from Main.images import load_image, render_variants, processing_enabled, difference_hash, hash_distance, MAIN_VARIANT
+from Main.logger import get_logger
+
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 4))
+UPLOAD_JOB_TIMEOUT = int(os.getenv('UPLOAD_JOB_TIMEOUT', 600))
+
+IMAGE_DEDUP_MAX_DISTANCE = int(os.environ['IMAGE_DEDUP_MAX_DISTANCE']) if os.getenv('IMAGE_DEDUP_MAX_DISTANCE') else None
+
+CHUNK_SIZE = 64 * 1024
+
+log = get_logger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload')
+    return _executor
+
+
+class UploadRejected(Exception):
+    """Raised when an uploaded file is not an acceptable image"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class SpooledUpload(namedtuple('SpooledUpload', 'path filename size sha256 image_type')):
+    """An uploaded file waiting on local disk"""
+
+    __slots__ = ()
+
+    def discard(self):
+        """Remove the spool file"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+StoredImage = namedtuple('StoredImage', 'image_url variants duplicate')
+
+
+def detect_image_type(head):
+    """Image type from the first bytes of a file: 'png', 'jpeg', 'gif', 'webp' or None"""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def spool_stream(stream, filename, max_size=None):
+    """
+    Copy a binary stream to a spool file in CHUNK_SIZE chunks, checking the
+    image type on the first chunk and hashing as it goes. Raises
+    UploadRejected for non-images (400) and files over max_size bytes (413).
+    """
+    spool = tempfile.NamedTemporaryFile(
+        prefix='upload_', dir=os.getenv('UPLOAD_SPOOL_DIR') or None, delete=False
+    )
+    digest = hashlib.sha256()
+    size = 0
+    too_large = UploadRejected(f'File too large. Maximum size is {(max_size or 0) // (1024 * 1024)} MB', 413)
+    try:
+        with spool:
+            chunk = stream.read(CHUNK_SIZE)
+            while chunk and len(chunk) < 12:  # short first read; the signatures need 12 bytes
+                more = stream.read(CHUNK_SIZE)
+                if not more:
+                    break
+                chunk += more
+
+            image_type = detect_image_type(chunk)
+            if image_type is None:
+                raise UploadRejected('Invalid file content. Allowed types: png, jpg, jpeg, gif, webp')
+
+            while chunk:
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise too_large
+                digest.update(chunk)
+                spool.write(chunk)
+                chunk = stream.read(CHUNK_SIZE)
+    except RequestEntityTooLarge:
+        # The request stream enforces MAX_CONTENT_LENGTH itself
+        os.remove(spool.name)
+        raise too_large
+    except BaseException:
+        os.remove(spool.name)
+        raise
+
+    return SpooledUpload(spool.name, secure_filename(filename), size, digest.hexdigest(), image_type)
+
+
+def new_public_id(filename):
+    """Unique storage name for an uploaded file: <timestamp>_<name without extension>"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    return f"{timestamp}_{os.path.splitext(secure_filename(filename))[0]}"
+
+
+def find_by_content(sha256):
+    """Registered image uploaded from a file with this SHA-256, or None"""
+    from Models.products import UploadedImage
+
+    return UploadedImage.query.filter_by(sha256=sha256).order_by(UploadedImage.id).first()
+
+
+def find_similar(fingerprint, size):
+    """
+    Registered image whose perceptual hash is at most IMAGE_DEDUP_MAX_DISTANCE
+    bits from fingerprint and which is at least size (width, height), or None.
+    """
+    from Models.products import UploadedImage
+
+    if IMAGE_DEDUP_MAX_DISTANCE is None:
+        return None
+
+    at_least_as_large = (UploadedImage.width >= size[0], UploadedImage.height >= size[1])
+    if IMAGE_DEDUP_MAX_DISTANCE == 0:
+        return UploadedImage.query.filter(
+            UploadedImage.dhash == fingerprint, *at_least_as_large
+        ).order_by(UploadedImage.id).first()
+
+    candidates = db.session.query(UploadedImage.id, UploadedImage.dhash).filter(
+        UploadedImage.dhash.isnot(None), *at_least_as_large
+    ).all()
+    distance, image_id = min(
+        ((hash_distance(dhash, fingerprint), image_id) for image_id, dhash in candidates),
+        default=(None, None)
+    )
+    if image_id is not None and distance <= IMAGE_DEDUP_MAX_DISTANCE:
+        return UploadedImage.query.get(image_id)
+    return None
+
+
+def store_image(file, public_id, sha256=None):
+    """
+    Process and upload an image file object, unless the registry already has
+    the same image. Returns a StoredImage; variants is None when the original
+    was uploaded unchanged. If a variant fails to upload, those already
+    stored are queued for deletion before the error is raised. The caller
+    commits, or rolls back and calls discard_stored.
+    """
+    from Models.products import UploadedImage
+
+    existing = find_by_content(sha256) if sha256 else None
+    image = fingerprint = None
+    if existing is None:
+        image = load_image(file)
+        if image is not None:
+            fingerprint = difference_hash(image)
+            existing = find_similar(fingerprint, image.size)
+    if existing is not None:
+        log.info('duplicate upload, reusing image', extra={'image_id': existing.id})
+        return StoredImage(existing.image_url, existing.variant_urls(), True)
+
+    storage = get_storage()
+    if image is None or not processing_enabled():
+        file.seek(0)
+        image_url, variants = storage.upload(file, public_id), None
+    else:
+        variants = {}
+        try:
+            for name, data in render_variants(image).items():
+                variants[name] = storage.upload(io.BytesIO(data), f'{public_id}_{name}')
+        except Exception:
+            delete_images(list(variants.values()))
+            raise
+        image_url = variants[MAIN_VARIANT]
+
+    db.session.add(UploadedImage(
+        image_url=image_url,
+        variants=json.dumps(variants) if variants else None,
+        sha256=sha256,
+        dhash=fingerprint,
+        width=image.width if image else None,
+        height=image.height if image else None
+    ))
+    return StoredImage(image_url, variants, False)
+
+
+def discard_stored(stored):
+    """Queue the deletion of a StoredImage whose registry record was not committed"""
+    if stored is not None and not stored.duplicate:
+        delete_images([stored.image_url, *(stored.variants or {}).values()])
+
+
+def upload_now(upload):
+    """Upload a SpooledUpload in the calling thread and return its StoredImage"""
+    stored = None
+    try:
+        with open(upload.path, 'rb') as file:
+            stored = store_image(file, new_public_id(upload.filename), upload.sha256)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        discard_stored(stored)
+        raise
+    finally:
+        upload.discard()
+    return stored
+
+
+def submit_upload(upload):
+    """Queue the upload of a SpooledUpload and return its UploadJob"""
+    from Models.products import UploadJob
+
+    try:
+        get_storage().check()
+        job = UploadJob(id=uuid.uuid4().hex, status='pending', filename=upload.filename)
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        upload.discard()
+        raise
+
+    app = current_app._get_current_object()
+    _get_executor().submit(_run_job, app, job.id, upload, new_public_id(upload.filename))
+    log.info('upload queued', extra={'job_id': job.id, 'upload_filename': job.filename, 'size': upload.size})
+    return job
+
+
+def _set_status(job_id, **values):
+    from Models.products import UploadJob
+
+    job = UploadJob.query.get(job_id)
+    if job is None:
+        return
+    for key, value in values.items():
+        setattr(job, key, value)
+    db.session.commit()
+
+
+def _run_job(app, job_id, upload, public_id):
+    """Upload one spooled file (runs on the upload thread pool)"""
+    with app.app_context():
+        stored = None
+        try:
+            _set_status(job_id, status='processing')
+            with open(upload.path, 'rb') as file:
+                stored = store_image(file, public_id, upload.sha256)
+            # Commits the UploadedImage record along with the job
+            _set_status(job_id, status='done', image_url=stored.image_url)
+            log.info('upload finished', extra={'job_id': job_id})
+        except Exception as e:
+            db.session.rollback()
+            discard_stored(stored)
+            if isinstance(e, StorageError):
+                log.warning('upload failed', extra={'job_id': job_id, 'error': str(e)})
+            else:
+                log.exception('upload failed', extra={'job_id': job_id})
+            try:
+                _set_status(job_id, status='failed', error=str(e))
+            except Exception:
+                db.session.rollback()
+                log.exception('could not record upload failure', extra={'job_id': job_id})
+        finally:
+            db.session.remove()
+            upload.discard()
+
+
+def get_job(job_id):
+    """Return an UploadJob (or None), failing it first if it has been unfinished for too long"""
+    from Models.products import UploadJob
+
+    job = UploadJob.query.get(job_id)
+    if job and job.status in ('pending', 'processing'):
+        if job.created_at < datetime.utcnow() - timedelta(seconds=UPLOAD_JOB_TIMEOUT):
+            job.status = 'failed'
+            job.error = 'Upload did not complete'
+            db.session.commit()
+    return job
@@ -4,6 +4,9 @@ from datetime import datetime
 class Admin(db.Model):
     """Admin profile model - linked to User table"""
     __tablename__ = 'admins'
+    __table_args__ = (
+        db.Index('ix_admins_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False, index=True)
@@ -4,6 +4,9 @@ from datetime import datetime
 class Customer(db.Model):
     """Customer profile model - linked to User table"""
     __tablename__ = 'customers'
+    __table_args__ = (
+        db.Index('ix_customers_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False, index=True)
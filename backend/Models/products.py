@@ -1,5 +1,7 @@
 from Main.app import db
 from datetime import datetime
+import json
+from sqlalchemy.orm import joinedload, selectinload, defer
 
 class Category(db.Model):
     """Category model for product categorization"""
@@ -64,6 +66,13 @@ class Offer(db.Model):
 class Product(db.Model):
     """Product model for marketplace"""
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_featured_created_at_id', 'is_featured', 'created_at', 'id'),
+        # Conditional GET validators (see _products_signature in Routes/products.py)
+        db.Index('ix_products_updated_at', 'updated_at'),
+        db.Index('ix_products_discount_start_date', 'discount_start_date'),
+        db.Index('ix_products_discount_end_date', 'discount_end_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -89,16 +98,25 @@ class Product(db.Model):
     # Relationships
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
     images = db.relationship('ProductImage', backref='product', lazy=True, cascade='all, delete-orphan', order_by='ProductImage.display_order')
+    # Variants of main_image_url, if it was processed on upload
+    main_image = db.relationship(
+        'UploadedImage', primaryjoin='foreign(Product.main_image_url) == UploadedImage.image_url',
+        viewonly=True, uselist=False, lazy=True
+    )
     
-    def to_dict(self):
-        """Convert product to dictionary"""
-        # Calculate discounted price if discount is active
-        discounted_price = None
+    def discounted_price(self):
+        """Return the discounted price if a discount is currently active, else None"""
         if self.discount_percentage and self.discount_start_date and self.discount_end_date:
             now = datetime.utcnow()
             if self.discount_start_date <= now <= self.discount_end_date:
                 discount_amount = float(self.price) * (float(self.discount_percentage) / 100)
-                discounted_price = round(float(self.price) - discount_amount, 2)
+                return round(float(self.price) - discount_amount, 2)
+        return None
+    
+    def to_dict(self):
+        """Convert product to dictionary"""
+        # Calculate discounted price if discount is active
+        discounted_price = self.discounted_price()
         
         # Sort images by display_order to ensure consistent ordering
         sorted_images = sorted(self.images, key=lambda img: img.display_order or 0)
@@ -113,6 +131,7 @@ class Product(db.Model):
             'category_id': self.category_id,
             'category': self.category.to_dict() if self.category else None,
             'main_image_url': self.main_image_url,
+            'main_image_variants': self.main_image.variant_urls() if self.main_image else None,
             'sku': self.sku,
             'is_active': self.is_active,
             'is_featured': self.is_featured,
@@ -130,6 +149,26 @@ class Product(db.Model):
             'images': [img.to_dict() for img in sorted_images]
         }
     
+    def to_summary_dict(self):
+        """Convert product to a compact dictionary for list cards"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'price': float(self.price),
+            'discounted_price': self.discounted_price(),
+            'discount_percentage': float(self.discount_percentage) if self.discount_percentage else None,
+            'stock_quantity': self.stock_quantity,
+            'category_id': self.category_id,
+            'category_name': self.category.name if self.category else None,
+            'main_image_url': self.main_image_url,
+            'main_image_variants': self.main_image.variant_urls() if self.main_image else None,
+            'is_active': self.is_active,
+            'is_featured': self.is_featured,
+            'minimum_order': self.minimum_order if self.minimum_order is not None else 1,
+            'unit_term': self.unit_term if self.unit_term else 'units',
+            'offer_id': self.offer_id
+        }
+    
     def __repr__(self):
         return f'<Product {self.name}>'
 
@@ -144,12 +183,18 @@ class ProductImage(db.Model):
     display_order = db.Column(db.Integer, default=0)  # For ordering images
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
+    uploaded = db.relationship(
+        'UploadedImage', primaryjoin='foreign(ProductImage.image_url) == UploadedImage.image_url',
+        viewonly=True, uselist=False, lazy=True
+    )
+    
     def to_dict(self):
         """Convert product image to dictionary"""
         return {
             'id': self.id,
             'product_id': self.product_id,
             'image_url': self.image_url,
+            'variants': self.uploaded.variant_urls() if self.uploaded else None,
             'alt_text': self.alt_text,
             'display_order': self.display_order,
             'created_at': self.created_at.isoformat() if self.created_at else None
@@ -158,9 +203,83 @@ class ProductImage(db.Model):
     def __repr__(self):
         return f'<ProductImage {self.id}>'
 
+class UploadedImage(db.Model):
+    """Registry of uploaded images (Main/uploads.py), keyed by URL and by content hash"""
+    __tablename__ = 'uploaded_images'
+
+    id = db.Column(db.Integer, primary_key=True)
+    image_url = db.Column(db.String(500), unique=True, nullable=False, index=True)  # URL of the main variant
+    variants = db.Column(db.Text)  # JSON {variant name: url}, e.g. thumbnail, card, detail
+    sha256 = db.Column(db.String(64), index=True)  # Of the uploaded file
+    dhash = db.Column(db.String(16), index=True)  # Perceptual hash (Main/images.py), if decodable
+    width = db.Column(db.Integer)  # Of the uploaded image, if decodable
+    height = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def variant_urls(self):
+        """Variant URLs by name"""
+        return json.loads(self.variants) if self.variants else None
+
+    def __repr__(self):
+        return f'<UploadedImage {self.id}>'
+
+class UploadJob(db.Model):
+    """Background image upload (processed by Main/uploads.py)"""
+    __tablename__ = 'upload_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processing, done, failed
+    filename = db.Column(db.String(255))
+    image_url = db.Column(db.String(500))  # Set when status is done
+    error = db.Column(db.Text)  # Set when status is failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    uploaded = db.relationship(
+        'UploadedImage', primaryjoin='foreign(UploadJob.image_url) == UploadedImage.image_url',
+        viewonly=True, uselist=False, lazy=True
+    )
+
+    def to_dict(self):
+        """Convert upload job to dictionary"""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'image_url': self.image_url,
+            'variants': self.uploaded.variant_urls() if self.uploaded else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<UploadJob {self.id} {self.status}>'
+
+class SimilarProduct(db.Model):
+    """Precomputed similar products of a product (maintained by Main/similarity.py)"""
+    __tablename__ = 'similar_products'
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'similar_product_id', name='uq_similar_products_pair'),
+        db.Index('ix_similar_products_product_id_score', 'product_id', 'score'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    similar_product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)  # Higher is more similar
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SimilarProduct {self.product_id} -> {self.similar_product_id}>'
+
 class Order(db.Model):
     """Order model for customer purchases"""
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_customer_id_created_at_id', 'customer_id', 'created_at', 'id'),
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False, index=True)
@@ -198,6 +317,21 @@ class Order(db.Model):
             'deliveries': [delivery.to_dict() for delivery in self.deliveries]
         }
     
+    def to_summary_dict(self):
+        """Convert order to a compact dictionary for order lists"""
+        return {
+            'id': self.id,
+            'customer_id': self.customer_id,
+            'order_number': self.order_number,
+            'total_amount': float(self.total_amount) if self.total_amount else None,
+            'status': self.status,
+            'payment_status': self.payment_status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'item_count': len(self.order_items),
+            'order_items': [item.to_summary_dict() for item in self.order_items]
+        }
+    
     def __repr__(self):
         return f'<Order {self.order_number}>'
 
@@ -225,12 +359,26 @@ class OrderItem(db.Model):
             'product': self.product.to_dict() if self.product else None
         }
     
+    def to_summary_dict(self):
+        """Convert order item to a compact dictionary with a product summary"""
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'quantity': self.quantity,
+            'unit_price': float(self.unit_price) if self.unit_price else None,
+            'subtotal': float(self.subtotal) if self.subtotal else None,
+            'product': self.product.to_summary_dict() if self.product else None
+        }
+    
     def __repr__(self):
         return f'<OrderItem {self.id}>'
 
 class Delivery(db.Model):
     """Delivery tracking model for order deliveries"""
     __tablename__ = 'deliveries'
+    __table_args__ = (
+        db.Index('ix_deliveries_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
@@ -291,3 +439,49 @@ class DeliveryUpdate(db.Model):
     
     def __repr__(self):
         return f'<DeliveryUpdate {self.status}>'
+
+
+# ==================== LOADING PROFILES ====================
+# Query options that eager-load everything the matching to_dict() touches,
+# so serializing a list costs a fixed number of queries instead of one per row.
+# Usage: Product.query.options(*product_load_options())
+
+def product_load_options():
+    """Eager-load the relationships used by Product.to_dict"""
+    return (
+        joinedload(Product.category),
+        joinedload(Product.offer),
+        selectinload(Product.main_image),
+        selectinload(Product.images).selectinload(ProductImage.uploaded),
+    )
+
+
+def product_summary_load_options():
+    """Eager-load only what Product.to_summary_dict needs"""
+    return (
+        joinedload(Product.category),
+        selectinload(Product.main_image),
+        defer(Product.description),
+    )
+
+
+def delivery_load_options():
+    """Eager-load the relationships used by Delivery.to_dict"""
+    return (
+        selectinload(Delivery.delivery_updates),
+    )
+
+
+def order_load_options():
+    """Eager-load the relationships used by Order.to_dict"""
+    return (
+        selectinload(Order.order_items).joinedload(OrderItem.product).options(*product_load_options()),
+        selectinload(Order.deliveries).options(*delivery_load_options()),
+    )
+
+
+def order_summary_load_options():
+    """Eager-load only what Order.to_summary_dict needs"""
+    return (
+        selectinload(Order.order_items).joinedload(OrderItem.product).options(*product_summary_load_options()),
+    )
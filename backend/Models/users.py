@@ -1,10 +1,14 @@
 from Main.app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from Main.passwords import hash_password, verify_password, needs_rehash
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 
 class User(db.Model):
     """Base user model for authentication - stores both admins and customers"""
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
@@ -12,6 +16,7 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # 'admin' or 'customer'
     is_active = db.Column(db.Boolean, default=True, nullable=False)
+    token_version = db.Column(db.Integer, default=0, nullable=False)  # Bump to revoke every issued token
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -21,11 +26,53 @@ class User(db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True if the password hash was made with older hashing settings"""
+        return needs_rehash(self.password_hash)
+    
+    @staticmethod
+    def username_base(email):
+        """Username stem for an email: the alphanumeric characters of its local part"""
+        username = ''.join(c for c in email.split('@')[0].lower() if c.isalnum())
+        return username or f'user{datetime.utcnow().timestamp()}'
+    
+    @classmethod
+    def allocate_username(cls, base):
+        """First free username of base, base1, base2, ... found with a single query"""
+        taken = {
+            username for (username,) in
+            db.session.query(cls.username).filter(cls.username.startswith(base, autoescape=True))
+        }
+        if base not in taken:
+            return base
+        counter = 1
+        while f'{base}{counter}' in taken:
+            counter += 1
+        return f'{base}{counter}'
+    
+    def add_with_username(self, base, attempts=3):
+        """
+        Add the user to the session under the first free username for base and
+        flush. If a concurrent signup takes the same name first, the session is
+        rolled back and another name allocated, so call this before making
+        other changes in the session.
+        """
+        for attempt in range(attempts):
+            self.username = User.allocate_username(base)
+            db.session.add(self)
+            try:
+                db.session.flush()
+                return
+            except IntegrityError:
+                db.session.rollback()
+                if attempt == attempts - 1 or User.query.filter_by(email=self.email).first():
+                    raise
     
     def to_dict(self):
         """Convert user to dictionary"""
@@ -1,57 +1,33 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
 from Main.app import db
-from Models.users import User
+from Main.auth import get_identity, admin_required
+from Main.logger import get_logger
 from Models.admin import Admin
+from Main.functions import wants_keyset_page, get_keyset_args, keyset_paginate
+from Main.database import pool_status
+from sqlalchemy.orm import joinedload
+import os
 
 admin_bp = Blueprint('admin', __name__)
-
-def admin_required(f):
-    """Decorator to require admin role"""
-    from functools import wraps
-    
-    @wraps(f)
-    @jwt_required()
-    def decorated_function(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        # get_jwt_identity() returns a string, convert to int for database query
-        current_user = User.query.get(int(current_user_id))
-        
-        if not current_user or current_user.role != 'admin':
-            return jsonify({'error': 'Admin access required'}), 403
-        
-        return f(*args, **kwargs)
-    return decorated_function
+log = get_logger(__name__)
 
 @admin_bp.route('/profile', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_admin_profile():
     """Get current admin's profile"""
-    current_user_id = get_jwt_identity()
-    # get_jwt_identity() returns a string, convert to int for database query
-    current_user = User.query.get(int(current_user_id))
-    
-    if not current_user or current_user.role != 'admin':
-        return jsonify({'error': 'Admin access required'}), 403
-    
-    admin = Admin.query.filter_by(user_id=int(current_user_id)).first()
+    admin_id = get_identity().admin_id
+    admin = Admin.query.get(admin_id) if admin_id else None
     if not admin:
         return jsonify({'error': 'Admin profile not found'}), 404
     
     return jsonify(admin.to_dict()), 200
 
 @admin_bp.route('/profile', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_admin_profile():
     """Update current admin's profile"""
-    current_user_id = get_jwt_identity()
-    # get_jwt_identity() returns a string, convert to int for database query
-    current_user = User.query.get(int(current_user_id))
-    
-    if not current_user or current_user.role != 'admin':
-        return jsonify({'error': 'Admin access required'}), 403
-    
-    admin = Admin.query.filter_by(user_id=int(current_user_id)).first()
+    admin_id = get_identity().admin_id
+    admin = Admin.query.get(admin_id) if admin_id else None
     if not admin:
         return jsonify({'error': 'Admin profile not found'}), 404
     
@@ -72,12 +48,36 @@ def update_admin_profile():
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/all', methods=['GET'])
 @admin_required
 def get_all_admins():
-    """Get all admins"""
-    admins = Admin.query.all()
+    """Get all admins; ?limit= / ?cursor= for keyset pagination"""
+    query = Admin.query.options(joinedload(Admin.user))
+    
+    if wants_keyset_page():
+        cursor, limit = get_keyset_args()
+        try:
+            admins, next_cursor = keyset_paginate(query, [Admin.created_at, Admin.id], cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'admins': [admin.to_dict() for admin in admins],
+            'next_cursor': next_cursor,
+            'limit': limit
+        }), 200
+    
+    admins = query.all()
     return jsonify([admin.to_dict() for admin in admins]), 200
 
+
+@admin_bp.route('/db-pool', methods=['GET'])
+@admin_required
+def get_db_pool():
+    """Database connection pool state and metrics of this worker process"""
+    status = pool_status(db.engine)
+    status['database'] = db.engine.url.get_backend_name()
+    status['pid'] = os.getpid()
+    return jsonify(status), 200
@@ -1,17 +1,17 @@
 from flask import Blueprint, request, jsonify, make_response
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from Main.app import db
+from Main.auth import get_identity, customer_required, invalidate_identity, create_tokens
+from Main.logger import get_logger
+from Main.passwords import PasswordHasherBusy
+from Main.firebase_tokens import verify_id_token, FirebaseTokenError, FirebaseNotConfigured, FirebaseKeysUnavailable
 from Models.users import User
 from Models.admin import Admin
 from Models.customers import Customer
-from datetime import datetime
 import uuid
-import os
-import json
-import firebase_admin
-from firebase_admin import credentials, auth as firebase_auth
 
 auth_bp = Blueprint('auth', __name__)
+log = get_logger(__name__)
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -34,21 +34,7 @@ def register():
         return jsonify({'error': 'Email already exists'}), 400
     
     try:
-        # Generate username from email prefix
         email_prefix = data['email'].split('@')[0].lower()
-        # Sanitize username - remove special characters, keep only alphanumeric
-        username = ''.join(c for c in email_prefix if c.isalnum())
-        
-        # If username is empty after sanitization, use a default
-        if not username:
-            username = f'user{datetime.utcnow().timestamp()}'
-        
-        # Ensure username is unique by appending number if needed
-        base_username = username
-        counter = 1
-        while User.query.filter_by(username=username).first():
-            username = f'{base_username}{counter}'
-            counter += 1
         
         # Generate first_name and last_name from email prefix for customers
         if role == 'customer':
@@ -66,14 +52,13 @@ def register():
         
         # Create user
         user = User(
-            username=username,
             email=data['email'],
             role=role
         )
         user.set_password(data['password'])
         
-        db.session.add(user)
-        db.session.flush()  # Get user.id
+        # Username from the email prefix, with a number appended if it is taken
+        user.add_with_username(User.username_base(data['email']))  # Flushes, so user.id is set
         
         # Create profile based on role
         if role == 'admin':
@@ -102,9 +87,8 @@ def register():
         
         db.session.commit()
         
-        # Generate tokens - identity MUST be a string (Flask-JWT-Extended requirement)
-        access_token = create_access_token(identity=str(user.id))
-        refresh_token = create_refresh_token(identity=str(user.id))
+        # Generate tokens with role/profile claims
+        access_token, refresh_token = create_tokens(user)
         
         # Create response with JSON data
         response = make_response(jsonify({
@@ -138,8 +122,12 @@ def register():
         
         return response, 201
     
+    except PasswordHasherBusy:
+        db.session.rollback()
+        raise  # Answered with 503 by the app error handler
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/login', methods=['POST'])
@@ -159,9 +147,17 @@ def login():
     if not user.is_active:
         return jsonify({'error': 'Account is inactive'}), 403
     
-    # Generate tokens - identity MUST be a string (Flask-JWT-Extended requirement)
-    access_token = create_access_token(identity=str(user.id))
-    refresh_token = create_refresh_token(identity=str(user.id))
+    # Upgrade hashes made with older hashing settings while the password is at hand
+    if user.password_needs_rehash():
+        try:
+            user.set_password(data['password'])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            log.warning('password rehash failed', extra={'user_id': user.id, 'error': str(e)})
+    
+    # Generate tokens with role/profile claims
+    access_token, refresh_token = create_tokens(user)
     
     # Create response with JSON data
     response = make_response(jsonify({
@@ -201,12 +197,12 @@ def login():
 def refresh():
     """Refresh access token - accepts refresh token from cookies or Authorization header"""
     try:
-        # Debug: Log request info
-        print(f"Refresh request - Cookies: {list(request.cookies.keys())}")
-        print(f"Refresh request - Headers: {request.headers.get('Authorization', 'None')}")
-        
         current_user_id = get_jwt_identity()
-        print(f"Refresh - User ID from token: {current_user_id}")
+        log.debug('token refresh', extra={
+            'user_id': current_user_id,
+            'cookies': sorted(request.cookies.keys()),
+            'has_authorization_header': 'Authorization' in request.headers,
+        })
         
         # get_jwt_identity() returns a string, convert to int for database query
         user = User.query.get(int(current_user_id))
@@ -214,9 +210,8 @@ def refresh():
         if not user or not user.is_active:
             return jsonify({'error': 'User not found or inactive'}), 404
         
-        # Generate tokens - identity MUST be a string (Flask-JWT-Extended requirement)
-        access_token = create_access_token(identity=str(user.id))
-        refresh_token = create_refresh_token(identity=str(user.id))
+        # Generate tokens with role/profile claims
+        access_token, refresh_token = create_tokens(user)
         
         # Create response with JSON data
         response = make_response(jsonify({
@@ -249,10 +244,7 @@ def refresh():
         
         return response, 200
     except Exception as e:
-        # Log the error for debugging
-        import traceback
-        print(f"Refresh token error: {str(e)}")
-        print(traceback.format_exc())
+        log.exception('token refresh failed')
         return jsonify({'error': 'Failed to refresh token', 'details': str(e)}), 401
 
 @auth_bp.route('/me', methods=['GET'])
@@ -276,70 +268,6 @@ def get_current_user():
     
     return jsonify(user_data), 200
 
-# Initialize Firebase Admin SDK (only once)
-_firebase_initialized = False
-
-def init_firebase():
-    """Initialize Firebase Admin SDK"""
-    global _firebase_initialized
-    if _firebase_initialized:
-        return
-    
-    if not firebase_admin._apps:
-        # Try to get Firebase credentials from environment variable (JSON string)
-        firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS_JSON')
-        
-        if firebase_creds_json:
-            try:
-                # Parse JSON string from environment variable
-                cred_dict = json.loads(firebase_creds_json)
-                cred = credentials.Certificate(cred_dict)
-                firebase_admin.initialize_app(cred)
-                _firebase_initialized = True
-                print("Firebase Admin SDK initialized from environment variable")
-                return
-            except json.JSONDecodeError as e:
-                print(f"Error parsing FIREBASE_CREDENTIALS_JSON: {e}")
-            except Exception as e:
-                print(f"Error initializing Firebase from environment variable: {e}")
-        
-        # Fallback: Try to use service account file path
-        cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH')
-        
-        # If not set, try to find ServiceAccountKey.json in backend directory
-        if not cred_path:
-            # Get the backend directory (parent of Routes directory)
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            backend_dir = os.path.dirname(current_dir)  # Go up from Routes to backend
-            default_path = os.path.join(backend_dir, 'ServiceAccountKey.json')
-            
-            if os.path.exists(default_path):
-                cred_path = default_path
-                print(f"Found service account key at: {cred_path}")
-        
-        # Try to initialize with service account file
-        if cred_path and os.path.exists(cred_path):
-            try:
-                cred = credentials.Certificate(cred_path)
-                firebase_admin.initialize_app(cred)
-                _firebase_initialized = True
-                print("Firebase Admin SDK initialized from file")
-                return
-            except Exception as e:
-                print(f"Error initializing Firebase with credentials file: {e}")
-        
-        # Try to use default credentials (for cloud environments like GCP)
-        try:
-            firebase_admin.initialize_app()
-            _firebase_initialized = True
-            print("Firebase Admin SDK initialized with default credentials")
-            return
-        except Exception as e:
-            print(f"Warning: Firebase Admin SDK not initialized: {e}")
-            print("Please set FIREBASE_CREDENTIALS_JSON environment variable with the JSON content")
-            print("Or set FIREBASE_CREDENTIALS_PATH with path to service account JSON file")
-            print("Or ensure you're running in a GCP environment with default credentials")
-
 @auth_bp.route('/google', methods=['POST'])
 def google_auth():
     """Handle Firebase Google Auth login/signup"""
@@ -351,22 +279,18 @@ def google_auth():
     firebase_token = data['token']
     
     try:
-        # Initialize Firebase Admin if not already done
-        init_firebase()
-        
-        # Verify Firebase ID token
+        # Verify Firebase ID token against Google's cached signing certificates
         try:
-            decoded_token = firebase_auth.verify_id_token(firebase_token)
-        except ValueError as e:
-            # Firebase not initialized
-            if 'Firebase app' in str(e) or 'not initialized' in str(e).lower():
-                return jsonify({
-                    'error': 'Firebase Admin SDK not configured',
-                    'details': 'Please set FIREBASE_CREDENTIALS_JSON environment variable with the service account JSON content, or set FIREBASE_CREDENTIALS_PATH with the path to the service account file',
-                    'help': 'For Railway: Set FIREBASE_CREDENTIALS_JSON as an environment variable with the entire JSON content from ServiceAccountKey.json as a single-line string'
-                }), 500
-            raise
-        except Exception as e:
+            decoded_token = verify_id_token(firebase_token)
+        except FirebaseNotConfigured:
+            return jsonify({
+                'error': 'Firebase not configured',
+                'details': 'Please set FIREBASE_PROJECT_ID, or FIREBASE_CREDENTIALS_JSON / FIREBASE_CREDENTIALS_PATH with the service account of the Firebase project'
+            }), 500
+        except FirebaseKeysUnavailable as e:
+            log.error('firebase signing certificates unavailable', extra={'error': str(e)})
+            return jsonify({'error': 'Google sign-in is temporarily unavailable, please retry shortly'}), 503
+        except FirebaseTokenError as e:
             return jsonify({'error': 'Invalid Firebase token', 'details': str(e)}), 401
         
         # Extract user info from decoded token
@@ -385,30 +309,16 @@ def google_auth():
         if not user:
             # Create new user
             is_new_user = True
-            email_prefix = email.split('@')[0].lower()
-            username = ''.join(c for c in email_prefix if c.isalnum())
-            
-            if not username:
-                username = f'user{datetime.utcnow().timestamp()}'
-            
-            # Ensure username is unique
-            base_username = username
-            counter = 1
-            while User.query.filter_by(username=username).first():
-                username = f'{base_username}{counter}'
-                counter += 1
-            
             # Create user with a random password (won't be used for Google auth)
             user = User(
-                username=username,
                 email=email,
                 role='customer'
             )
             # Set a random password that won't be used
             user.set_password(str(uuid.uuid4()))
             
-            db.session.add(user)
-            db.session.flush()
+            # Username from the email prefix, with a number appended if it is taken
+            user.add_with_username(User.username_base(email))
             
             # Create customer profile with Google info
             customer = Customer(
@@ -441,13 +351,13 @@ def google_auth():
                 )
                 db.session.add(customer)
                 db.session.commit()
+                invalidate_identity(user.id)
         
         if not user.is_active:
             return jsonify({'error': 'Account is inactive'}), 403
         
-        # Generate tokens
-        access_token = create_access_token(identity=str(user.id))
-        refresh_token = create_refresh_token(identity=str(user.id))
+        # Generate tokens with role/profile claims
+        access_token, refresh_token = create_tokens(user)
         
         # Create response
         response = make_response(jsonify({
@@ -484,26 +394,19 @@ def google_auth():
         
         return response, 200 if not is_new_user else 201
         
+    except PasswordHasherBusy:
+        db.session.rollback()
+        raise  # Answered with 503 by the app error handler
     except Exception as e:
         db.session.rollback()
-        import traceback
-        print(f"Google auth error: {str(e)}")
-        print(traceback.format_exc())
+        log.exception('google auth failed')
         return jsonify({'error': 'Google authentication failed', 'details': str(e)}), 500
 
 @auth_bp.route('/check-profile-complete', methods=['GET'])
-@jwt_required()
+@customer_required
 def check_profile_complete():
     """Check if customer profile is complete"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(int(current_user_id))
-    
-    if not current_user or current_user.role != 'customer':
-        return jsonify({'error': 'Customer access required'}), 403
-    
-    customer = Customer.query.filter_by(user_id=int(current_user_id)).first()
-    if not customer:
-        return jsonify({'error': 'Customer profile not found'}), 404
+    customer = Customer.query.get(get_identity().customer_id)
     
     # Check if required fields are filled
     required_fields = ['phone', 'address', 'city', 'state', 'zip_code', 'country']
@@ -1,60 +1,28 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
 from Main.app import db
-from Models.users import User
+from Main.auth import get_identity, admin_required, customer_required
+from Main.logger import get_logger
 from Models.customers import Customer
-from Models.products import Order, Delivery
+from Models.products import Order, Delivery, order_load_options, order_summary_load_options
+from Main.functions import get_response_view, serialize, wants_keyset_page, get_keyset_args, keyset_paginate
+from sqlalchemy.orm import joinedload
 
 customers_bp = Blueprint('customers', __name__)
-
-def admin_required(f):
-    """Decorator to require admin role"""
-    from functools import wraps
-    
-    @wraps(f)
-    @jwt_required()
-    def decorated_function(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        # get_jwt_identity() returns a string, convert to int for database query
-        current_user = User.query.get(int(current_user_id))
-        
-        if not current_user or current_user.role != 'admin':
-            return jsonify({'error': 'Admin access required'}), 403
-        
-        return f(*args, **kwargs)
-    return decorated_function
+log = get_logger(__name__)
 
 @customers_bp.route('/profile', methods=['GET'])
-@jwt_required()
+@customer_required
 def get_customer_profile():
     """Get current customer's profile"""
-    current_user_id = get_jwt_identity()
-    # get_jwt_identity() returns a string, convert to int for database query
-    current_user = User.query.get(int(current_user_id))
-    
-    if not current_user or current_user.role != 'customer':
-        return jsonify({'error': 'Customer access required'}), 403
-    
-    customer = Customer.query.filter_by(user_id=int(current_user_id)).first()
-    if not customer:
-        return jsonify({'error': 'Customer profile not found'}), 404
+    customer = Customer.query.get(get_identity().customer_id)
     
     return jsonify(customer.to_dict()), 200
 
 @customers_bp.route('/profile', methods=['PUT'])
-@jwt_required()
+@customer_required
 def update_customer_profile():
     """Update current customer's profile"""
-    current_user_id = get_jwt_identity()
-    # get_jwt_identity() returns a string, convert to int for database query
-    current_user = User.query.get(int(current_user_id))
-    
-    if not current_user or current_user.role != 'customer':
-        return jsonify({'error': 'Customer access required'}), 403
-    
-    customer = Customer.query.filter_by(user_id=int(current_user_id)).first()
-    if not customer:
-        return jsonify({'error': 'Customer profile not found'}), 404
+    customer = Customer.query.get(get_identity().customer_id)
     
     data = request.get_json()
     
@@ -81,46 +49,50 @@ def update_customer_profile():
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @customers_bp.route('/orders', methods=['GET'])
-@jwt_required()
+@customer_required
 def get_customer_orders():
-    """Get current customer's orders"""
-    current_user_id = get_jwt_identity()
-    # get_jwt_identity() returns a string, convert to int for database query
-    current_user = User.query.get(int(current_user_id))
-    
-    if not current_user or current_user.role != 'customer':
-        return jsonify({'error': 'Customer access required'}), 403
-    
-    customer = Customer.query.filter_by(user_id=int(current_user_id)).first()
-    if not customer:
-        return jsonify({'error': 'Customer profile not found'}), 404
-    
-    orders = Order.query.filter_by(customer_id=customer.id).order_by(Order.created_at.desc()).all()
-    return jsonify([order.to_dict() for order in orders]), 200
+    """
+    Get current customer's orders, newest first
+    Query parameters:
+    - view: 'detail' (default) or 'summary'; fields: comma-separated keys to return
+    - limit / cursor: keyset pagination; the response becomes
+      {'orders': [...], 'next_cursor': ..., 'limit': ...}
+    """
+    view, fields = get_response_view()
+    if not view:
+        return jsonify({'error': 'Invalid view. Must be one of: detail, summary'}), 400
+    
+    load_options = order_summary_load_options() if view == 'summary' else order_load_options()
+    query = Order.query.options(*load_options).filter_by(customer_id=get_identity().customer_id)
+    
+    if wants_keyset_page():
+        cursor, limit = get_keyset_args()
+        try:
+            orders, next_cursor = keyset_paginate(query, [Order.created_at, Order.id], cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'orders': [serialize(order, view, fields) for order in orders],
+            'next_cursor': next_cursor,
+            'limit': limit
+        }), 200
+    
+    orders = query.order_by(Order.created_at.desc()).all()
+    return jsonify([serialize(order, view, fields) for order in orders]), 200
 
 @customers_bp.route('/orders/<int:order_id>/tracking', methods=['GET'])
-@jwt_required()
+@customer_required
 def track_order(order_id):
     """Track delivery for a specific order"""
-    current_user_id = get_jwt_identity()
-    # get_jwt_identity() returns a string, convert to int for database query
-    current_user = User.query.get(int(current_user_id))
-    
-    if not current_user or current_user.role != 'customer':
-        return jsonify({'error': 'Customer access required'}), 403
-    
-    customer = Customer.query.filter_by(user_id=int(current_user_id)).first()
-    if not customer:
-        return jsonify({'error': 'Customer profile not found'}), 404
-    
     order = Order.query.get(order_id)
     if not order:
         return jsonify({'error': 'Order not found'}), 404
     
-    if order.customer_id != customer.id:
+    if order.customer_id != get_identity().customer_id:
         return jsonify({'error': 'Access denied'}), 403
     
     deliveries = Delivery.query.filter_by(order_id=order_id).all()
@@ -132,7 +104,21 @@ def track_order(order_id):
 @customers_bp.route('/all', methods=['GET'])
 @admin_required
 def get_all_customers():
-    """Get all customers (admin only)"""
-    customers = Customer.query.all()
+    """Get all customers (admin only); ?limit= / ?cursor= for keyset pagination"""
+    query = Customer.query.options(joinedload(Customer.user))
+    
+    if wants_keyset_page():
+        cursor, limit = get_keyset_args()
+        try:
+            customers, next_cursor = keyset_paginate(query, [Customer.created_at, Customer.id], cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'customers': [customer.to_dict() for customer in customers],
+            'next_cursor': next_cursor,
+            'limit': limit
+        }), 200
+    
+    customers = query.all()
     return jsonify([customer.to_dict() for customer in customers]), 200
 
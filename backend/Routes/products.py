@@ -1,49 +1,87 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from Main.app import db
-from Models.users import User
-from Models.customers import Customer
-from Models.products import Product, Category, ProductImage, Order, OrderItem, Delivery, DeliveryUpdate, Offer
+from Main.auth import get_identity, admin_required, customer_required
+from Models.products import Product, Category, ProductImage, SimilarProduct, Order, OrderItem, Delivery, DeliveryUpdate, Offer
+from Models.products import product_load_options, order_load_options, delivery_load_options
+from Models.products import product_summary_load_options, order_summary_load_options
+from Main.functions import get_response_view, serialize, wants_keyset_page, get_keyset_args, keyset_paginate
+from Main.functions import get_total_mode, count_rows
+from Main.cache import cached_response, conditional_response, table_signature, invalidate as invalidate_cache
+from Main import search as search_index
+from Main.fuzzy import product_index as fuzzy_index
+from Main import similarity
+from Main.inventory import reserve_stock, InsufficientStock
+from Main.storage import StorageError
+from Main.image_cleanup import release_images, delete_images
+from Main import uploads
+from Main.logger import get_logger
 from datetime import datetime, timedelta
-from sqlalchemy import or_, func, case
+from sqlalchemy import func, case, insert
 import uuid
-import os
-from werkzeug.utils import secure_filename
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
 
 products_bp = Blueprint('products', __name__)
+log = get_logger(__name__)
 
-def admin_required(f):
-    """Decorator to require admin role"""
-    from functools import wraps
-    
-    @wraps(f)
-    @jwt_required()
-    def decorated_function(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        # get_jwt_identity() returns a string, convert to int for database query
-        current_user = User.query.get(int(current_user_id))
-        
-        if not current_user or current_user.role != 'admin':
-            return jsonify({'error': 'Admin access required'}), 403
-        
-        return f(*args, **kwargs)
-    return decorated_function
+def _categories_signature(**view_args):
+    """Validator for category responses (see conditional_response)"""
+    return table_signature(Category)
+
+def _offers_signature(**view_args):
+    """Validator for offer responses (see conditional_response)"""
+    return table_signature(Offer)
+
+def _products_signature(**view_args):
+    """
+    Validator for product listings: products, plus the categories and offers
+    embedded in them, plus the last discount start and end that have passed
+    (discounted prices change with time, not with updated_at). Every part is
+    answered from an index.
+    """
+    now = datetime.utcnow()
+    products = db.session.query(func.count(Product.id), func.max(Product.updated_at)).one()
+    discounts_started = db.session.query(func.max(Product.discount_start_date)).filter(
+        Product.discount_start_date <= now
+    ).scalar()
+    discounts_ended = db.session.query(func.max(Product.discount_end_date)).filter(
+        Product.discount_end_date < now
+    ).scalar()
+    return tuple(products) + (discounts_started, discounts_ended) + table_signature(Category) + table_signature(Offer)
+
+def _product_signature(product_id):
+    """
+    Validator for a single product: its row, its category and offer, and the
+    discount start and end if they have passed. Only timestamps, so it also
+    gives a sound Last-Modified (see conditional_response).
+    """
+    row = db.session.query(
+        Product.updated_at, Product.discount_percentage, Product.discount_start_date,
+        Product.discount_end_date, Category.updated_at, Offer.updated_at
+    ).outerjoin(Category, Category.id == Product.category_id).outerjoin(
+        Offer, Offer.id == Product.offer_id
+    ).filter(Product.id == product_id).first()
+    if row is None:
+        return (None,)
+    updated_at, discount, starts, ends, category_updated_at, offer_updated_at = row
+    now = datetime.utcnow()
+    started = starts if discount is not None and starts and starts <= now else None
+    ended = ends if discount is not None and ends and ends < now else None
+    return (updated_at, started, ended, category_updated_at, offer_updated_at)
+
+def _similar_products_signature(**view_args):
+    """Validator for similar-product responses: products plus the precomputed lists"""
+    return _products_signature() + table_signature(SimilarProduct)
 
 # ==================== CATEGORY ROUTES ====================
 
 @products_bp.route('/categories', methods=['GET'])
 @jwt_required(optional=True)
+@conditional_response(_categories_signature)
+@cached_response('catalog')
 def get_categories():
     """Get all categories (public, but shows inactive only to admins)"""
-    current_user_id = get_jwt_identity()
-    is_admin = False
-    
-    if current_user_id:
-        current_user = User.query.get(current_user_id)
-        is_admin = current_user and current_user.role == 'admin'
+    identity = get_identity()
+    is_admin = bool(identity and identity.is_admin)
     
     # Admins can see all categories, others only active
     if is_admin:
@@ -61,12 +99,8 @@ def get_category(category_id):
     if not category:
         return jsonify({'error': 'Category not found'}), 404
     
-    current_user_id = get_jwt_identity()
-    is_admin = False
-    
-    if current_user_id:
-        current_user = User.query.get(current_user_id)
-        is_admin = current_user and current_user.role == 'admin'
+    identity = get_identity()
+    is_admin = bool(identity and identity.is_admin)
     
     # Non-admins can't see inactive categories
     if not category.is_active and not is_admin:
@@ -96,11 +130,13 @@ def create_category():
         
         db.session.add(category)
         db.session.commit()
+        invalidate_cache('catalog')
         
         return jsonify({'message': 'Category created successfully', 'category': category.to_dict()}), 201
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/categories/<int:category_id>', methods=['PUT'])
@@ -120,6 +156,8 @@ def update_category(category_id):
             if existing and existing.id != category_id:
                 return jsonify({'error': 'Category name already exists'}), 400
             category.name = data['name']
+            search_index.index_category_products(category)
+            fuzzy_index.invalidate()
         
         if 'description' in data:
             category.description = data['description']
@@ -128,10 +166,12 @@ def update_category(category_id):
             category.is_active = data['is_active']
         
         db.session.commit()
+        invalidate_cache('catalog')
         return jsonify({'message': 'Category updated successfully', 'category': category.to_dict()}), 200
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/categories/<int:category_id>', methods=['DELETE'])
@@ -149,24 +189,24 @@ def delete_category(category_id):
     try:
         db.session.delete(category)
         db.session.commit()
+        invalidate_cache('catalog')
         return jsonify({'message': 'Category deleted successfully'}), 200
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 # ==================== OFFER ROUTES ====================
 
 @products_bp.route('/offers', methods=['GET'])
 @jwt_required(optional=True)
+@conditional_response(_offers_signature)
+@cached_response('catalog')
 def get_offers():
     """Get all offers (public, but shows inactive only to admins)"""
-    current_user_id = get_jwt_identity()
-    is_admin = False
-    
-    if current_user_id:
-        current_user = User.query.get(int(current_user_id))
-        is_admin = current_user and current_user.role == 'admin'
+    identity = get_identity()
+    is_admin = bool(identity and identity.is_admin)
     
     # Admins can see all offers, others only active
     if is_admin:
@@ -184,12 +224,8 @@ def get_offer(offer_id):
     if not offer:
         return jsonify({'error': 'Offer not found'}), 404
     
-    current_user_id = get_jwt_identity()
-    is_admin = False
-    
-    if current_user_id:
-        current_user = User.query.get(int(current_user_id))
-        is_admin = current_user and current_user.role == 'admin'
+    identity = get_identity()
+    is_admin = bool(identity and identity.is_admin)
     
     # Non-admins can't see inactive offers
     if not offer.is_active and not is_admin:
@@ -225,6 +261,7 @@ def create_offer():
         
         db.session.add(offer)
         db.session.commit()
+        invalidate_cache('catalog')
         
         return jsonify({'message': 'Offer created successfully', 'offer': offer.to_dict()}), 201
     
@@ -232,6 +269,7 @@ def create_offer():
         return jsonify({'error': f'Invalid date format: {str(e)}'}), 400
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/offers/<int:offer_id>', methods=['PUT'])
@@ -261,12 +299,14 @@ def update_offer(offer_id):
             return jsonify({'error': 'End date must be after start date'}), 400
         
         db.session.commit()
+        invalidate_cache('catalog')
         return jsonify({'message': 'Offer updated successfully', 'offer': offer.to_dict()}), 200
     
     except ValueError as e:
         return jsonify({'error': f'Invalid date format: {str(e)}'}), 400
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/offers/<int:offer_id>', methods=['DELETE'])
@@ -284,10 +324,12 @@ def delete_offer(offer_id):
     try:
         db.session.delete(offer)
         db.session.commit()
+        invalidate_cache('catalog')
         return jsonify({'message': 'Offer deleted successfully'}), 200
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 # ==================== PRODUCT ROUTES ====================
@@ -295,21 +337,29 @@ def delete_offer(offer_id):
 @products_bp.route('/', methods=['GET'])
 @products_bp.route('', methods=['GET'])  # Handle both with and without trailing slash
 @jwt_required(optional=True)
+@conditional_response(_products_signature)
+@cached_response('catalog')
 def get_products():
     """
     Get products with search, pagination, and filtering
     Query parameters:
-    - search: search query (searches in name, description, category)
+    - search: search query (full-text search over name, description, category and supplier,
+      results ranked by relevance)
     - page: page number (default: 1)
     - per_page: items per page (default: 20, max: 100)
     - category_id: filter by category ID (optional)
+    - view: 'detail' (default) or 'summary' (compact product cards)
+    - fields: comma-separated list of product keys to return (optional)
+    - limit / cursor: keyset (infinite scroll) pagination instead of page/per_page,
+      ordered by featured, creation date and id; not available with search
+    - total: with limit/cursor, 'none' (default), 'exact' or 'approximate'
     """
-    current_user_id = get_jwt_identity()
-    is_admin = False
+    view, fields = get_response_view()
+    if not view:
+        return jsonify({'error': 'Invalid view. Must be one of: detail, summary'}), 400
     
-    if current_user_id:
-        current_user = User.query.get(current_user_id)
-        is_admin = current_user and current_user.role == 'admin'
+    identity = get_identity()
+    is_admin = bool(identity and identity.is_admin)
     
     # Get query parameters
     search_query = request.args.get('search', '').strip()
@@ -322,179 +372,108 @@ def get_products():
         query = Product.query
     else:
         query = Product.query.filter_by(is_active=True)
+    load_options = product_summary_load_options() if view == 'summary' else product_load_options()
+    query = query.options(*load_options)
     
     # Filter by category if provided
     if category_id:
         query = query.filter_by(category_id=category_id)
+    base_query = query
     
-    # Apply search if provided
-    if search_query:
-        search_term = f'%{search_query}%'
-        # Search in product name, description, category name, and supplier name
-        query = query.outerjoin(Category).filter(
-            or_(
-                Product.name.ilike(search_term),
-                Product.description.ilike(search_term),
-                Category.name.ilike(search_term),
-                Product.supplier_name.ilike(search_term)
+    if wants_keyset_page():
+        if search_query:
+            return jsonify({'error': 'Cursor pagination is not supported with search'}), 400
+        total_mode = get_total_mode()
+        if not total_mode:
+            return jsonify({'error': 'Invalid total. Must be one of: none, exact, approximate'}), 400
+        
+        cursor, limit = get_keyset_args(default_limit=20, max_limit=100)
+        try:
+            products_list, next_cursor = keyset_paginate(
+                query, [Product.is_featured, Product.created_at, Product.id], cursor, limit
             )
-        ).distinct()
-    
-    # Order by featured first, then by creation date
-    query = query.order_by(Product.is_featured.desc(), Product.created_at.desc())
-    
-    # Pagination
-    pagination = query.paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
-    )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        response = {
+            'products': [serialize(product, view, fields) for product in products_list],
+            'next_cursor': next_cursor,
+            'limit': limit
+        }
+        if total_mode != 'none':
+            response['total'] = count_rows(query, total_mode)
+        return jsonify(response), 200
+    
+    # Full-text search: rank matches from the search index, paginate in the database
+    search_hits = search_index.match_subquery(search_query) if search_query and search_index.search_backend() else None
+    if search_hits is not None:
+        query = query.join(search_hits, search_hits.c.product_id == Product.id).order_by(
+            search_hits.c.rank.desc(), Product.is_featured.desc(), Product.created_at.desc()
+        )
+    else:
+        # Order by featured first, then by creation date
+        query = query.order_by(Product.is_featured.desc(), Product.created_at.desc())
     
-    # If search query exists, apply fuzzy matching and limit to top 10
-    products_list = pagination.items
-    if search_query:
-        products_list = _apply_fuzzy_search(products_list, search_query)
-        # Limit to top 10 results for search
-        products_list = products_list[:10]
-        # Update pagination info
-        total_results = len(products_list)
+    if search_query and search_hits is None:
+        # No full-text index available
+        products_list, total, pages = _fuzzy_search_page(query, search_query, page, per_page, load_options)
     else:
-        total_results = pagination.total
+        pagination = query.paginate(
+            page=page,
+            per_page=per_page,
+            error_out=False
+        )
+        products_list, total, pages = pagination.items, pagination.total, pagination.pages
+        
+        # Nothing matched word-for-word (likely a typo), fall back to fuzzy matching
+        if search_query and total == 0:
+            products_list, total, pages = _fuzzy_search_page(base_query, search_query, page, per_page, load_options)
     
     return jsonify({
-        'products': [product.to_dict() for product in products_list],
-        'total': total_results,
+        'products': [serialize(product, view, fields) for product in products_list],
+        'total': total,
         'page': page,
         'per_page': per_page,
-        'pages': 1 if search_query else pagination.pages  # For search, we only return top 10
+        'pages': pages
     }), 200
 
 
-def _levenshtein_distance(s1, s2):
-    """Calculate Levenshtein distance between two strings"""
-    if len(s1) < len(s2):
-        return _levenshtein_distance(s2, s1)
-    
-    if len(s2) == 0:
-        return len(s1)
-    
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-    
-    return previous_row[-1]
-
-
-def _string_similarity(s1, s2):
-    """Calculate similarity score between two strings (0-1, where 1 is identical)"""
-    if not s1 or not s2:
-        return 0.0
-    
-    s1_lower = s1.lower()
-    s2_lower = s2.lower()
-    
-    # Exact match
-    if s1_lower == s2_lower:
-        return 1.0
-    
-    # Contains match
-    if s1_lower in s2_lower or s2_lower in s1_lower:
-        return 0.9
-    
-    # Calculate similarity using Levenshtein distance
-    longer = max(len(s1), len(s2))
-    distance = _levenshtein_distance(s1_lower, s2_lower)
-    similarity = (longer - distance) / longer if longer > 0 else 0.0
-    
-    return similarity
-
-
-def _score_product(product, search_query):
-    """Score a product based on search query relevance"""
-    query_lower = search_query.lower()
-    query_words = query_lower.split()
-    max_score = 0.0
-    
-    # Search in product name (highest weight)
-    name_score = _string_similarity(query_lower, product.name.lower())
-    if name_score > 0.6:  # Only count if similarity is reasonable
-        max_score = max(max_score, name_score * 1.0)
-    
-    # Check word-by-word matching in name
-    name_words = product.name.lower().split()
-    for query_word in query_words:
-        for name_word in name_words:
-            word_score = _string_similarity(query_word, name_word)
-            if word_score > 0.7:  # At least 70% similar
-                max_score = max(max_score, word_score * 0.9)
-    
-    # Search in description (medium weight)
-    if product.description:
-        desc_score = _string_similarity(query_lower, product.description.lower())
-        if desc_score > 0.6:
-            max_score = max(max_score, desc_score * 0.8)
-        
-        # Word-by-word in description
-        desc_words = product.description.lower().split()
-        for query_word in query_words:
-            for desc_word in desc_words:
-                word_score = _string_similarity(query_word, desc_word)
-                if word_score > 0.7:
-                    max_score = max(max_score, word_score * 0.7)
-    
-    # Search in category name (lower weight)
-    if product.category:
-        cat_score = _string_similarity(query_lower, product.category.name.lower())
-        if cat_score > 0.6:
-            max_score = max(max_score, cat_score * 0.6)
-    
-    # Search in supplier name (lower weight)
-    if product.supplier_name:
-        supplier_score = _string_similarity(query_lower, product.supplier_name.lower())
-        if supplier_score > 0.6:
-            max_score = max(max_score, supplier_score * 0.6)
-    
-    return max_score
-
-
-def _apply_fuzzy_search(products, search_query):
-    """Apply fuzzy search to products and return sorted by relevance"""
-    if not search_query:
-        return products
-    
-    # Score each product
-    scored_products = []
-    for product in products:
-        score = _score_product(product, search_query)
-        if score > 0.5:  # Only include products with at least 50% match
-            scored_products.append((score, product))
-    
-    # Sort by score (descending)
-    scored_products.sort(key=lambda x: x[0], reverse=True)
-    
-    # Return just the products
-    return [product for _, product in scored_products]
+def _fuzzy_search_page(query, search_query, page, per_page, load_options=()):
+    """
+    Typo-tolerant search using the in-memory trigram index.
+    Returns (products, total, pages) for the requested page, keeping only
+    products visible through the given (filtered) query.
+    """
+    ranked = fuzzy_index.search(search_query)
+    if not ranked:
+        return [], 0, 0
+    
+    scores = dict(ranked)
+    visible_ids = {
+        product_id for (product_id,) in
+        query.filter(Product.id.in_(list(scores))).with_entities(Product.id).all()
+    }
+    ordered_ids = [product_id for product_id, _ in ranked if product_id in visible_ids]
+    
+    total = len(ordered_ids)
+    page_ids = ordered_ids[(page - 1) * per_page:page * per_page]
+    products = Product.query.options(*load_options).filter(Product.id.in_(page_ids)).all() if page_ids else []
+    products.sort(key=lambda product: page_ids.index(product.id))
+    
+    return products, total, (total + per_page - 1) // per_page
 
 @products_bp.route('/<int:product_id>', methods=['GET'])
 @jwt_required(optional=True)
+@conditional_response(_product_signature)
+@cached_response('catalog')
 def get_product(product_id):
     """Get product by ID"""
     product = Product.query.get(product_id)
     if not product:
         return jsonify({'error': 'Product not found'}), 404
     
-    current_user_id = get_jwt_identity()
-    is_admin = False
-    
-    if current_user_id:
-        current_user = User.query.get(current_user_id)
-        is_admin = current_user and current_user.role == 'admin'
+    identity = get_identity()
+    is_admin = bool(identity and identity.is_admin)
     
     # Non-admins can't see inactive products
     if not product.is_active and not is_admin:
@@ -504,90 +483,42 @@ def get_product(product_id):
 
 @products_bp.route('/<int:product_id>/similar', methods=['GET'])
 @jwt_required(optional=True)
+@conditional_response(_similar_products_signature)
+@cached_response('catalog')
 def get_similar_products(product_id):
-    """Get similar products based on name and description similarity"""
+    """Get similar products (precomputed from category and name/description similarity)"""
+    view, fields = get_response_view()
+    if not view:
+        return jsonify({'error': 'Invalid view. Must be one of: detail, summary'}), 400
+    
     product = Product.query.get(product_id)
     if not product:
         return jsonify({'error': 'Product not found'}), 404
     
-    current_user_id = get_jwt_identity()
-    is_admin = False
-    
-    if current_user_id:
-        current_user = User.query.get(current_user_id)
-        is_admin = current_user and current_user.role == 'admin'
+    identity = get_identity()
+    is_admin = bool(identity and identity.is_admin)
     
     # Non-admins can't see inactive products
     if not product.is_active and not is_admin:
         return jsonify({'error': 'Product not found'}), 404
     
-    # Get limit from query params (default 4)
+    # Get limit from query params (default 4, at most the precomputed list size)
     limit = request.args.get('limit', 4, type=int)
+    limit = max(1, min(limit, similarity.TOP_N))
     
-    # Base query - exclude current product and only active products (unless admin)
-    base_query = Product.query.filter(Product.id != product_id)
+    # Read the precomputed list (see Main/similarity.py), best match first
+    load_options = product_summary_load_options() if view == 'summary' else product_load_options()
+    query = Product.query.options(*load_options).join(
+        SimilarProduct, SimilarProduct.similar_product_id == Product.id
+    ).filter(SimilarProduct.product_id == product_id)
     if not is_admin:
-        base_query = base_query.filter(Product.is_active == True)
-    
-    similar_products = []
-    seen_ids = set()
-    
-    # Strategy 1: Same category products (highest priority)
-    if product.category_id:
-        category_matches = base_query.filter(
-            Product.category_id == product.category_id
-        ).limit(limit * 3).all()
-        for p in category_matches:
-            if p.id not in seen_ids:
-                seen_ids.add(p.id)
-                similar_products.append(p)
-    
-    # Strategy 2: Find products with similar names (using LIKE for partial matches)
-    if product.name and len(similar_products) < limit:
-        # Extract meaningful keywords from product name (remove common words)
-        name_words = product.name.lower().split()
-        # Filter out common words
-        common_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
-        name_keywords = [w for w in name_words if w not in common_words and len(w) > 2][:4]
-        
-        if name_keywords:
-            # Create OR conditions for each keyword
-            name_conditions = []
-            for keyword in name_keywords:
-                name_conditions.append(func.lower(Product.name).like(f"%{keyword}%"))
-            
-            if name_conditions:
-                name_matches = base_query.filter(or_(*name_conditions)).limit(limit * 2).all()
-                for p in name_matches:
-                    if p.id not in seen_ids:
-                        seen_ids.add(p.id)
-                        similar_products.append(p)
-    
-    # Strategy 3: Find products with similar descriptions
-    if product.description and len(similar_products) < limit:
-        # Extract meaningful keywords from description
-        desc_words = product.description.lower().split()
-        # Filter out common words and get meaningful keywords
-        common_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'should', 'could', 'may', 'might', 'can', 'this', 'that', 'these', 'those'}
-        desc_keywords = [w for w in desc_words if w not in common_words and len(w) > 3][:5]
-        
-        if desc_keywords:
-            # Create OR conditions for description keywords
-            desc_conditions = []
-            for keyword in desc_keywords:
-                desc_conditions.append(func.lower(Product.description).like(f"%{keyword}%"))
-            
-            if desc_conditions:
-                desc_matches = base_query.filter(or_(*desc_conditions)).limit(limit * 2).all()
-                for p in desc_matches:
-                    if p.id not in seen_ids:
-                        seen_ids.add(p.id)
-                        similar_products.append(p)
-    
-    # Limit to requested number
-    similar_products = similar_products[:limit]
+        query = query.filter(Product.is_active == True)
+    query = query.order_by(SimilarProduct.score.desc(), Product.id).limit(limit)
     
-    return jsonify([p.to_dict() for p in similar_products]), 200
+    # Lists are written by create/update_product and refresh_similar_products.py,
+    # never here: a GET must not change the data its ETag was computed from
+    similar_products = query.all()
+    return jsonify([serialize(p, view, fields) for p in similar_products]), 200
 
 @products_bp.route('/', methods=['POST'])
 @products_bp.route('', methods=['POST'])  # Handle both with and without trailing slash
@@ -658,12 +589,22 @@ def create_product():
                 )
                 db.session.add(product_image)
         
+        search_index.index_product(product)
         db.session.commit()
+        fuzzy_index.add_product(product)
+        try:
+            similarity.refresh_product(product)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            log.warning('could not refresh similar products', extra={'product_id': product.id, 'error': str(e)})
+        invalidate_cache('catalog')
         
         return jsonify({'message': 'Product created successfully', 'product': product.to_dict()}), 201
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/<int:product_id>', methods=['PUT'])
@@ -730,6 +671,8 @@ def update_product(product_id):
         
         # Handle image updates if provided
         if 'images' in data and isinstance(data['images'], list):
+            # Images are part of the product payload, mark the product as changed
+            product.updated_at = datetime.utcnow()
             # Delete existing images not in the new list
             existing_image_urls = {img.image_url for img in product.images}
             new_image_urls = {img.get('image_url') for img in data['images'] if img.get('image_url')}
@@ -765,11 +708,21 @@ def update_product(product_id):
                     )
                     db.session.add(product_image)
         
+        search_index.index_product(product)
         db.session.commit()
+        fuzzy_index.add_product(product)
+        try:
+            similarity.refresh_product(product)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            log.warning('could not refresh similar products', extra={'product_id': product.id, 'error': str(e)})
+        invalidate_cache('catalog')
         return jsonify({'message': 'Product updated successfully', 'product': product.to_dict()}), 200
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/<int:product_id>', methods=['DELETE'])
@@ -790,7 +743,7 @@ def delete_product(product_id):
                 'order_items_count': order_items_count
             }), 400
         
-        # Delete all product images from Cloudinary before deleting the product
+        # Collect all product image URLs (deleted from storage after the commit)
         all_image_urls = []
         
         # Collect main_image_url if it exists
@@ -802,80 +755,28 @@ def delete_product(product_id):
             if img.image_url and img.image_url not in all_image_urls:
                 all_image_urls.append(img.image_url)
         
-        # Delete images from Cloudinary (non-blocking - product will be deleted even if this fails)
-        deleted_cloudinary_count = 0
-        if all_image_urls:
-            try:
-                # Configure Cloudinary
-                cloudinary.config(
-                    cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-                    api_key=os.getenv('CLOUDINARY_API_KEY'),
-                    api_secret=os.getenv('CLOUDINARY_API_SECRET')
-                )
-                
-                # Check if Cloudinary is configured
-                if all([os.getenv('CLOUDINARY_CLOUD_NAME'), 
-                       os.getenv('CLOUDINARY_API_KEY'), 
-                       os.getenv('CLOUDINARY_API_SECRET')]):
-                    import re
-                    for image_url in all_image_urls:
-                        if 'cloudinary.com' in image_url:
-                            try:
-                                # Extract public_id from Cloudinary URL
-                                # Cloudinary URLs format: 
-                                # https://res.cloudinary.com/{cloud_name}/image/upload/{transformations}/{public_id}.{format}
-                                # or: https://res.cloudinary.com/{cloud_name}/image/upload/v{version}/{public_id}.{format}
-                                # The public_id may include folder path like: guzone_products/{filename}
-                                
-                                # Match everything after /upload/ until the file extension
-                                match = re.search(r'/upload/(?:v\d+/)?(?:[^/]+/)*(.+?)(?:\.[^.]+)?$', image_url)
-                                if match:
-                                    # Get the full path after /upload/
-                                    full_path = re.search(r'/upload/(.+?)(?:\.[^.]+)?$', image_url)
-                                    if full_path:
-                                        public_id = full_path.group(1)
-                                        # Remove version prefix if present (v1234567890/)
-                                        public_id = re.sub(r'^v\d+/', '', public_id)
-                                        
-                                        # Ensure folder prefix is correct
-                                        if not public_id.startswith('guzone_products/'):
-                                            # Extract just the filename if folder is missing
-                                            filename = public_id.split('/')[-1]
-                                            public_id = f"guzone_products/{filename}"
-                                        
-                                        # Delete from Cloudinary (non-blocking)
-                                        try:
-                                            result = cloudinary.uploader.destroy(public_id)
-                                            if result.get('result') == 'ok':
-                                                deleted_cloudinary_count += 1
-                                            else:
-                                                print(f"Warning: Cloudinary deletion returned: {result.get('result')} for {public_id}")
-                                        except Exception as destroy_error:
-                                            print(f"Warning: Cloudinary destroy failed for {public_id}: {destroy_error}")
-                            except Exception as e:
-                                print(f"Warning: Could not delete image {image_url} from Cloudinary: {e}")
-            except Exception as e:
-                print(f"Warning: Error deleting images from Cloudinary: {e}")
-                # Continue with product deletion even if Cloudinary deletion fails
-        
-        # IMPORTANT: Delete the product from database regardless of Cloudinary deletion success/failure
-        # This ensures product deletion always succeeds even if Cloudinary cleanup fails
-        # The Cloudinary deletion above is non-blocking - any failures are logged but don't prevent product deletion
-        
         # Delete the product (this will cascade delete ProductImage records due to cascade='all, delete-orphan')
+        search_index.remove_product(product_id)
+        similarity.remove_product(product_id)
         db.session.delete(product)
+        released_urls = release_images(all_image_urls)
         db.session.commit()
+        fuzzy_index.remove_product(product_id)
+        invalidate_cache('catalog')
+        
+        # Remove the images from storage in the background, only once the product is gone
+        queued_count = delete_images(released_urls)
         
         return jsonify({
             'message': 'Product deleted successfully',
             'total_images': len(all_image_urls),
-            'cloudinary_images_deleted': deleted_cloudinary_count,
-            'note': 'Product deleted from database. Some Cloudinary images may not have been deleted if deletion failed.'
+            'images_queued_for_deletion': queued_count,
+            'note': 'Product deleted from database. Its images are deleted in the background.'
         }), 200
     
     except Exception as e:
         db.session.rollback()
-        print(f"Error deleting product: {e}")
+        log.exception('product deletion failed', extra={'product_id': product_id})
         return jsonify({'error': f'Failed to delete product: {str(e)}'}), 500
 
 def allowed_file(filename):
@@ -886,7 +787,12 @@ def allowed_file(filename):
 @products_bp.route('/upload-image', methods=['POST'])
 @admin_required
 def upload_product_image():
-    """Upload a product image to Cloudinary (admin only)"""
+    """
+    Upload a product image sent as multipart form data (admin only).
+    Werkzeug parses the form first (larger files into its own temporary file),
+    so the file is copied once more into the spool; /upload-image/stream
+    avoids that copy.
+    """
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -898,58 +804,79 @@ def upload_product_image():
         return jsonify({'error': 'Invalid file type. Allowed types: png, jpg, jpeg, gif, webp'}), 400
     
     try:
-        # Configure Cloudinary from environment variables
-        cloudinary.config(
-            cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-            api_key=os.getenv('CLOUDINARY_API_KEY'),
-            api_secret=os.getenv('CLOUDINARY_API_SECRET')
-        )
-        
-        # Check if Cloudinary is configured
-        if not all([os.getenv('CLOUDINARY_CLOUD_NAME'), 
-                   os.getenv('CLOUDINARY_API_KEY'), 
-                   os.getenv('CLOUDINARY_API_SECRET')]):
-            return jsonify({
-                'error': 'Cloudinary not configured. Please set CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, and CLOUDINARY_API_SECRET environment variables.'
-            }), 500
-        
-        # Generate unique filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-        original_filename = secure_filename(file.filename)
-        filename_without_ext = os.path.splitext(original_filename)[0]
-        file_ext = os.path.splitext(original_filename)[1]
-        unique_filename = f"{timestamp}_{filename_without_ext}"
-        
-        # Upload to Cloudinary
-        # Read file into memory
-        file.seek(0)  # Reset file pointer
-        upload_result = cloudinary.uploader.upload(
-            file,
-            folder="guzone_products",
-            public_id=unique_filename,
-            resource_type="image",
-            overwrite=False,
-            invalidate=True  # Invalidate CDN cache
-        )
-        
-        # Get the secure URL from Cloudinary
-        image_url = upload_result.get('secure_url') or upload_result.get('url')
+        upload = uploads.spool_stream(file.stream, file.filename)
+    except uploads.UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    return _store_upload(upload)
+
+@products_bp.route('/upload-image/stream', methods=['POST'])
+@admin_required
+def upload_product_image_stream():
+    """Upload a product image sent as the raw request body, e.g. ?filename=photo.jpg (admin only)"""
+    filename = request.args.get('filename', '', type=str).strip() or request.headers.get('X-Filename', '').strip()
+    if not filename:
+        return jsonify({'error': 'filename is required (query parameter or X-Filename header)'}), 400
+    
+    if not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Allowed types: png, jpg, jpeg, gif, webp'}), 400
+    
+    try:
+        upload = uploads.spool_stream(request.stream, filename, current_app.config.get('MAX_CONTENT_LENGTH'))
+    except uploads.UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    return _store_upload(upload)
+
+def _store_upload(upload):
+    """Upload a spooled file now, or queue it with ?async=true, and build the response"""
+    # ?async=true: queue the upload and answer at once with a job to poll
+    if request.args.get('async', '', type=str).strip().lower() in ('1', 'true', 'yes'):
+        try:
+            job = uploads.submit_upload(upload)
+        except StorageError as e:
+            log.warning('image upload could not be queued', extra={'error': str(e)})
+            return jsonify({'error': str(e)}), 500
+        except Exception as e:
+            log.exception('image upload could not be queued')
+            return jsonify({'error': f'Image upload failed: {str(e)}'}), 500
         
-        if not image_url:
-            return jsonify({'error': 'Failed to get image URL from Cloudinary'}), 500
+        return jsonify({
+            'message': 'Image upload queued',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/products/upload-image/jobs/{job.id}',
+            'sha256': upload.sha256
+        }), 202
+    
+    try:
+        stored = uploads.upload_now(upload)
         
         return jsonify({
-            'message': 'Image uploaded successfully to Cloudinary',
-            'image_url': image_url
+            'message': 'Image already uploaded, reusing it' if stored.duplicate else 'Image uploaded successfully',
+            'image_url': stored.image_url,
+            'variants': stored.variants,
+            'duplicate': stored.duplicate,
+            'sha256': upload.sha256
         }), 201
     
-    except cloudinary.exceptions.Error as e:
-        print(f"Cloudinary upload error: {e}")
-        return jsonify({'error': f'Cloudinary upload failed: {str(e)}'}), 500
+    except StorageError as e:
+        log.warning('image upload failed', extra={'error': str(e)})
+        return jsonify({'error': str(e)}), 500
     except Exception as e:
-        print(f"Image upload error: {e}")
+        log.exception('image upload failed')
         return jsonify({'error': f'Image upload failed: {str(e)}'}), 500
 
+@products_bp.route('/upload-image/jobs/<job_id>', methods=['GET'])
+@admin_required
+def get_upload_job(job_id):
+    """Get the status of a queued image upload (admin only)"""
+    job = uploads.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Upload job not found'}), 404
+    
+    return jsonify(job.to_dict()), 200
+
 @products_bp.route('/<int:product_id>/images', methods=['POST'])
 @admin_required
 def add_product_image(product_id):
@@ -975,12 +902,15 @@ def add_product_image(product_id):
         )
         
         db.session.add(product_image)
+        product.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_cache('catalog')
         
         return jsonify({'message': 'Image added successfully', 'image': product_image.to_dict()}), 201
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/<int:product_id>/images/<int:image_id>', methods=['DELETE'])
@@ -996,193 +926,144 @@ def delete_product_image(product_id, image_id):
         return jsonify({'error': 'Image not found'}), 404
     
     try:
-        # Optionally delete from Cloudinary if it's a Cloudinary URL
-        image_url = product_image.image_url
-        if image_url and 'cloudinary.com' in image_url:
-            try:
-                # Extract public_id from Cloudinary URL
-                # Cloudinary URLs format: https://res.cloudinary.com/{cloud_name}/image/upload/{version}/{public_id}.{format}
-                import re
-                match = re.search(r'/upload/(?:v\d+/)?(.+?)(?:\.[^.]+)?$', image_url)
-                if match:
-                    public_id = match.group(1)
-                    # Remove folder prefix if present
-                    if public_id.startswith('guzone_products/'):
-                        public_id = public_id.replace('guzone_products/', '')
-                    
-                    # Configure Cloudinary
-                    cloudinary.config(
-                        cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-                        api_key=os.getenv('CLOUDINARY_API_KEY'),
-                        api_secret=os.getenv('CLOUDINARY_API_SECRET')
-                    )
-                    
-                    # Delete from Cloudinary
-                    cloudinary.uploader.destroy(f"guzone_products/{public_id}")
-            except Exception as e:
-                print(f"Warning: Could not delete image from Cloudinary: {e}")
-        
         db.session.delete(product_image)
+        image_urls = release_images([product_image.image_url])
+        product.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_cache('catalog')
+        delete_images(image_urls)
         return jsonify({'message': 'Image deleted successfully'}), 200
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 # ==================== ORDER ROUTES ====================
 
 @products_bp.route('/orders', methods=['POST'])
-@jwt_required()
+@customer_required
 def create_order():
     """Create a new order (customer only)"""
-    print("=" * 50)
-    print("DEBUG: create_order - Starting order creation")
-    print("=" * 50)
-    
     try:
-        current_user_id = get_jwt_identity()
-        print(f"DEBUG: current_user_id from JWT: {current_user_id} (type: {type(current_user_id)})")
-        
-        # get_jwt_identity() returns a string, convert to int for database query
-        current_user = User.query.get(int(current_user_id))
-        print(f"DEBUG: current_user found: {current_user is not None}, role: {current_user.role if current_user else 'None'}")
-        
-        if not current_user or current_user.role != 'customer':
-            print(f"DEBUG: Access denied - user: {current_user is not None}, role: {current_user.role if current_user else 'None'}")
-            return jsonify({'error': 'Customer access required'}), 403
-        
-        customer = Customer.query.filter_by(user_id=int(current_user_id)).first()
-        print(f"DEBUG: customer found: {customer is not None}, customer_id: {customer.id if customer else 'None'}")
-        
-        if not customer:
-            print("DEBUG: Customer profile not found")
-            return jsonify({'error': 'Customer profile not found'}), 404
+        customer_id = get_identity().customer_id
         
         data = request.get_json()
-        print(f"DEBUG: Request data received: {data}")
         
         if not data:
-            print("DEBUG: No JSON data in request")
             return jsonify({'error': 'Request body is required'}), 400
         
         if 'items' not in data or not data['items']:
-            print(f"DEBUG: Missing or empty items - items: {data.get('items')}")
             return jsonify({'error': 'Order items are required'}), 400
         
         if 'shipping_address' not in data:
-            print(f"DEBUG: Missing shipping_address - data keys: {list(data.keys())}")
             return jsonify({'error': 'Shipping address is required'}), 400
         
-        print(f"DEBUG: Processing {len(data['items'])} items")
-        
         # Note: Payment must be completed before delivery can be initiated
         # Admin will update payment_status to 'paid' with confirmation message
         
         # Generate unique order number
         order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-        print(f"DEBUG: Generated order_number: {order_number}")
-        
-        # Calculate total and create order items
-        total_amount = 0
-        order_items = []
         
+        # Validate the cart lines before touching the database
         for idx, item_data in enumerate(data['items']):
-            print(f"DEBUG: Processing item {idx + 1}/{len(data['items'])}: {item_data}")
-            
             if 'product_id' not in item_data or 'quantity' not in item_data:
-                print(f"DEBUG: Item {idx + 1} missing required fields - item_data: {item_data}")
+                log.debug('order rejected: incomplete item', extra={'line': idx + 1})
                 return jsonify({'error': 'Each item must have product_id and quantity'}), 400
-            
+        
+        # Load every product of the cart in one query
+        product_ids = set()
+        for item_data in data['items']:
+            try:
+                product_ids.add(int(item_data['product_id']))
+            except (ValueError, TypeError):
+                pass
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()} if product_ids else {}
+        log.debug('order products loaded', extra={'lines': len(data['items']), 'found': len(products), 'requested': len(product_ids)})
+        
+        # Calculate total and build order item rows
+        total_amount = 0
+        order_item_rows = []
+        quantities = {}  # product_id -> total quantity to reserve
+        
+        for idx, item_data in enumerate(data['items']):
             product_id = item_data['product_id']
-            print(f"DEBUG: Looking up product_id: {product_id} (type: {type(product_id)})")
-            
-            product = Product.query.get(product_id)
+            try:
+                product = products.get(int(product_id))
+            except (ValueError, TypeError):
+                product = None
             if not product:
-                print(f"DEBUG: Product {product_id} not found in database")
+                log.debug('order rejected: unknown product', extra={'product_id': product_id})
                 return jsonify({'error': f'Product {product_id} not found'}), 404
             
-            print(f"DEBUG: Product found - name: {product.name}, price: {product.price}, stock: {product.stock_quantity}, active: {product.is_active}")
-            
             if not product.is_active:
-                print(f"DEBUG: Product {product.name} is not active")
+                log.debug('order rejected: inactive product', extra={'product_id': product.id})
                 return jsonify({'error': f'Product {product.name} is not available'}), 400
             
             quantity = item_data['quantity']
-            print(f"DEBUG: Requested quantity: {quantity}, Available stock: {product.stock_quantity}")
-            
-            if quantity > product.stock_quantity:
-                print(f"DEBUG: Insufficient stock - requested: {quantity}, available: {product.stock_quantity}")
-                return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+                log.debug('order rejected: invalid quantity', extra={'product_id': product.id, 'quantity': quantity})
+                return jsonify({'error': f'Invalid quantity for {product.name}'}), 400
             
             try:
                 unit_price = float(product.price)
                 subtotal = unit_price * quantity
                 total_amount += subtotal
-                print(f"DEBUG: Item {idx + 1} - unit_price: {unit_price}, quantity: {quantity}, subtotal: {subtotal}, total so far: {total_amount}")
             except (ValueError, TypeError) as price_error:
-                print(f"DEBUG: Error converting price to float - price: {product.price}, error: {str(price_error)}")
+                log.warning('invalid product price', extra={'product_id': product.id, 'price': product.price, 'error': str(price_error)})
                 return jsonify({'error': f'Invalid price for product {product.name}'}), 400
             
-            order_item = OrderItem(
-                product_id=product.id,
-                quantity=quantity,
-                unit_price=unit_price,
-                subtotal=subtotal
-            )
-            order_items.append(order_item)
-            print(f"DEBUG: Created OrderItem for product {product.id}")
-            
-            # Update product stock
-            product.stock_quantity -= quantity
-            print(f"DEBUG: Updated stock for product {product.id} - new stock: {product.stock_quantity}")
-        
-        print(f"DEBUG: Total amount calculated: {total_amount}")
-        print(f"DEBUG: Number of order items: {len(order_items)}")
+            order_item_rows.append({
+                'product_id': product.id,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'subtotal': subtotal
+            })
+            quantities[product.id] = quantities.get(product.id, 0) + quantity
         
         # Create order
-        print(f"DEBUG: Creating Order object...")
         order = Order(
-            customer_id=customer.id,
+            customer_id=customer_id,
             order_number=order_number,
             total_amount=total_amount,
             shipping_address=data['shipping_address'],
             payment_method=data.get('payment_method'),
             notes=data.get('notes')
         )
-        print(f"DEBUG: Order object created - customer_id: {customer.id}, order_number: {order_number}")
-        
         db.session.add(order)
-        print("DEBUG: Order added to session")
-        
         db.session.flush()  # Get order.id
-        print(f"DEBUG: Order flushed, order.id: {order.id}")
         
-        # Add order items
-        print(f"DEBUG: Adding {len(order_items)} order items to session...")
-        for idx, order_item in enumerate(order_items):
-            order_item.order_id = order.id
-            db.session.add(order_item)
-            print(f"DEBUG: Added order item {idx + 1} with order_id: {order.id}")
+        # Add order items in one multi-row INSERT
+        for row in order_item_rows:
+            row['order_id'] = order.id
+        db.session.execute(insert(OrderItem), order_item_rows)
         
-        print("DEBUG: Committing transaction...")
-        db.session.commit()
-        print(f"DEBUG: Transaction committed successfully! Order ID: {order.id}")
+        # Reserve stock last so the product row locks are held as briefly as possible
+        db.session.flush()
+        try:
+            reserve_stock(quantities)
+        except InsufficientStock as e:
+            db.session.rollback()
+            log.info('order rejected: insufficient stock', extra={'product_id': e.product_id, 'quantity': e.quantity})
+            return jsonify({'error': f'Insufficient stock for {products[e.product_id].name}'}), 400
         
+        db.session.commit()
+        # No catalog invalidation: reserve_stock bumps updated_at, which changes
+        # the ETag the cached catalog responses are keyed by (see Main/cache.py)
+        log.info('order created', extra={
+            'order_id': order.id,
+            'customer_id': customer_id,
+            'lines': len(order_item_rows),
+            'total_amount': total_amount,
+        })
+        
+        order = Order.query.options(*order_load_options()).filter_by(id=order.id).one()
         order_dict = order.to_dict()
-        print(f"DEBUG: Order dict created, returning response")
         
         return jsonify({'message': 'Order created successfully', 'order': order_dict}), 201
     
     except Exception as e:
-        import traceback
-        print("=" * 50)
-        print("DEBUG: EXCEPTION in create_order")
-        print(f"Error type: {type(e).__name__}")
-        print(f"Error message: {str(e)}")
-        print("Full traceback:")
-        print(traceback.format_exc())
-        print("=" * 50)
+        log.exception('order creation failed')
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
@@ -1190,18 +1071,15 @@ def create_order():
 @jwt_required()
 def get_order(order_id):
     """Get order by ID"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
+    identity = get_identity()
     
     order = Order.query.get(order_id)
     if not order:
         return jsonify({'error': 'Order not found'}), 404
     
     # Customers can only view their own orders, admins can view all
-    if current_user.role == 'customer':
-        customer = Customer.query.filter_by(user_id=current_user_id).first()
-        if not customer or order.customer_id != customer.id:
-            return jsonify({'error': 'Access denied'}), 403
+    if not identity or (identity.is_customer and order.customer_id != identity.customer_id):
+        return jsonify({'error': 'Access denied'}), 403
     
     return jsonify(order.to_dict()), 200
 
@@ -1233,29 +1111,19 @@ def update_order_status(order_id):
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/orders/<int:order_id>/complete', methods=['POST'])
-@jwt_required()
+@customer_required
 def complete_order(order_id):
     """Customer confirms payment completion - updates order status to pending"""
-    current_user_id = get_jwt_identity()
-    # get_jwt_identity() returns a string, convert to int for database query
-    current_user = User.query.get(int(current_user_id))
-    
-    if not current_user or current_user.role != 'customer':
-        return jsonify({'error': 'Customer access required'}), 403
-    
-    customer = Customer.query.filter_by(user_id=int(current_user_id)).first()
-    if not customer:
-        return jsonify({'error': 'Customer profile not found'}), 404
-    
     order = Order.query.get(order_id)
     if not order:
         return jsonify({'error': 'Order not found'}), 404
     
     # Ensure customer owns this order
-    if order.customer_id != customer.id:
+    if order.customer_id != get_identity().customer_id:
         return jsonify({'error': 'Access denied'}), 403
     
     data = request.get_json() or {}
@@ -1277,6 +1145,7 @@ def complete_order(order_id):
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/orders/<int:order_id>/payment', methods=['PUT'])
@@ -1308,12 +1177,21 @@ def update_payment_status(order_id):
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/orders/all', methods=['GET'])
 @admin_required
 def get_all_orders():
-    """Get all orders with pagination, filtering, and search (admin only)"""
+    """
+    Get all orders with pagination, filtering, and search (admin only)
+    Pass limit / cursor instead of page / per_page for keyset pagination
+    (newest first), with total=none|exact|approximate.
+    """
+    view, fields = get_response_view()
+    if not view:
+        return jsonify({'error': 'Invalid view. Must be one of: detail, summary'}), 400
+    
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     search = request.args.get('search', '', type=str).strip()
@@ -1321,7 +1199,7 @@ def get_all_orders():
     date_to = request.args.get('date_to', '', type=str)
     
     # Base query
-    query = Order.query
+    query = Order.query.options(*(order_summary_load_options() if view == 'summary' else order_load_options()))
     
     # Search by product name (joins with OrderItem and Product)
     if search:
@@ -1346,6 +1224,26 @@ def get_all_orders():
         except ValueError:
             return jsonify({'error': 'Invalid date_to format. Use YYYY-MM-DD'}), 400
     
+    if wants_keyset_page():
+        total_mode = get_total_mode()
+        if not total_mode:
+            return jsonify({'error': 'Invalid total. Must be one of: none, exact, approximate'}), 400
+        
+        cursor, limit = get_keyset_args(default_limit=10, max_limit=100)
+        try:
+            orders, next_cursor = keyset_paginate(query, [Order.created_at, Order.id], cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        response = {
+            'orders': [serialize(order, view, fields) for order in orders],
+            'next_cursor': next_cursor,
+            'limit': limit
+        }
+        if total_mode != 'none':
+            response['total'] = count_rows(query, total_mode)
+        return jsonify(response), 200
+    
     # Order by creation date descending
     query = query.order_by(Order.created_at.desc())
     
@@ -1357,7 +1255,7 @@ def get_all_orders():
     )
     
     return jsonify({
-        'orders': [order.to_dict() for order in pagination.items],
+        'orders': [serialize(order, view, fields) for order in pagination.items],
         'total': pagination.total,
         'page': pagination.page,
         'per_page': pagination.per_page,
@@ -1419,24 +1317,22 @@ def create_delivery(order_id):
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/deliveries/<int:delivery_id>', methods=['GET'])
 @jwt_required()
 def get_delivery(delivery_id):
     """Get delivery by ID"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
+    identity = get_identity()
     
     delivery = Delivery.query.get(delivery_id)
     if not delivery:
         return jsonify({'error': 'Delivery not found'}), 404
     
     # Customers can only view deliveries for their own orders
-    if current_user.role == 'customer':
-        customer = Customer.query.filter_by(user_id=current_user_id).first()
-        if not customer or delivery.order.customer_id != customer.id:
-            return jsonify({'error': 'Access denied'}), 403
+    if not identity or (identity.is_customer and delivery.order.customer_id != identity.customer_id):
+        return jsonify({'error': 'Access denied'}), 403
     
     return jsonify(delivery.to_dict()), 200
 
@@ -1444,18 +1340,15 @@ def get_delivery(delivery_id):
 @jwt_required()
 def track_delivery(tracking_number):
     """Track delivery by tracking number"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
+    identity = get_identity()
     
     delivery = Delivery.query.filter_by(tracking_number=tracking_number).first()
     if not delivery:
         return jsonify({'error': 'Delivery not found'}), 404
     
     # Customers can only track deliveries for their own orders
-    if current_user.role == 'customer':
-        customer = Customer.query.filter_by(user_id=current_user_id).first()
-        if not customer or delivery.order.customer_id != customer.id:
-            return jsonify({'error': 'Access denied'}), 403
+    if not identity or (identity.is_customer and delivery.order.customer_id != identity.customer_id):
+        return jsonify({'error': 'Access denied'}), 403
     
     return jsonify(delivery.to_dict()), 200
 
@@ -1507,11 +1400,26 @@ def update_delivery_status(delivery_id):
     
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/deliveries/all', methods=['GET'])
 @admin_required
 def get_all_deliveries():
-    """Get all deliveries (admin only)"""
-    deliveries = Delivery.query.order_by(Delivery.created_at.desc()).all()
+    """Get all deliveries, newest first (admin only); ?limit= / ?cursor= for keyset pagination"""
+    query = Delivery.query.options(*delivery_load_options())
+    
+    if wants_keyset_page():
+        cursor, limit = get_keyset_args()
+        try:
+            deliveries, next_cursor = keyset_paginate(query, [Delivery.created_at, Delivery.id], cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'deliveries': [delivery.to_dict() for delivery in deliveries],
+            'next_cursor': next_cursor,
+            'limit': limit
+        }), 200
+    
+    deliveries = query.order_by(Delivery.created_at.desc()).all()
     return jsonify([delivery.to_dict() for delivery in deliveries]), 200
@@ -1,21 +1,31 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from Main.app import db
+from Main.auth import get_identity, admin_required, invalidate_identity, revoke_tokens
+from Main.logger import get_logger
+from Main.passwords import PasswordHasherBusy
 from Models.users import User
+from Main.functions import wants_keyset_page, get_keyset_args, keyset_paginate
 
 users_bp = Blueprint('users', __name__)
+log = get_logger(__name__)
 
 @users_bp.route('', methods=['GET'])
 @users_bp.route('/', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_users():
-    """Get all users (admin only)"""
-    current_user_id = get_jwt_identity()
-    # get_jwt_identity() returns a string, convert to int for database query
-    current_user = User.query.get(int(current_user_id))
-    
-    if not current_user or current_user.role != 'admin':
-        return jsonify({'error': 'Admin access required'}), 403
+    """Get all users (admin only); ?limit= / ?cursor= for keyset pagination"""
+    if wants_keyset_page():
+        cursor, limit = get_keyset_args()
+        try:
+            users, next_cursor = keyset_paginate(User.query, [User.created_at, User.id], cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'users': [user.to_dict() for user in users],
+            'next_cursor': next_cursor,
+            'limit': limit
+        }), 200
     
     users = User.query.all()
     return jsonify([user.to_dict() for user in users]), 200
@@ -24,13 +34,10 @@ def get_users():
 @jwt_required()
 def get_user(user_id):
     """Get user by ID"""
-    current_user_id = get_jwt_identity()
-    # get_jwt_identity() returns a string, convert to int for database query
-    current_user = User.query.get(int(current_user_id))
+    identity = get_identity()
     
     # Users can only view their own profile unless they're admin
-    # Compare as integers since current_user_id is string from JWT
-    if int(current_user_id) != user_id and current_user.role != 'admin':
+    if not identity or (identity.user_id != user_id and not identity.is_admin):
         return jsonify({'error': 'Access denied'}), 403
     
     user = User.query.get(user_id)
@@ -51,13 +58,10 @@ def get_user(user_id):
 @jwt_required()
 def update_user(user_id):
     """Update user"""
-    current_user_id = get_jwt_identity()
-    # get_jwt_identity() returns a string, convert to int for database query
-    current_user = User.query.get(int(current_user_id))
+    identity = get_identity()
     
     # Users can only update their own profile unless they're admin
-    # Compare as integers since current_user_id is string from JWT
-    if int(current_user_id) != user_id and current_user.role != 'admin':
+    if not identity or (identity.user_id != user_id and not identity.is_admin):
         return jsonify({'error': 'Access denied'}), 403
     
     user = User.query.get(user_id)
@@ -75,13 +79,20 @@ def update_user(user_id):
         if 'password' in data:
             user.set_password(data['password'])
         
-        if 'is_active' in data and current_user.role == 'admin':
+        if 'is_active' in data and identity.is_admin:
+            if bool(data['is_active']) != user.is_active:
+                revoke_tokens(user)  # Deactivation takes effect before tokens expire
             user.is_active = data['is_active']
         
         db.session.commit()
+        invalidate_identity(user.id)
         return jsonify({'message': 'User updated successfully', 'user': user.to_dict()}), 200
     
+    except PasswordHasherBusy:
+        db.session.rollback()
+        raise  # Answered with 503 by the app error handler
     except Exception as e:
         db.session.rollback()
+        log.exception('request failed')
         return jsonify({'error': str(e)}), 500
 
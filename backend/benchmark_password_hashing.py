@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Script to measure password hashing cost with the current settings.
+
+Reports the time to hash and verify one password and the resulting
+logins/sec per CPU core, for the configured scheme (see Main/passwords.py)
+and, for comparison, the other available schemes. Then runs concurrent
+verifications through the bounded hashing pool to show total throughput
+per process.
+
+Usage:
+    python benchmark_password_hashing.py [seconds per measurement, default 3]
+
+Settings are read from the environment / .env file, e.g.
+    PASSWORD_SCHEME=argon2 ARGON2_MEMORY_COST=65536 python benchmark_password_hashing.py
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(script_dir, '.env'))
+
+from werkzeug.security import generate_password_hash, check_password_hash
+from Main import passwords
+
+PASSWORD = 'correct horse battery staple'
+
+
+def rate(fn, seconds):
+    """Calls of fn per second over roughly the given duration"""
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def report(name, hash_fn, verify_fn, seconds):
+    password_hash = hash_fn(PASSWORD)
+    assert verify_fn(password_hash, PASSWORD)
+    hashes = rate(lambda: hash_fn(PASSWORD), seconds)
+    verifies = rate(lambda: verify_fn(password_hash, PASSWORD), seconds)
+    print(f"  {name:<42} hash {1000 / hashes:7.1f} ms   verify {1000 / verifies:7.1f} ms   "
+          f"{verifies:7.1f} logins/sec/core")
+
+
+def benchmark(seconds):
+    print("=" * 60)
+    print("Password Hashing Benchmark")
+    print("=" * 60)
+    print()
+    print(f"Configured scheme: {passwords.SCHEME}")
+    print(f"Hashing pool: {passwords.PASSWORD_HASH_WORKERS} worker(s), CPU count {os.cpu_count()}")
+    print()
+
+    print("Single thread:")
+    report(f'configured ({passwords.SCHEME})', passwords._hash, passwords._verify, seconds)
+    if passwords.argon2 and passwords.SCHEME != 'argon2':
+        report('argon2id (default parameters)', passwords._argon2_hasher.hash,
+               lambda h, p: passwords._verify(h, p), seconds)
+    for method in ('scrypt', 'pbkdf2'):
+        report(f'werkzeug {method}', lambda p, m=method: generate_password_hash(p, method=m),
+               check_password_hash, seconds)
+    print()
+
+    print("Through the hashing pool (concurrent logins):")
+    password_hash = passwords.hash_password(PASSWORD)
+    clients = passwords.PASSWORD_HASH_WORKERS * 2
+    count = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        while time.perf_counter() - started < seconds:
+            results = list(pool.map(lambda _: passwords.verify_password(password_hash, PASSWORD), range(clients)))
+            assert all(results)
+            count += clients
+    elapsed = time.perf_counter() - started
+    per_second = count / elapsed
+    print(f"  {clients} concurrent clients: {per_second:.1f} logins/sec per process, "
+          f"{per_second / passwords.PASSWORD_HASH_WORKERS:.1f} per worker")
+    return True
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    success = benchmark(seconds)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+Script to measure the cost of typo-tolerant product search (see Main/fuzzy.py).
+
+1. Edit distance: compares a plain full-matrix Levenshtein distance with
+   the banded ``bounded_levenshtein`` used to verify candidates, on short
+   word pairs, on a query word against whole product descriptions (where
+   the banded distance stops at the length check) and on a query word
+   against every word of those descriptions, as the old per-request scorer
+   did. The two are also checked to agree on random word pairs.
+2. Fuzzy index: builds the trigram index over synthetic catalogs of
+   growing size (3-word names, 25-word descriptions) and reports the build
+   time and the time per misspelt query, which should barely grow with the
+   catalog.
+
+Usage:
+    python benchmark_search.py [catalog sizes, default 1000,10000,100000] [queries per size, default 200]
+
+The catalogs are written to a throwaway SQLite database, never to the
+database configured in .env.
+"""
+
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+from dotenv import load_dotenv
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(script_dir, '.env'))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='guzone_search_'), 'search.db')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from sqlalchemy import insert
+from Main.app import create_app, db
+from Main.fuzzy import TrigramIndex, bounded_levenshtein, WORD_THRESHOLD
+from Main.migrations import upgrade
+from Models.products import Product
+
+rng = random.Random(42)
+
+
+def levenshtein(s1, s2):
+    """Reference edit distance over the full (len(s1) + 1) x (len(s2) + 1) matrix"""
+    previous_row = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1, 1):
+        current_row = [i]
+        for j, c2 in enumerate(s2, 1):
+            current_row.append(min(previous_row[j] + 1, current_row[j - 1] + 1, previous_row[j - 1] + (c1 != c2)))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+def max_distance(s1, s2):
+    """Largest distance word_similarity accepts for this pair"""
+    return int(max(len(s1), len(s2)) * (1 - WORD_THRESHOLD))
+
+
+def random_word(min_length=3, max_length=10):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_length, max_length)))
+
+
+def misspell(word):
+    position = rng.randrange(len(word))
+    return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+
+
+def per_call(fn, pairs):
+    """Mean seconds per fn(s1, s2, ...) call over the pairs"""
+    started = time.perf_counter()
+    for args in pairs:
+        fn(*args)
+    return (time.perf_counter() - started) / len(pairs)
+
+
+def benchmark_distance():
+    print("Edit distance (full matrix vs banded)")
+    print("-" * 60)
+
+    pairs = [(random_word(), random_word()) for _ in range(5000)]
+    pairs += [(word, misspell(word)) for word in (random_word(4, 12) for _ in range(5000))]
+    mismatches = 0
+    for s1, s2 in pairs:
+        limit = max_distance(s1, s2)
+        expected = levenshtein(s1, s2)
+        if bounded_levenshtein(s1, s2, limit) != (expected if expected <= limit else limit + 1):
+            mismatches += 1
+    print(f"  agreement on {len(pairs)} word pairs: {len(pairs) - mismatches}/{len(pairs)}")
+
+    full = per_call(levenshtein, pairs)
+    banded = per_call(bounded_levenshtein, [(s1, s2, max_distance(s1, s2)) for s1, s2 in pairs])
+    print(f"  word vs word:        full {full * 1e6:8.1f} us   banded {banded * 1e6:8.1f} us")
+
+    descriptions = [' '.join(random_word() for _ in range(500)) for _ in range(20)]
+    query_words = [misspell(random_word(5, 9)) for _ in descriptions]
+
+    # The old scorer compared the query with the whole description (the
+    # banded distance gives up at once on the length difference here) ...
+    long_pairs = list(zip(query_words, descriptions))
+    full = per_call(levenshtein, long_pairs)
+    banded = per_call(bounded_levenshtein, [(s1, s2, max_distance(s1, s2)) for s1, s2 in long_pairs])
+    length = sum(map(len, descriptions)) // len(descriptions)
+    print(f"  word vs description: full {full * 1e3:8.3f} ms   banded {banded * 1e3:8.3f} ms   "
+          f"({length} chars, banded exits on the length check)")
+
+    # ... and then with every word of it, which is where the banded DP runs
+    token_pairs = [(word, token) for word, description in long_pairs for token in description.split()]
+    full = per_call(levenshtein, token_pairs)
+    banded = per_call(bounded_levenshtein, [(s1, s2, max_distance(s1, s2)) for s1, s2 in token_pairs])
+    tokens = len(token_pairs) // len(descriptions)
+    print(f"  word vs each token:  full {full * 1e6:8.1f} us   banded {banded * 1e6:8.1f} us   per token")
+    print(f"                       full {full * tokens * 1e3:8.3f} ms   banded {banded * tokens * 1e3:8.3f} ms   "
+          f"per description ({tokens} tokens)")
+    print()
+    return mismatches == 0
+
+
+def fill_catalog(vocabulary, start, end):
+    rows = [{
+        'name': ' '.join(rng.sample(vocabulary, 3)),
+        'description': ' '.join(rng.choices(vocabulary, k=25)),
+        'price': 10,
+        'stock_quantity': 1,
+        'sku': f'BENCH-{n}',
+    } for n in range(start, end)]
+    for offset in range(0, len(rows), 5000):
+        db.session.execute(insert(Product), rows[offset:offset + 5000])
+    db.session.commit()
+
+
+def benchmark_index(sizes, queries):
+    print("Fuzzy index per-query cost by catalog size")
+    print("-" * 60)
+
+    app = create_app('development')
+    vocabulary = list({random_word(4, 10) for _ in range(20000)})
+    with app.app_context():
+        upgrade(db.engine)
+        filled = 0
+        for size in sizes:
+            fill_catalog(vocabulary, filled, size)
+            filled = size
+
+            index = TrigramIndex(refresh_seconds=3600)
+            started = time.perf_counter()
+            index.ensure_fresh()
+            build = time.perf_counter() - started
+
+            searches = [misspell(rng.choice(vocabulary)) for _ in range(queries)]
+            searches += [f'{misspell(rng.choice(vocabulary))} {rng.choice(vocabulary)}' for _ in range(queries // 4)]
+            hits = 0
+            started = time.perf_counter()
+            for search_query in searches:
+                hits += bool(index.search(search_query))
+            per_query = (time.perf_counter() - started) / len(searches)
+
+            print(f"  {size:>7} products: build {build:6.2f} s   {per_query * 1e3:6.2f} ms/query   "
+                  f"{hits}/{len(searches)} queries matched")
+    print()
+
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in sys.argv[1].split(',')] if len(sys.argv) > 1 else [1000, 10000, 100000]
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print("=" * 60)
+    print("Product Search Benchmark")
+    print("=" * 60)
+    print()
+    success = benchmark_distance()
+    benchmark_index(sorted(sizes), queries)
+    print("✓ Banded distance matches the full matrix" if success else "✗ Banded distance differs from the full matrix")
+    sys.exit(0 if success else 1)
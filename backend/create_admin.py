@@ -7,6 +7,9 @@ Usage:
     
 The script will prompt you for all required information interactively.
 You can retry if any errors occur.
+
+The app does not create tables itself, so on a new database run
+`python migrate.py` first.
 """
 
 import sys
@@ -29,6 +32,7 @@ else:
     import tty
 
 from Main.app import create_app, db
+from Main.migrations import applied_versions
 from Models.users import User
 from Models.admin import Admin
 
@@ -106,6 +110,9 @@ def create_admin_user(email, password, first_name, last_name, phone=None, depart
     
     with app.app_context():
         try:
+            if applied_versions(db.engine) is None:
+                return False, "Error: The database has no schema yet. Run `python migrate.py` first.", None
+            
             # Check if email already exists
             existing_user = User.query.filter_by(email=email).first()
             if existing_user:
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Script to create a fake Firebase signing key set for offline development and tests.
+
+Writes a certificates file in the format of Google's securetoken endpoint
+and the private key matching it, then prints the environment settings that
+make the backend verify Google sign-in tokens against it (see
+Main/firebase_tokens.py) and a sample ID token for POST /api/auth/google.
+
+Usage:
+    python create_fake_firebase_keys.py [output directory, default ./firebase_fake]
+
+Sign more tokens with:
+    from Main.firebase_tokens import sign_fake_token
+    token = sign_fake_token(open('firebase_fake/private_key.pem').read(), 'guzone-test', 'uid-1', 'jane@example.com', 'Jane Doe')
+
+Never point FIREBASE_CERTS_FILE at a fake key set in production: anyone
+with the private key could sign in as any user.
+"""
+
+import os
+import sys
+
+from Main.firebase_tokens import generate_fake_key_set, sign_fake_token
+
+PROJECT_ID = 'guzone-test'
+
+
+def create_fake_firebase_keys(output_dir):
+    print("=" * 60)
+    print("Fake Firebase Key Set")
+    print("=" * 60)
+    print()
+
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        certs_path = os.path.abspath(os.path.join(output_dir, 'certs.json'))
+        key_path = os.path.abspath(os.path.join(output_dir, 'private_key.pem'))
+
+        private_key = generate_fake_key_set(certs_path)
+        with open(key_path, 'w') as f:
+            f.write(private_key)
+    except OSError as e:
+        print(f"✗ Could not write the key set: {str(e)}")
+        return False
+
+    print(f"  → certificates: {certs_path}")
+    print(f"  → private key:  {key_path}")
+    print()
+    print("Add to .env:")
+    print(f"  FIREBASE_PROJECT_ID={PROJECT_ID}")
+    print(f"  FIREBASE_CERTS_FILE={certs_path}")
+    print()
+    print("Sample ID token (valid for one hour):")
+    print(sign_fake_token(private_key, PROJECT_ID, 'fake-uid-1', 'test.user@example.com', 'Test User'))
+    print()
+    print("✓ Fake key set created")
+    return True
+
+
+if __name__ == '__main__':
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else 'firebase_fake'
+    success = create_fake_firebase_keys(output_dir)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Script to bring the database schema up to date.
+
+Applies the pending migrations of Main/migrations.py in order and records
+them in the schema_migrations table. Safe to run on every deploy: applied
+migrations are skipped. Databases created before migrations were versioned
+(tables from ``db.create_all`` and the old migrate_*.py scripts) are adopted
+by the first migrations.
+
+Usage:
+    python migrate.py           # apply pending migrations
+    python migrate.py status    # list applied and pending migrations
+
+Run it before starting the app, e.g. as the pre-deploy command on Railway,
+or as the start command `python migrate.py && gunicorn run:app`.
+"""
+
+import sys
+
+from Main.app import create_app, db
+from Main.migrations import MIGRATIONS, applied_versions, upgrade
+from sqlalchemy.exc import SQLAlchemyError
+
+
+def status():
+    app = create_app('development')
+
+    with app.app_context():
+        applied = applied_versions(db.engine) or set()
+        for m in MIGRATIONS:
+            state = 'applied' if m.version in applied else 'pending'
+            print(f"  {m.version:>3}  {m.name:<30} {state}")
+    return True
+
+
+def migrate():
+    app = create_app('development')
+
+    with app.app_context():
+        print("=" * 60)
+        print("Database Migration")
+        print("=" * 60)
+        print()
+
+        try:
+            applied = upgrade(db.engine, on_apply=lambda m: print(f"  → {m.version} {m.name}"))
+        except SQLAlchemyError as e:
+            print(f"\n✗ Error during migration: {str(e)}")
+            return False
+
+        print()
+        if applied:
+            print(f"✓ Applied {len(applied)} migration(s), schema at version {applied[-1].version}")
+        else:
+            print("✓ Schema is up to date")
+        return True
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    if command == 'status':
+        success = status()
+    elif command == 'upgrade':
+        success = migrate()
+    else:
+        print(__doc__)
+        success = False
+    sys.exit(0 if success else 1)
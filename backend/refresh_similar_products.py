@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""
+Script to rebuild the precomputed similar-products lists.
+
+Products keep their lists up to date incrementally when they are created or
+updated, but word frequencies drift as the catalog grows, so run this script
+periodically (e.g. from a nightly cron job) to recompute every list.
+
+Usage:
+    python refresh_similar_products.py
+"""
+
+import sys
+
+from Main.app import create_app, db
+from Main import similarity
+from sqlalchemy.exc import SQLAlchemyError
+
+
+def refresh_similar_products():
+    app = create_app('development')
+
+    with app.app_context():
+        print("Rebuilding similar products...")
+        try:
+            count = similarity.rebuild_all()
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"✗ Error rebuilding similar products: {e}")
+            return False
+
+        print(f"✓ Similar products computed for {count} product(s)")
+        return True
+
+
+if __name__ == '__main__':
+    success = refresh_similar_products()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,92 @@
+"""
+Shared fixtures: an app on a fresh, migrated SQLite database per test, users
+with access tokens, and a counter of the SQL statements a request runs.
+
+Run the tests from the backend directory with ``python -m pytest``.
+"""
+
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+
+os.environ['CACHE_BACKEND'] = 'none'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import pytest
+from sqlalchemy import event
+from Main.app import create_app, db
+from Main.auth import create_tokens, _identities
+from Main.migrations import upgrade
+from Main.search import init_search_index
+from Models.users import User
+from Models.customers import Customer
+from Models.admin import Admin
+
+PASSWORD_HASH = 'scrypt:32768:8:1$test$0'  # Never verified by these tests
+
+Account = namedtuple('Account', 'user_id profile_id headers')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    app = create_app('development')
+    with app.app_context():
+        upgrade(db.engine)
+    init_search_index(app)
+    _identities.clear()
+
+    # No app context stays pushed: requests would share it, and with it g
+    yield app
+
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def create_user(app, role, email, **profile):
+    """Commit a user with a customer or admin profile and issue its access token"""
+    with app.app_context():
+        user = User(username=User.username_base(email), email=email, password_hash=PASSWORD_HASH, role=role)
+        profile.setdefault('first_name', 'Test')
+        profile.setdefault('last_name', role.title())
+        if role == 'admin':
+            user.admin_profile = Admin(**profile)
+        else:
+            user.customer_profile = Customer(**profile)
+        db.session.add(user)
+        db.session.commit()
+        access_token, _ = create_tokens(user)
+        profile_id = (user.admin_profile or user.customer_profile).id
+        return Account(user.id, profile_id, {'Authorization': f'Bearer {access_token}'})
+
+
+@pytest.fixture
+def customer(app):
+    return create_user(app, 'customer', 'customer@example.com')
+
+
+@pytest.fixture
+def admin(app):
+    return create_user(app, 'admin', 'admin@example.com')
+
+
+@contextmanager
+def count_queries(app):
+    """Collect the SQL statements the app runs inside the block into the yielded list"""
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
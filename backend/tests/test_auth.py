@@ -0,0 +1,74 @@
+"""
+Authorization comes from the token claims (see Main/auth.py): the only query
+it needs is the token version check, served from a short-TTL cache after the
+first request of a user.
+"""
+
+import pytest
+from conftest import count_queries
+from Main.app import db
+from Main.auth import _identities, revoke_tokens, invalidate_identity
+from Models.users import User
+
+
+def is_identity_lookup(statement):
+    return 'LEFT OUTER JOIN admins' in statement
+
+
+@pytest.mark.parametrize('role, path, queries', [
+    ('customer', '/api/auth/me', 2),
+    ('customer', '/api/customers/profile', 2),
+    ('customer', '/api/customers/orders', 1),
+    ('admin', '/api/admin/profile', 2),
+    ('admin', '/api/customers/all', 1),
+    ('admin', '/api/users/', 1),
+    ('admin', '/api/products/orders/all', 2),
+    ('admin', '/api/products/deliveries/all', 1),
+])
+def test_endpoint_queries(app, client, customer, admin, role, path, queries):
+    headers = (customer if role == 'customer' else admin).headers
+    assert client.get(path, headers=headers).status_code == 200
+
+    with count_queries(app) as statements:
+        response = client.get(path, headers=headers)
+
+    assert response.status_code == 200
+    assert len(statements) == queries, statements
+    assert not any(is_identity_lookup(statement) for statement in statements)
+
+
+def test_identity_is_looked_up_once_per_user(app, client, customer):
+    with count_queries(app) as first:
+        client.get('/api/customers/orders', headers=customer.headers)
+    with count_queries(app) as second:
+        client.get('/api/customers/orders', headers=customer.headers)
+
+    assert sum(map(is_identity_lookup, first)) == 1
+    assert sum(map(is_identity_lookup, second)) == 0
+
+
+def test_identity_lookup_on_every_request_without_cache(app, client, customer, monkeypatch):
+    monkeypatch.setattr(_identities, 'default_ttl', 0)
+
+    for _ in range(2):
+        with count_queries(app) as statements:
+            assert client.get('/api/customers/orders', headers=customer.headers).status_code == 200
+        assert sum(map(is_identity_lookup, statements)) == 1
+
+
+def test_revoked_token_is_rejected(app, client, customer):
+    assert client.get('/api/customers/orders', headers=customer.headers).status_code == 200
+
+    with app.app_context():
+        revoke_tokens(db.session.get(User, customer.user_id))
+        db.session.commit()
+        invalidate_identity(customer.user_id)
+
+    assert client.get('/api/customers/orders', headers=customer.headers).status_code == 401
+
+
+def test_customer_routes_reject_admins(client, admin):
+    response = client.get('/api/customers/orders', headers=admin.headers)
+
+    assert response.status_code == 403
+    assert response.get_json() == {'error': 'Customer access required'}
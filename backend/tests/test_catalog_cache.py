@@ -0,0 +1,85 @@
+"""
+Catalog responses are cached under the ETag of the data they were built
+from (see Main/cache.py), so a change is seen on the next request without
+flushing the whole catalog namespace. Collections are validated by ETag
+only; a date cannot see a deleted row.
+"""
+
+import pytest
+from Main.app import db
+from Main.cache import MemoryCache
+from Models.products import Product, SimilarProduct
+
+
+@pytest.fixture
+def cache(app):
+    cache = MemoryCache()
+    app.extensions['response_cache'] = cache
+    return cache
+
+
+def add_product(app, name='Widget', stock=10):
+    with app.app_context():
+        product = Product(name=name, description=f'A {name.lower()}', price=10, stock_quantity=stock, sku=f'SKU-{name}')
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+
+def test_order_does_not_flush_catalog_cache(app, client, customer, cache):
+    product_id = add_product(app)
+    assert client.get('/api/products').get_json()['products'][0]['stock_quantity'] == 10
+    assert client.get(f'/api/products/{product_id}').get_json()['stock_quantity'] == 10
+
+    response = client.post('/api/products/orders', headers=customer.headers, json={
+        'items': [{'product_id': product_id, 'quantity': 3}],
+        'shipping_address': '1 Test Street',
+    })
+
+    assert response.status_code == 201
+    assert cache.get_version('catalog') == 0
+    assert client.get('/api/products').get_json()['products'][0]['stock_quantity'] == 7
+    assert client.get(f'/api/products/{product_id}').get_json()['stock_quantity'] == 7
+
+
+def test_collection_is_not_validated_by_date(app, client, admin):
+    add_product(app)
+    response = client.get('/api/products')
+    assert response.last_modified is None
+
+    other_id = add_product(app, 'Gadget')
+    etag = client.get('/api/products').headers['ETag']
+    assert client.delete(f'/api/products/{other_id}', headers=admin.headers).status_code == 200
+
+    response = client.get('/api/products', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert response.status_code == 200
+    assert [product['name'] for product in response.get_json()['products']] == ['Widget']
+
+    response = client.get('/api/products', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_single_product_is_validated_by_date(app, client):
+    product_id = add_product(app)
+
+    response = client.get(f'/api/products/{product_id}')
+    assert response.last_modified is not None
+
+    response = client.get(f'/api/products/{product_id}', headers={'If-Modified-Since': response.headers['Last-Modified']})
+    assert response.status_code == 304
+
+
+def test_similar_products_read_does_not_write(app, client):
+    product_id = add_product(app)
+    add_product(app, 'Gadget')
+    with app.app_context():
+        db.session.execute(SimilarProduct.__table__.delete())
+        db.session.commit()
+
+    first = client.get(f'/api/products/{product_id}/similar')
+    second = client.get(f'/api/products/{product_id}/similar', headers={'If-None-Match': first.headers['ETag']})
+
+    assert first.get_json() == []
+    assert second.status_code == 304
+    with app.app_context():
+        assert SimilarProduct.query.count() == 0
@@ -0,0 +1,171 @@
+"""
+Firebase ID tokens are verified offline against a fake key set (see
+Main/firebase_tokens.py and create_fake_firebase_keys.py): signature, expiry,
+audience, issuer and subject, and a refetch of the certificates for an
+unknown kid. A slow background refresh does not hold up verification while
+the cached keys are still valid. POST /api/auth/google answers 503 when
+password hashing is busy.
+"""
+
+import threading
+import time
+import jwt
+import pytest
+from Main import firebase_tokens
+from Main.firebase_tokens import (
+    KeyCache, FirebaseTokenError, generate_fake_key_set, sign_fake_token, verify_id_token
+)
+from Main.passwords import PasswordHasherBusy
+from Models.users import User
+
+PROJECT_ID = 'guzone-test'
+
+
+@pytest.fixture
+def certs_path(tmp_path):
+    return str(tmp_path / 'certs.json')
+
+
+@pytest.fixture
+def private_key(certs_path):
+    return generate_fake_key_set(certs_path)
+
+
+@pytest.fixture
+def key_cache(certs_path, private_key, monkeypatch):
+    cache = KeyCache(certs_file=certs_path)
+    fetches = []
+    fetch = cache._fetch
+
+    def counting_fetch():
+        fetches.append(True)
+        return fetch()
+
+    monkeypatch.setattr(cache, '_fetch', counting_fetch)
+    cache.fetches = fetches
+    monkeypatch.setattr(firebase_tokens, '_key_cache', cache)
+    monkeypatch.setattr(firebase_tokens, '_project_id', PROJECT_ID)
+    return cache
+
+
+def resign(token, private_key, kid='fake-key', **changes):
+    """The claims of token with changes applied, signed again"""
+    claims = jwt.decode(token, options={'verify_signature': False})
+    claims.update(changes)
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+
+
+def test_valid_token(key_cache, private_key):
+    token = sign_fake_token(private_key, PROJECT_ID, 'uid-1', 'jane@example.com', 'Jane Doe')
+
+    claims = verify_id_token(token)
+
+    assert claims['uid'] == 'uid-1'
+    assert claims['email'] == 'jane@example.com'
+    assert key_cache.fetches == [True]
+
+
+def test_keys_are_fetched_once(key_cache, private_key):
+    for uid in ('uid-1', 'uid-2', 'uid-3'):
+        verify_id_token(sign_fake_token(private_key, PROJECT_ID, uid))
+
+    assert len(key_cache.fetches) == 1
+
+
+def test_expired_token(key_cache, private_key):
+    token = sign_fake_token(private_key, PROJECT_ID, 'uid-1', lifetime=-3600)
+
+    with pytest.raises(FirebaseTokenError, match='expired'):
+        verify_id_token(token)
+
+
+@pytest.mark.parametrize('changes, message', [
+    ({'aud': 'other-project'}, 'Audience'),
+    ({'iss': 'https://securetoken.google.com/other-project'}, '[Ii]ssuer'),
+    ({'iss': 'https://accounts.google.com'}, '[Ii]ssuer'),
+    ({'sub': ''}, '[Ss]ubject'),
+])
+def test_wrong_claims(key_cache, private_key, changes, message):
+    token = resign(sign_fake_token(private_key, PROJECT_ID, 'uid-1'), private_key, **changes)
+
+    with pytest.raises(FirebaseTokenError, match=message):
+        verify_id_token(token)
+
+
+def test_token_signed_by_another_key(key_cache, private_key, tmp_path):
+    other_key = generate_fake_key_set(str(tmp_path / 'other.json'))
+    token = sign_fake_token(other_key, PROJECT_ID, 'uid-1')
+
+    with pytest.raises(FirebaseTokenError, match='Signature'):
+        verify_id_token(token)
+
+
+def test_unknown_kid_refetches_certificates(key_cache, private_key, certs_path, monkeypatch):
+    verify_id_token(sign_fake_token(private_key, PROJECT_ID, 'uid-1'))
+
+    # Google rotated its keys: the certificates now hold a kid we have not seen
+    rotated_key = generate_fake_key_set(certs_path, kid='rotated-key')
+    token = sign_fake_token(rotated_key, PROJECT_ID, 'uid-1', kid='rotated-key')
+
+    # Within MIN_FETCH_INTERVAL of the last fetch the kid stays unknown
+    with pytest.raises(FirebaseTokenError, match='unknown key'):
+        verify_id_token(token)
+    assert len(key_cache.fetches) == 1
+
+    monkeypatch.setattr(firebase_tokens, 'MIN_FETCH_INTERVAL', 0)
+    assert verify_id_token(token)['uid'] == 'uid-1'
+    assert len(key_cache.fetches) == 2
+
+
+def test_slow_refresh_does_not_block_valid_keys(key_cache, private_key, monkeypatch):
+    verify_id_token(sign_fake_token(private_key, PROJECT_ID, 'uid-1'))
+    key = key_cache.keys['fake-key']
+
+    fetch_started = threading.Event()
+    release = threading.Event()
+
+    def slow_fetch():
+        fetch_started.set()
+        release.wait(5)
+        return {'fake-key': key}, 3600
+
+    # Keys still valid but inside the refresh-ahead window
+    monkeypatch.setattr(firebase_tokens, 'MIN_FETCH_INTERVAL', 0)
+    monkeypatch.setattr(key_cache, '_fetch', slow_fetch)
+    key_cache.expires_at = time.monotonic() + firebase_tokens.REFRESH_AHEAD / 2
+
+    try:
+        key_cache.refresh_in_background()
+        assert fetch_started.wait(1)
+
+        results = []
+        worker = threading.Thread(target=lambda: results.append(key_cache.get('fake-key')))
+        worker.start()
+        worker.join(1)
+
+        assert not worker.is_alive()
+        assert results == [key]
+    finally:
+        release.set()
+
+
+def test_google_auth_creates_customer(client, key_cache, private_key):
+    token = sign_fake_token(private_key, PROJECT_ID, 'uid-1', 'jane@example.com', 'Jane Doe')
+
+    response = client.post('/api/auth/google', json={'token': token})
+
+    assert response.status_code == 201
+    assert response.get_json()['user']['email'] == 'jane@example.com'
+
+
+def test_google_auth_busy_hasher_is_503(client, key_cache, private_key, monkeypatch):
+    def busy(self, password):
+        raise PasswordHasherBusy('Too many password operations in progress')
+
+    monkeypatch.setattr(User, 'set_password', busy)
+    token = sign_fake_token(private_key, PROJECT_ID, 'uid-1', 'jane@example.com', 'Jane Doe')
+
+    response = client.post('/api/auth/google', json={'token': token})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
@@ -0,0 +1,47 @@
+"""
+The structured logger: loggers are named after their full module path, and
+a full output queue drops and counts records instead of growing.
+"""
+
+import json
+import logging
+import queue
+from Main.logger import JsonFormatter, _EncodedQueueHandler, get_logger
+
+
+def test_logger_keeps_module_path():
+    assert get_logger('Main.auth').logger.name == 'guzone.Main.auth'
+    assert get_logger('Routes.auth').logger.name == 'guzone.Routes.auth'
+
+
+def make_handler(size):
+    handler = _EncodedQueueHandler(queue.Queue(maxsize=size))
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def record(msg):
+    return logging.makeLogRecord({'name': 'guzone.test', 'levelno': logging.INFO, 'levelname': 'INFO', 'msg': msg})
+
+
+def drain(handler):
+    lines = []
+    while not handler.queue.empty():
+        lines.append(json.loads(handler.queue.get_nowait().msg))
+    return lines
+
+
+def test_full_queue_drops_and_reports():
+    handler = make_handler(2)
+    for n in range(5):
+        handler.handle(record(f'record {n}'))
+
+    assert handler.dropped == 3
+    assert [line['msg'] for line in drain(handler)] == ['record 0', 'record 1']
+
+    handler.handle(record('record 5'))
+
+    lines = drain(handler)
+    assert [line['msg'] for line in lines] == ['record 5', 'log records dropped']
+    assert lines[1]['dropped'] == 3 and lines[1]['level'] == 'WARNING'
+    assert handler.dropped == 3
@@ -0,0 +1,74 @@
+"""
+Migrations are frozen (see Main/migrations.py): applied in order to a new
+database, or to one set up by db.create_all before migrations were
+versioned, they end at the schema the models declare.
+"""
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from Main.app import db
+from Main.migrations import upgrade, pending_migrations
+
+
+def model_schema():
+    """{table: ({column: nullable}, {index names})} declared by the models"""
+    return {
+        table.name: (
+            {column.name: column.nullable for column in table.columns},
+            {index.name for index in table.indexes},
+        )
+        for table in db.metadata.sorted_tables
+    }
+
+
+def database_schema(engine):
+    inspector = inspect(engine)
+    return {
+        name: (
+            {column['name']: column['nullable'] for column in inspector.get_columns(name)},
+            {index['name'] for index in inspector.get_indexes(name)},
+        )
+        for name in inspector.get_table_names()
+    }
+
+
+@pytest.fixture
+def engine(app, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+def assert_matches_models(engine, exact=True):
+    schema = database_schema(engine)
+    for table, (columns, indexes) in model_schema().items():
+        assert table in schema, table
+        if exact:
+            assert schema[table] == (columns, indexes), table
+        else:
+            # Tables from db.create_all carry indexes of their own
+            assert set(schema[table][0]) == set(columns), table
+            assert indexes <= schema[table][1], table
+
+
+def test_new_database(engine):
+    upgrade(engine)
+
+    assert_matches_models(engine)
+    assert pending_migrations(engine) == []
+
+
+def test_database_from_create_all(engine):
+    db.metadata.create_all(bind=engine)
+
+    upgrade(engine)
+
+    assert_matches_models(engine, exact=False)
+
+
+def test_migrations_do_not_read_the_models(engine, monkeypatch):
+    monkeypatch.setattr(db.metadata, 'create_all', lambda *args, **kwargs: pytest.fail('create_all called'))
+
+    upgrade(engine)
+
+    assert_matches_models(engine)
@@ -0,0 +1,65 @@
+"""
+Keyset pagination: cursors are opaque, and a cursor that does not decode to
+values of the sort columns' types is answered with 400, never 500. Lists
+requested without a limit or cursor still return every row, as the client
+reads them as plain arrays.
+"""
+
+import base64
+import json
+import pytest
+from conftest import create_user
+
+
+def make_cursor(values):
+    payload = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('values', [
+    [{'a': 1}, '2020-01-01T00:00:00', 1],
+    [True, '2020-01-01T00:00:00', '1'],
+    [True, '2020-01-01T00:00:00', True],
+    [True, 20200101, 1],
+    ['yes', '2020-01-01T00:00:00', 1],
+    [True, '2020-01-01T00:00:00'],
+])
+def test_tampered_product_cursor_is_rejected(client, values):
+    response = client.get(f'/api/products?cursor={make_cursor(values)}')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', make_cursor({'id': 1}), make_cursor([[1], 1])])
+def test_malformed_user_cursor_is_rejected(client, admin, cursor):
+    response = client.get(f'/api/users?cursor={cursor}', headers=admin.headers)
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+
+def test_user_cursor_walks_every_row(app, client, admin):
+    for n in range(4):
+        create_user(app, 'customer', f'customer{n}@example.com')
+
+    seen, cursor = [], ''
+    while cursor is not None:
+        response = client.get(f'/api/users?limit=2&cursor={cursor}', headers=admin.headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        seen += [user['id'] for user in body['users']]
+        cursor = body['next_cursor']
+
+    assert sorted(seen) == list(range(1, 6))
+    assert len(seen) == len(set(seen))
+
+
+def test_list_without_limit_returns_every_row(app, client, admin):
+    for n in range(4):
+        create_user(app, 'customer', f'customer{n}@example.com')
+
+    response = client.get('/api/users', headers=admin.headers)
+
+    assert response.status_code == 200
+    assert sorted(user['id'] for user in response.get_json()) == list(range(1, 6))
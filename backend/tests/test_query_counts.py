@@ -0,0 +1,85 @@
+"""
+Listings eager-load what their to_dict() touches (see the *_load_options
+functions in Models/products.py), so a page costs the same number of
+queries however many rows it holds.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from conftest import count_queries
+from Main.app import db
+from Models.products import Category, Offer, Product, ProductImage, UploadedImage, Order, OrderItem, Delivery, DeliveryUpdate
+
+
+def add_rows(app, customer_id, start, count):
+    """Add count products, each in its own order with a delivery, with every relationship to_dict() reads"""
+    with app.app_context():
+        now = datetime.utcnow()
+        for i in range(start, start + count):
+            category = Category(name=f'Category {i}')
+            offer = Offer(name=f'Offer {i}', start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+            product = Product(
+                name=f'Product {i}', description=f'Description of product {i}', price=10 + i, stock_quantity=100,
+                sku=f'SKU-{i}', category=category, offer=offer, main_image_url=f'https://img.example.com/{i}/main.jpg',
+                discount_percentage=10, discount_start_date=now - timedelta(days=1), discount_end_date=now + timedelta(days=1)
+            )
+            product.images = [
+                ProductImage(image_url=f'https://img.example.com/{i}/{n}.jpg', display_order=n) for n in range(2)
+            ]
+            db.session.add(UploadedImage(image_url=f'https://img.example.com/{i}/main.jpg'))
+            db.session.add(UploadedImage(image_url=f'https://img.example.com/{i}/0.jpg'))
+
+            order = Order(customer_id=customer_id, order_number=f'ORD-{i:08d}', total_amount=10 + i,
+                          shipping_address='1 Test Street')
+            order.order_items = [OrderItem(product=product, quantity=1, unit_price=10 + i, subtotal=10 + i)]
+            delivery = Delivery(order=order, tracking_number=f'TRK-{i:08d}', carrier='DHL')
+            delivery.delivery_updates = [
+                DeliveryUpdate(status='pending', location='Warehouse'),
+                DeliveryUpdate(status='on_transit', location='Hub'),
+            ]
+            db.session.add_all([product, order])
+        db.session.commit()
+
+
+def query_counts(app, client, headers, page_size):
+    """Statements run by each listing for one page of page_size rows, after a warm-up request"""
+    paths = {
+        'products': f'/api/products?per_page={page_size}',
+        'all orders': f'/api/products/orders/all?per_page={page_size}',
+        'customer orders': f'/api/customers/orders?limit={page_size}',
+        'all deliveries': '/api/products/deliveries/all',
+    }
+    counts = {}
+    for name, path in paths.items():
+        role_headers = headers['customer'] if name == 'customer orders' else headers['admin']
+        assert client.get(path, headers=role_headers).status_code == 200
+        with count_queries(app) as statements:
+            response = client.get(path, headers=role_headers)
+        assert response.status_code == 200
+        counts[name] = len(statements)
+    return counts
+
+
+def test_listing_queries_do_not_grow_with_page_size(app, client, customer, admin):
+    headers = {'customer': customer.headers, 'admin': admin.headers}
+
+    add_rows(app, customer.profile_id, 0, 5)
+    small = query_counts(app, client, headers, 5)
+
+    add_rows(app, customer.profile_id, 5, 35)
+    large = query_counts(app, client, headers, 40)
+
+    assert large == small
+
+
+@pytest.mark.parametrize('path, rows_key', [
+    ('/api/products?per_page=40', 'products'),
+    ('/api/products/orders/all?per_page=40', 'orders'),
+])
+def test_listing_returns_full_page(app, client, customer, admin, path, rows_key):
+    add_rows(app, customer.profile_id, 0, 40)
+
+    response = client.get(path, headers=admin.headers)
+
+    assert response.status_code == 200
+    assert len(response.get_json()[rows_key]) == 40
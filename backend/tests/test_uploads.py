@@ -0,0 +1,84 @@
+"""
+Image uploads that fail part way leave nothing behind: variants already
+stored are queued for deletion and the registry record is rolled back.
+Successful uploads through the route report the same message whatever the
+storage backend.
+"""
+
+import io
+import pytest
+from PIL import Image
+from Main import storage, uploads
+from Main.app import db
+from Models.products import UploadedImage
+
+
+class FlakyStorage:
+    """Storage whose upload number fail_on raises"""
+
+    def __init__(self, fail_on):
+        self.fail_on = fail_on
+        self.uploaded = []
+
+    def upload(self, file, public_id):
+        if len(self.uploaded) + 1 == self.fail_on:
+            raise uploads.StorageError('upload failed')
+        self.uploaded.append(f'https://img.example.com/{public_id}.webp')
+        return self.uploaded[-1]
+
+
+@pytest.fixture
+def deleted(monkeypatch):
+    deleted = []
+    monkeypatch.setattr(uploads, 'delete_images', deleted.extend)
+    return deleted
+
+
+def spool_png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (1600, 1200), 'red').save(buffer, 'PNG')
+    buffer.seek(0)
+    return uploads.spool_stream(buffer, 'photo.png')
+
+
+def test_failed_variant_deletes_stored_variants(app, monkeypatch, deleted):
+    storage = FlakyStorage(fail_on=2)
+    monkeypatch.setattr(uploads, 'get_storage', lambda: storage)
+
+    with app.app_context():
+        with pytest.raises(uploads.StorageError):
+            uploads.upload_now(spool_png())
+
+        assert len(storage.uploaded) == 1
+        assert deleted == storage.uploaded
+        assert UploadedImage.query.count() == 0
+
+
+def test_failed_commit_deletes_stored_image(app, monkeypatch, deleted):
+    storage = FlakyStorage(fail_on=None)
+    monkeypatch.setattr(uploads, 'get_storage', lambda: storage)
+
+    def fail_commit():
+        raise RuntimeError('commit failed')
+
+    with app.app_context():
+        monkeypatch.setattr(db.session, 'commit', fail_commit)
+        with pytest.raises(RuntimeError):
+            uploads.upload_now(spool_png())
+        monkeypatch.undo()
+
+        assert storage.uploaded and set(deleted) == set(storage.uploaded)
+        assert UploadedImage.query.count() == 0
+
+
+def test_upload_message_does_not_name_the_backend(client, admin, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, '_storage', storage.LocalStorage(str(tmp_path)))
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'red').save(buffer, 'PNG')
+    buffer.seek(0)
+
+    response = client.post('/api/products/upload-image', headers=admin.headers,
+                           data={'file': (buffer, 'photo.png')}, content_type='multipart/form-data')
+
+    assert response.status_code == 201
+    assert response.get_json()['message'] == 'Image uploaded successfully'
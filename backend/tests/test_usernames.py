@@ -0,0 +1,70 @@
+"""
+Signup usernames come from the email's local part, numbered when taken
+(see User.allocate_username): found with one query however many names
+collide, and allocated again when a concurrent signup wins the race.
+"""
+
+from sqlalchemy import insert
+from conftest import count_queries, PASSWORD_HASH
+from Main.app import db
+from Models.users import User
+
+
+def add_users(app, usernames):
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'username': username, 'email': f'{username}@taken.example.com',
+             'password_hash': PASSWORD_HASH, 'role': 'customer'}
+            for username in usernames
+        ])
+        db.session.commit()
+
+
+def register(client, email):
+    response = client.post('/api/auth/register', json={'email': email, 'password': 'Secret123!'})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['user']['username']
+
+
+def test_colliding_prefix_costs_no_extra_queries(app, client):
+    add_users(app, ['info'] + [f'info{n}' for n in range(1, 60)])
+
+    with count_queries(app) as fresh:
+        assert register(client, 'sales@example.com') == 'sales'
+    with count_queries(app) as colliding:
+        assert register(client, 'info@example.com') == 'info60'
+
+    assert len(colliding) == len(fresh)
+
+
+def test_username_taken_by_concurrent_signup_is_allocated_again(app, client, monkeypatch):
+    allocate = User.allocate_username.__func__
+    calls = []
+
+    def allocate_and_lose_race(cls, base):
+        username = allocate(cls, base)
+        calls.append(username)
+        if len(calls) == 1:
+            # Another signup commits the same name before this one flushes
+            with db.engine.begin() as connection:
+                connection.execute(insert(User), {
+                    'username': username, 'email': 'rival@example.com',
+                    'password_hash': PASSWORD_HASH, 'role': 'customer'
+                })
+        return username
+
+    monkeypatch.setattr(User, 'allocate_username', classmethod(allocate_and_lose_race))
+
+    assert register(client, 'info@example.com') == 'info1'
+    assert calls == ['info', 'info1']
+    with app.app_context():
+        assert User.query.filter_by(email='info@example.com').one().customer_profile is not None
+
+
+def test_duplicate_email_is_still_rejected(client):
+    register(client, 'info@example.com')
+
+    response = client.post('/api/auth/register', json={'email': 'info@example.com', 'password': 'Secret123!'})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Email already exists'}